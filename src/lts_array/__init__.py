@@ -1,3 +1,4 @@
 from . import classes
 from . import tools
 from . ltsva import ltsva
+from . lts_stream import LTSStream
@@ -1,7 +1,12 @@
+from contextlib import contextmanager
+from functools import lru_cache
+
+import numba
 import numpy as np
-from scipy.linalg import lstsq
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.fft import irfft, next_fast_len, rfft
 from scipy.special import erfinv
-from numba import jit
+from numba import jit, prange
 
 # Layout:
 # 1) jit-decorated functions
@@ -56,90 +61,139 @@ def check_array(candidate_size, best_coeff, best_obj, z, obj):
 
 
 @jit(nopython=True, cache=True)
-def fast_LTS(nits, tau, time_delay_mad, xij_standardized, xij_mad, dimension_number, candidate_size, n_samples, co_array_num, slowness_coeffs, csteps, h, csteps2):
-    """ Run the FAST_LTS algorithm to determine an initial optimal slowness vector.
+def lts_subsets(xij_standardized, co_array_num, dimension_number, n_sets):
+    """ Draw the FAST-LTS random subsets and factor each subset of the co-array.
+
+    The random sequence restarts from ``seed = 0`` in every time window, so
+    the subsets (and the QR factors of ``xij_standardized`` restricted to
+    them) are the same for all windows of a given array.
     """
-    for jj in range(nits):
+    subsets = np.empty((n_sets, dimension_number), dtype=np.int64)
+    q_t = np.empty((n_sets, dimension_number, dimension_number))
+    r_sub = np.empty((n_sets, dimension_number, dimension_number))
+    seed = 0
+    for ii in range(n_sets):
+        index, seed = random_set(co_array_num, dimension_number, seed)
+        q, r = np.linalg.qr(xij_standardized[index, :])
+        subsets[ii] = index
+        q_t[ii] = q.conj().T
+        r_sub[ii] = r
 
-        # Check for data spike.
-        if (time_delay_mad[jj] == 0) or (np.count_nonzero(tau[:, jj, :]) < (co_array_num - 2)):
-            # We have a data spike, so do not process.
-            continue
+    return subsets, q_t, r_sub
 
-        # Standardize the y-values
-        y_var = tau[:, jj, :] / time_delay_mad[jj]
-        X_var = xij_standardized
-
-        objective_array = np.full((candidate_size, ), np.inf)
-        coeff_array = np.full((dimension_number, candidate_size), np.nan) # noqa
-        # Initial seed for random search
-        seed = 0
-        # Initial best objective function value
-        best_objective = np.inf
-        # Initial search through the subsets
-        for ii in range(0, n_samples):
-            prev_obj = 0
-            # Initial random solution
-            index, seed = random_set(co_array_num, dimension_number, seed) # noqa
-            q, r = np.linalg.qr(X_var[index, :])
-            qt = q.conj().T @ y_var[index]
+
+@jit(nopython=True, cache=True)
+def lts_window(y_var, X_var, dimension_number, candidate_size, n_samples, co_array_num, csteps, h, csteps2, subsets, q_t, r_sub):
+    """ FAST-LTS fit of the standardized time delays of one window.
+
+    ``subsets``, ``q_t`` and ``r_sub`` are the precomputed random subsets and
+    their QR factors from ``lts_subsets``.
+    """
+    # Stays NaN if no candidate produces a finite fit
+    coeffs = np.full((dimension_number, 1), np.nan)
+    objective_array = np.full((candidate_size, ), np.inf)
+    coeff_array = np.full((dimension_number, candidate_size), np.nan) # noqa
+    # Position in the (per-window identical) random subset sequence
+    set_num = 0
+    # Initial best objective function value
+    best_objective = np.inf
+    # Initial search through the subsets
+    for ii in range(0, n_samples):
+        prev_obj = 0
+        # Initial random solution
+        index = subsets[set_num]
+        qt = q_t[set_num] @ y_var[index]
+        z = np.linalg.lstsq(r_sub[set_num], qt)[0]
+        set_num += 1
+        residuals = y_var - X_var @ z
+        sort_ind = np.argsort(np.abs(residuals).flatten()) # noqa
+        obs_in_set = sort_ind[0:h]
+        # Perform C-steps
+        for kk in range(0, csteps):
+            q, r = np.linalg.qr(X_var[obs_in_set, :])
+            qt = q.conj().T @ y_var[obs_in_set]
             z = np.linalg.lstsq(r, qt)[0]
             residuals = y_var - X_var @ z
+            # Sort the residuals in magnitude from low to high
+            abs_residuals = np.abs(residuals).flatten()
+            sort_ind = np.argsort(abs_residuals)
+            # Sum the first "h" squared residuals
+            obj = np.sum(abs_residuals[sort_ind[0:h]]**2)
+            # Stop if the C-steps have converged
+            if (kk >= 1) and (obj == prev_obj):
+                break
+            prev_obj = obj
+            # Same (ordered) subset again: the next C-step would repeat this
+            # fit exactly and stop on the unchanged objective.
+            if np.array_equal(sort_ind[0:h], obs_in_set):
+                break
+            obs_in_set = sort_ind[0:h]
+        # Save these initial estimates for future C-steps in next round # noqa
+        if obj < np.max(objective_array):
+            # Save the best objective function values.
+            coeff_array, objective_array = check_array(
+                candidate_size, coeff_array, objective_array, z, obj) # noqa
+
+    # Final condensation of promising data points
+    for ii in range(0, candidate_size):
+        prev_obj = 0
+        if np.isfinite(objective_array[ii]):
+            z = coeff_array[:, ii].copy()
+            z = z.reshape((len(z), 1))
+        else:
+            index = subsets[set_num]
+            qt = q_t[set_num] @ y_var[index]
+            z = np.linalg.lstsq(r_sub[set_num], qt)[0]
+            set_num += 1
+
+        if np.isfinite(z[0]):
+            residuals = y_var - X_var @ z
+            sort_ind = np.argsort(np.abs(residuals).flatten()) # noqa
+            obs_in_set = sort_ind[0:h]
             # Perform C-steps
-            for kk in range(0, csteps):
-                sortind = np.argsort(np.abs(residuals).flatten()) # noqa
-                obs_in_set = sortind.flatten()[0:h]
+            for kk in range(0, csteps2):
                 q, r = np.linalg.qr(X_var[obs_in_set, :])
                 qt = q.conj().T @ y_var[obs_in_set]
                 z = np.linalg.lstsq(r, qt)[0]
                 residuals = y_var - X_var @ z
                 # Sort the residuals in magnitude from low to high
-                sor = np.sort(np.abs(residuals).flatten()) # noqa
+                abs_residuals = np.abs(residuals).flatten()
+                sort_ind = np.argsort(abs_residuals)
                 # Sum the first "h" squared residuals
-                obj = np.sum(sor[0:h]**2)
+                obj = np.sum(abs_residuals[sort_ind[0:h]]**2)
                 # Stop if the C-steps have converged
                 if (kk >= 1) and (obj == prev_obj):
                     break
                 prev_obj = obj
-            # Save these initial estimates for future C-steps in next round # noqa
-            if obj < np.max(objective_array):
-                # Save the best objective function values.
-                coeff_array, objective_array = check_array(
-                    candidate_size, coeff_array, objective_array, z, obj) # noqa
-
-        # Final condensation of promising data points
-        for ii in range(0, candidate_size):
-            prev_obj = 0
-            if np.isfinite(objective_array[ii]):
-                z = coeff_array[:, ii].copy()
-                z = z.reshape((len(z), 1))
-            else:
-                index, seed = random_set(co_array_num, dimension_number, seed) # noqa
-                q, r = np.linalg.qr(X_var[index, :])
-                qt = q.conj().T @ y_var[index]
-                z = np.linalg.lstsq(r, qt)[0]
+                # Same (ordered) subset again: the next C-step would repeat this
+                # fit exactly and stop on the unchanged objective.
+                if np.array_equal(sort_ind[0:h], obs_in_set):
+                    break
+                obs_in_set = sort_ind[0:h]
+            if obj < best_objective:
+                best_objective = obj
+                coeffs = z.copy()
+
+    return coeffs
 
-            if np.isfinite(z[0]):
-                residuals = y_var - X_var @ z
-                # Perform C-steps
-                for kk in range(0, csteps2):
-                    sort_ind = np.argsort(np.abs(residuals).flatten()) # noqa
-                    obs_in_set = sort_ind.flatten()[0:h]
-                    q, r = np.linalg.qr(X_var[obs_in_set, :])
-                    qt = q.conj().T @ y_var[obs_in_set]
-                    z = np.linalg.lstsq(r, qt)[0]
-                    residuals = y_var - X_var @ z
-                    # Sort the residuals in magnitude from low to high
-                    sor = np.sort(np.abs(residuals).flatten()) # noqa
-                    # Sum the first "h" squared residuals
-                    obj = np.sum(sor[0:h]**2)
-                    # Stop if the C-steps have converged
-                    if (kk >= 1) and (obj == prev_obj):
-                        break
-                    prev_obj = obj
-                if obj < best_objective:
-                    best_objective = obj
-                    coeffs = z.copy()
+
+@jit(nopython=True, parallel=True, cache=True)
+def fast_LTS(nits, tau, time_delay_mad, xij_standardized, xij_mad, dimension_number, candidate_size, n_samples, co_array_num, slowness_coeffs, csteps, h, csteps2, subsets, q_t, r_sub):
+    """ Run the FAST_LTS algorithm to determine an initial optimal slowness vector.
+
+    Windows are independent and are distributed over the numba thread pool
+    (see ``numba.set_num_threads``).
+    """
+    for jj in prange(nits):
+
+        # Check for data spike.
+        if (time_delay_mad[jj] == 0) or (np.count_nonzero(tau[:, jj, :]) < (co_array_num - 2)):
+            # We have a data spike, so do not process.
+            continue
+
+        # Standardize the y-values
+        y_var = tau[:, jj, :] / time_delay_mad[jj]
+        coeffs = lts_window(y_var, xij_standardized, dimension_number, candidate_size, n_samples, co_array_num, csteps, h, csteps2, subsets, q_t, r_sub) # noqa
 
         # Correct coefficients due to standardization
         for ii in range(0, dimension_number):
@@ -150,6 +204,102 @@ def fast_LTS(nits, tau, time_delay_mad, xij_standardized, xij_mad, dimension_num
     return slowness_coeffs
 
 
+@jit(nopython=True, cache=True, error_model='numpy')
+def post_process_window(y_var, xij, coeff, h, raw_factor, rew_factor1, rew_factor2, quantile, dimension_number, co_array_num):
+    """ Reweighted least squares fit and co-array statistics of one window.
+
+    ``rew_factor2[k]`` is the final-fit consistency factor for ``k`` data
+    points with weight 1 (``rew_consfactor_lts``).
+    """
+    # Initial LTS fit
+    z_final = coeff.copy().reshape((dimension_number, 1))
+    residuals = y_var - xij @ z_final
+    sor = np.sort(residuals.flatten()**2)
+    s0 = np.sqrt(np.sum(sor[0:h]) / h) * raw_factor
+
+    if np.abs(s0) < 1e-7:
+        weights = np.abs(residuals[:, 0]) < 1e-7
+    else:
+        weights = np.abs(residuals[:, 0] / s0) <= quantile
+
+        # Perform the weighted least squares fit with
+        # only data points with weight = 1
+        # to increase statistical efficiency.
+        q, r = np.linalg.qr(xij[weights, :])
+        qt = q.conj().T @ y_var[weights]
+        z_final = np.linalg.lstsq(r, qt)[0]
+
+        # Find dropped data points
+        # Final residuals
+        residuals = y_var - xij @ z_final
+        weights_num = np.sum(weights)
+        scale = np.sqrt(np.sum(residuals[weights]**2) / (weights_num - 1))
+        scale *= rew_factor1
+        if weights_num != co_array_num:
+            # Final fit - correction factor to make LTS approximately normally distributed # noqa
+            scale *= rew_factor2[weights_num]
+        weights = np.abs(residuals[:, 0] / scale) <= 2.5
+
+    # x- and y-components of slowness vector
+    sx = z_final[0, 0]
+    sy = z_final[1, 0]
+    # Calculate trace velocity from slowness
+    vel = 1 / np.linalg.norm(z_final[:, 0])
+    # Convert baz from mathematical CCW from E
+    # to geographical CW from N. baz = arctan(sx/sy)
+    baz = (np.arctan2(sx, sy) * 180 / np.pi - 360) % 360
+
+    # Uncertainty Quantification - Szuberla & Olson, 2004
+    # Compute co-array eigendecomp. for uncertainty calcs.
+    xij_w = xij[weights, :]
+    c_eig_vals, c_eig_vecs = np.linalg.eigh(xij_w.T @ xij_w)
+    eig_vec_ang = np.arctan2(c_eig_vecs[1, 0], c_eig_vecs[0, 0])
+
+    # Calculate the sigma_tau value (Szuberla et al. 2006).
+    tau_w = y_var[weights]
+    residuals = tau_w - xij_w @ z_final
+    val = (tau_w.T @ residuals)[0, 0] / (xij_w.shape[0] - dimension_number)
+    sigma_tau = np.sqrt(val) if val >= 0 else np.nan
+
+    return vel, baz, weights, sigma_tau, c_eig_vals, eig_vec_ang, sx, sy
+
+
+@jit(nopython=True, parallel=True, cache=True)
+def post_process_windows(nits, tau, xij, coeffs, h, raw_factor, rew_factor1, rew_factor2, quantile, dimension_number, co_array_num, lts_vel, lts_baz, element_weights, sigma_tau):
+    """ Run ``post_process_window`` for all windows on the numba thread pool.
+
+    Returns the processed-window mask, the co-array eigenvalues and
+    eigenvector angles, and the final slowness vectors needed for the
+    uncertainty ellipses.
+    """
+    processed = np.zeros(nits, dtype=np.bool_)
+    c_eig_vals = np.full((dimension_number, nits), np.nan)
+    eig_vec_ang = np.full(nits, np.nan)
+    slowness = np.full((dimension_number, nits), np.nan)
+    for jj in prange(nits):
+
+        # Check for data spike:
+        if np.count_nonzero(tau[:, jj, :]) < (co_array_num - 2):
+            # We have a data spike, so do not process.
+            continue
+
+        vel, baz, weights, sig, vals, ang, sx, sy = post_process_window(
+            tau[:, jj, :], xij, coeffs[:, jj], h, raw_factor, rew_factor1, rew_factor2, quantile, dimension_number, co_array_num) # noqa
+        lts_vel[jj] = vel
+        lts_baz[jj] = baz
+        sigma_tau[jj] = sig
+        c_eig_vals[:, jj] = vals
+        eig_vec_ang[jj] = ang
+        slowness[0, jj] = sx
+        slowness[1, jj] = sy
+        # Cast weights to int for output
+        for kk in range(co_array_num):
+            element_weights[kk, jj] = 1 if weights[kk] else 0
+        processed[jj] = True
+
+    return processed, c_eig_vals, eig_vec_ang, slowness
+
+
 ###########
 # functions
 ###########
@@ -344,212 +494,45 @@ def rew_consfactor_lts(weights, p, n):
     return cdelta_rew
 
 
-def cubicEqn(a, b, c):
-    r"""
-    Roots of cubic equation in the form :math:`x^3 + ax^2 + bx + c = 0`.
-
-    Args:
-        a (int or float): Scalar coefficient of cubic equation, can be
-            complex
-        b (int or float): Same as above
-        c (int or float): Same as above
-
-    Returns:
-        list: Roots of cubic equation in standard form
+def _quartic_roots(coeffs):
+    r""" Roots of monic quartics :math:`x^4 + c_1x^3 + c_2x^2 + c_3x + c_4`.
 
-    See Also:
-        :func:`numpy.roots` — Generic polynomial root finder
-
-    Notes:
-        Relatively stable solutions, with some tweaks by Dr. Z,
-        per algorithm of Numerical Recipes 2nd ed., :math:`\S` 5.6. Even
-        :func:`numpy.roots` can have some (minor) issues; e.g.,
-        :math:`x^3 - 5x^2 + 8x - 4 = 0`.
+    Batched version of :func:`numpy.roots`: eigenvalues of the companion
+    matrices of the ``(m, 4)`` coefficient array ``[c_1, c_2, c_3, c_4]``.
     """
-
-    Q = a*a/9 - b/3
-    R = (3*c - a*b)/6 + a*a*a/27
-    Q3 = Q*Q*Q
-    R2 = R*R
-    ao3 = a/3
-
-    # Q & R are real
-    if np.isreal([a, b, c]).all():
-        # 3 real roots
-        if R2 < Q3:
-            sqQ = -2 * np.sqrt(Q)
-            theta = np.arccos(R / np.sqrt(Q3))
-            # This solution first published in 1615 by Viète!
-            x = [sqQ * np.cos(theta / 3) - ao3,
-                 sqQ * np.cos((theta + 2 * np.pi) / 3) - ao3,
-                 sqQ * np.cos((theta - 2 * np.pi) / 3) - ao3]
-        # Q & R real, but 1 real, 2 complex roots
-        else:
-            # this is req'd since np.sign(0) = 0
-            if R != 0:
-                A = -np.sign(R) * (np.abs(R) + np.sqrt(R2 - Q3)) ** (1 / 3)
-            else:
-                A = -np.sqrt(-Q3) ** (1 / 3)
-            if A == 0:
-                B = 0
-            else:
-                B = Q/A
-            # one real root & two conjugate complex ones
-            x = [
-                (A+B) - ao3,
-                -.5 * (A+B) + 1j * np.sqrt(3) / 2 * (A - B) - ao3,
-                -.5 * (A+B) - 1j * np.sqrt(3) / 2 * (A - B) - ao3]
-    # Q & R complex, so also 1 real, 2 complex roots
-    else:
-        sqR2mQ3 = np.sqrt(R2 - Q3)
-        if np.real(np.conj(R) * sqR2mQ3) >= 0:
-            A = -(R+sqR2mQ3)**(1/3)
-        else:
-            A = -(R-sqR2mQ3)**(1/3)
-        if A == 0:
-            B = 0
-        else:
-            B = Q/A
-        # one real root & two conjugate complex ones
-        x = [
-            (A+B) - ao3,
-            -.5 * (A+B) + 1j * np.sqrt(3) / 2 * (A - B) - ao3,
-            -.5 * (A+B) - 1j * np.sqrt(3) / 2 * (A - B) - ao3
-                ]
-    # parse real and/or int roots for tidy output
-    for k in range(0, 3):
-        if np.real(x[k]) == x[k]:
-            x[k] = float(np.real(x[k]))
-            if int(x[k]) == x[k]:
-                x[k] = int(x[k])
-    return x
+    companion = np.zeros((len(coeffs), 4, 4))
+    companion[:, 0, :] = -coeffs
+    companion[:, 1, 0] = companion[:, 2, 1] = companion[:, 3, 2] = 1
+    return np.linalg.eigvals(companion)
 
 
-def quadraticEqn(a, b, c):
+def ellipse_extrema(a, b, x0, y0):
     r"""
-    Roots of quadratic equation in the form :math:`ax^2 + bx + c = 0`.
-
-    Args:
-        a (int or float): Scalar coefficient of quadratic equation, can be
-            complex
-        b (int or float): Same as above
-        c (int or float): Same as above
-
-    Returns:
-        list: Roots of quadratic equation in standard form
-
-    See Also:
-        :func:`numpy.roots` — Generic polynomial root finder
-
-    Notes:
-        Stable solutions, even for :math:`b^2 >> ac` or complex coefficients,
-        per algorithm of Numerical Recipes 2nd ed., :math:`\S` 5.6.
-    """
-
-    # real coefficient branch
-    if np.isreal([a, b, c]).all():
-        # note np.sqrt(-1) = nan, so force complex argument
-        if b:
-            # std. sub-branch
-            q = -0.5*(b + np.sign(b) * np.sqrt(complex(b * b - 4 * a * c)))
-        else:
-            # b = 0 sub-branch
-            q = -np.sqrt(complex(-a * c))
-    # complex coefficient branch
-    else:
-        if np.real(np.conj(b) * np.sqrt(b * b - 4 * a * c)) >= 0:
-            q = -0.5*(b + np.sqrt(b * b - 4 * a * c))
-        else:
-            q = -0.5*(b - np.sqrt(b * b - 4 * a * c))
-    # stable root solution
-    x = [q/a, c/q]
-    # parse real and/or int roots for tidy output
-    for k in 0, 1:
-        if np.real(x[k]) == x[k]:
-            x[k] = float(np.real(x[k]))
-            if int(x[k]) == x[k]:
-                x[k] = int(x[k])
-    return x
-
-
-def quarticEqn(a, b, c, d):
-    r"""
-    Roots of quartic equation in the form :math:`x^4 + ax^3 + bx^2 +
-    cx + d = 0`.
-
-    Args:
-        a (int or float): Scalar coefficient of quartic equation, can be
-            complex
-        b (int or float): Same as above
-        c (int or float): Same as above
-        d (int or float): Same as above
-
-    Returns:
-        list: Roots of quartic equation in standard form
-
-    See Also:
-        :func:`numpy.roots` — Generic polynomial root finder
-
-    Notes:
-        Stable solutions per algorithm of CRC Std. Mathematical Tables, 29th
-        ed.
-    """
+    Calculate angles subtending, and extremal distances to, coordinate-aligned
+    ellipses from the origin.
 
-    # find *any* root of resolvent cubic
-    a2 = a*a
-    y = cubicEqn(-b, a*c - 4*d, (4*b - a2)*d - c*c)
-    y = y[0]
-    # find R
-    R = np.sqrt(a2 / 4 - (1 + 0j) * b + y)  # force complex in sqrt
-    foo = 3*a2/4 - R*R - 2*b
-    # Avoid dividing by zero or non-finite R which can produce warnings
-    # Use a small tolerance when testing R's magnitude.
-    eps = np.finfo(float).eps
-    if np.isfinite(R) and np.abs(R) > eps:
-        # R is sufficiently non-zero/finite; safe to divide
-        D = np.sqrt(foo + (a * b - 2 * c - a2 * a / 4) / R)
-        E = np.sqrt(foo - (a * b - 2 * c - a2 * a / 4) / R)
-    else:
-        # Fallback: use alternative expression avoiding division by R
-        sqrtTerm = 2 * np.sqrt(y * y - (4 + 0j) * d)  # force complex in sqrt
-        D = np.sqrt(foo + sqrtTerm)
-        E = np.sqrt(foo - sqrtTerm)
-    x = [-a/4 + R/2 + D/2,
-         -a/4 + R/2 - D/2,
-         -a/4 - R/2 + E/2,
-         -a/4 - R/2 - E/2]
-    # parse real and/or int roots for tidy output
-    for k in range(0, 4):
-        if np.real(x[k]) == x[k]:
-            x[k] = float(np.real(x[k]))
-            if int(x[k]) == x[k]:
-                x[k] = int(x[k])
-
-    return x
-
-
-def rthEllipse(a, b, x0, y0):
-    r"""
-    Calculate angles subtending, and extremal distances to, a
-    coordinate-aligned ellipse from the origin.
+    Distances are the real roots of two quartics (:func:`_quartic_roots`),
+    polished with Newton steps; tangency angles come from a quadratic.
+    Ellipses without a valid solution (e.g. NaN axes) give NaN rows.
 
     Args:
-        a (float): Semi-major axis of ellipse
-        b (float): Semi-minor axis of ellipse
-        x0 (float): Horizontal center of ellipse
-        y0 (float): Vertical center of ellipse
+        a (array): Semi-major axes of the ellipses
+        b (array): Semi-minor axes of the ellipses
+        x0 (array): Horizontal centers of the ellipses
+        y0 (array): Vertical centers of the ellipses
 
     Returns:
         tuple: Tuple containing:
 
-        - **eExtrm** – Extremal parameters in ``(4, )`` array as
+        - **eExtrm** – Extremal parameters in ``(n, 4)`` array, one row per
+          ellipse as
 
           .. code-block:: none
 
             [min distance, max distance, min angle (degrees), max angle (degrees)]
 
-        - **eVec** – Coordinates of extremal points on ellipse in ``(4, 2)``
-          array as
+        - **eVec** – Coordinates of extremal points on the ellipses in
+          ``(n, 4, 2)`` array, one ``(4, 2)`` block per ellipse as
 
           .. code-block:: none
 
@@ -558,92 +541,166 @@ def rthEllipse(a, b, x0, y0):
              [x max angle tangency, y max angle tangency],
              [x min angle tangency, y min angle tangency]]
     """
-
-    # set constants
-    A = 2/a**2
-    B = 2*x0/a**2
-    C = 2/b**2
-    D = 2*y0/b**2
-    E = (B*x0+D*y0)/2-1
-    F = C-A
-    G = A/2
-    H = C/2
-    eExtrm = np.zeros((4,))
-    eVec = np.zeros((4, 2))
+    a, b, x0, y0 = [np.atleast_1d(np.asarray(v, dtype=float)) for v in np.broadcast_arrays(a, b, x0, y0)]
+    n = len(a)
+    eExtrm = np.full((n, 4), np.nan)
+    eVec = np.full((n, 4, 2), np.nan)
     eps = np.finfo(np.float64).eps
 
     # some tolerances for numerical errors
     circTol = 1e8  # is it circular to better than circTol*eps?
     zeroTol = 1e4  # is center along a coord. axis to better than zeroTol*eps?
     magTol = 1e-5  # is a sol'n within ellipse*(1+magTol) (magnification)
+    realTol = 1e-8  # relative imaginary part of a real quartic root
+
+    with np.errstate(all='ignore'):
+        # set constants
+        A = 2/a**2
+        B = 2*x0/a**2
+        C = 2/b**2
+        D = 2*y0/b**2
+        E = (B*x0+D*y0)/2-1
+        F = C-A
+        G = A/2
+        H = C/2
+
+        circle = np.abs(F) <= circTol * eps
+        on_x = ~circle & (np.abs(y0) < zeroTol * eps)
+        on_y = ~circle & ~on_x & (np.abs(x0) < zeroTol * eps)
+        general = ~(circle | on_x | on_y)
 
-    # pursue circular or elliptical solutions
-    if np.abs(F) <= circTol * eps:
         # circle
         cent = np.sqrt(x0 ** 2 + y0 ** 2)
-        eExtrm[0:2] = cent + np.array([-a, a])
-        eVec[0:2, :] = np.array([
-            [x0-a*x0/cent, y0-a*y0/cent],
-            [x0+a*x0/cent, y0+a*y0/cent]])
-    else:
-        # ellipse
-        # check for trivial distance sol'n
-        if np.abs(y0) < zeroTol * eps:
-            eExtrm[0:2] = x0 + np.array([-a, a])
-            eVec[0:2, :] = np.vstack((eExtrm[0:2], [0, 0])).T
-        elif np.abs(x0) < zeroTol * eps:
-            eExtrm[0:2] = y0 + np.array([-b, b])
-            eVec[0:2, :] = np.vstack(([0, 0], eExtrm[0:2])).T
-        else:
-            # use dual solutions of quartics to find best, real-valued results
-            # solve quartic for y
-            fy = F**2*H
-            y = quarticEqn(-D*F*(2*H+F)/fy,
-                           (B**2*(G+F)+E*F**2+D**2*(H+2*F))/fy,
-                           -D*(B**2+2*E*F+D**2)/fy, (D**2*E)/fy)
-            y = np.array([y[i] for i in list(np.where(y == np.real(y))[0])])
-            xy = B*y / (D-F*y)
-            # solve quartic for x
-            fx = F**2*G
-            x = quarticEqn(B*F*(2*G-F)/fx, (B**2*(G-2*F)+E*F**2+D**2*(H-F))/fx,
-                           B*(2*E*F-B**2-D**2)/fx, (B**2*E)/fx)
-            x = np.array([x[i] for i in list(np.where(x == np.real(x))[0])])
-            yx = D*x / (F*x+B)
+        eExtrm[circle, 0] = cent[circle] - a[circle]
+        eExtrm[circle, 1] = cent[circle] + a[circle]
+        eVec[circle, 0] = np.column_stack((x0 - a*x0/cent, y0 - a*y0/cent))[circle]
+        eVec[circle, 1] = np.column_stack((x0 + a*x0/cent, y0 + a*y0/cent))[circle]
+        # trivial distance sol'ns, center on a coordinate axis
+        eExtrm[on_x, 0] = eVec[on_x, 0, 0] = x0[on_x] - a[on_x]
+        eExtrm[on_x, 1] = eVec[on_x, 1, 0] = x0[on_x] + a[on_x]
+        eVec[on_x, 0:2, 1] = 0
+        eExtrm[on_y, 0] = eVec[on_y, 0, 1] = y0[on_y] - b[on_y]
+        eExtrm[on_y, 1] = eVec[on_y, 1, 1] = y0[on_y] + b[on_y]
+        eVec[on_y, 0:2, 0] = 0
+
+        # use dual solutions of quartics to find best, real-valued results
+        fy = F**2*H
+        cy = np.column_stack((-D*F*(2*H+F)/fy,
+                              (B**2*(G+F)+E*F**2+D**2*(H+2*F))/fy,
+                              -D*(B**2+2*E*F+D**2)/fy, (D**2*E)/fy))
+        fx = F**2*G
+        cx = np.column_stack((B*F*(2*G-F)/fx, (B**2*(G-2*F)+E*F**2+D**2*(H-F))/fx,
+                              B*(2*E*F-B**2-D**2)/fx, (B**2*E)/fx))
+        general &= np.isfinite(cy).all(axis=1) & np.isfinite(cx).all(axis=1)
+        gen = np.flatnonzero(general)
+        failed = (circle | on_x | on_y | general) == 0
+        if len(gen):
+            y = _quartic_roots(cy[gen])
+            x = _quartic_roots(cx[gen])
+            y = np.where(np.abs(y.imag) <= realTol * np.maximum(np.abs(y), 1e-300), y.real, np.nan)
+            x = np.where(np.abs(x.imag) <= realTol * np.maximum(np.abs(x), 1e-300), x.real, np.nan)
+            Bg, Dg, Fg = B[gen, None], D[gen, None], F[gen, None]
+            xy = Bg*y / (Dg-Fg*y)
+            yx = Dg*x / (Fg*x+Bg)
             # combine both approaches
-            distE = np.hstack(
-                (np.sqrt(x ** 2 + yx ** 2), np.sqrt(xy ** 2 + y ** 2)))
+            coords = np.stack((np.hstack((x, xy)), np.hstack((yx, y))), axis=-1)
+            # Polish the roots (ill-conditioned for very eccentric ellipses)
+            # with Newton steps on the stationarity condition of the squared
+            # distance in the ellipse's angular parameter
+            ag, bg, x0g, y0g = a[gen, None], b[gen, None], x0[gen, None], y0[gen, None]
+            th = np.arctan2((coords[..., 1] - y0g) / bg, (coords[..., 0] - x0g) / ag)
+            for _ in range(3):
+                g = (bg**2 - ag**2) * np.sin(th) * np.cos(th) - ag*x0g*np.sin(th) + bg*y0g*np.cos(th)
+                dg = (bg**2 - ag**2) * np.cos(2*th) - ag*x0g*np.cos(th) - bg*y0g*np.sin(th)
+                th = th - np.where(dg != 0, g / dg, 0)
+            coords = np.stack((x0g + ag*np.cos(th), y0g + bg*np.sin(th)), axis=-1)
+            distE = np.sqrt(coords[..., 0] ** 2 + coords[..., 1] ** 2)
             # trap real, but bogus sol's (esp. near Th = 180)
-            distEidx = np.where(
-                (distE <= np.sqrt(x0 ** 2 + y0 ** 2)
-                 + np.max([a, b]) * (1 + magTol))
-                & (distE >= np.sqrt(x0 ** 2 + y0 ** 2)
-                   - np.max([a, b]) * (1 + magTol)))
-            coords = np.hstack(((x, yx), (xy, y))).T
-            coords = coords[distEidx, :][0]
-            distE = distE[distEidx]
-            eExtrm[0:2] = [distE.min(), distE.max()]
-            eVec[0:2, :] = np.vstack(
-                (coords[np.where(distE == distE.min()), :][0][0],
-                 coords[np.where(distE == distE.max()), :][0][0]))
-    # angles subtended
-    if x0 < 0:
-        x0 = -x0
-        y = -np.array(quadraticEqn(D ** 2 + B ** 2 * H / G, 4 * D * E,
-                                   4 * E ** 2 - B ** 2 * E / G))
-        x = -np.sqrt(E / G - H / G * y ** 2)
-    else:
-        y = -np.array(quadraticEqn(D ** 2 + B ** 2 * H / G, 4 * D * E,
-                                   4 * E ** 2 - B ** 2 * E / G))
-        x = np.sqrt(E / G - H / G * y ** 2)
-    eVec[2:, :] = np.vstack((np.real(x), np.real(y))).T
-    # various quadrant fixes
-    if x0 == 0 or np.abs(x0) - a < 0:
-        eVec[2, 0] = -eVec[2, 0]
-    eExtrm[2:] = np.sort(np.arctan2(eVec[2:, 1], eVec[2:, 0]) / np.pi * 180)
+            tol = (np.maximum(a, b) * (1 + magTol))[gen, None]
+            keep = (distE <= cent[gen, None] + tol) & (distE >= cent[gen, None] - tol)
+            found = keep.any(axis=1)
+            i_min = np.argmin(np.where(keep, distE, np.inf), axis=1)
+            i_max = np.argmax(np.where(keep, distE, -np.inf), axis=1)
+            rows = np.arange(len(gen))
+            eExtrm[gen, 0] = np.where(found, distE[rows, i_min], np.nan)
+            eExtrm[gen, 1] = np.where(found, distE[rows, i_max], np.nan)
+            eVec[gen, 0] = np.where(found[:, None], coords[rows, i_min], np.nan)
+            eVec[gen, 1] = np.where(found[:, None], coords[rows, i_max], np.nan)
+            failed[gen[~found]] = True
+
+        # angles subtended
+        qa = D ** 2 + B ** 2 * H / G
+        qb = 4 * D * E
+        qc = 4 * E ** 2 - B ** 2 * E / G
+        # numerically stable quadratic roots
+        q = np.where(qb != 0,
+                     -0.5*(qb + np.sign(qb) * np.sqrt((qb * qb - 4 * qa * qc).astype(complex))),
+                     -np.sqrt((-qa * qc).astype(complex)))
+        y = -np.column_stack((q/qa, qc/q))
+        # real roots stay real (NaN x outside the ellipse)
+        real_roots = (y.imag == 0).all(axis=1)
+        x_sq = (E / G)[:, None] - (H / G)[:, None] * y ** 2
+        x = np.where(real_roots[:, None], np.sqrt(x_sq.real), np.sqrt(x_sq).real)
+        x = np.where((x0 < 0)[:, None], -x, x)
+        eVec[:, 2:, 0] = x
+        eVec[:, 2:, 1] = y.real
+        # various quadrant fixes
+        flip = (x0 == 0) | (np.abs(x0) - a < 0)
+        eVec[flip, 2, 0] = -eVec[flip, 2, 0]
+        eExtrm[:, 2:] = np.sort(np.arctan2(eVec[:, 2:, 1], eVec[:, 2:, 0]) / np.pi * 180, axis=1)
+
+    # No valid distance solution
+    eExtrm[failed] = np.nan
+    eVec[failed] = np.nan
 
     return eExtrm, eVec
 
 
+def ellipse_conf_int(sx, sy, sigma_tau, c_eig_vals, eig_vec_ang, p):
+    r""" Trace velocity and back-azimuth confidence intervals for all windows.
+
+    Uncertainty ellipses after Szuberla & Olson (2004), with extrema from
+    :func:`ellipse_extrema`.
+
+    Args:
+        sx (array): x-components of the slowness vectors.
+        sy (array): y-components of the slowness vectors.
+        sigma_tau (array): sigma_tau of each window.
+        c_eig_vals (array): ``(2, n)`` (or ``(2,)``) co-array eigenvalues.
+        eig_vec_ang (array): Angle(s) of the first co-array eigenvector.
+        p (float): Confidence value, e.g. 0.90.
+
+    Returns:
+        (tuple):
+            ``conf_int_vel`` (array): Trace velocity confidence intervals.
+            ``conf_int_baz`` (array): Back-azimuth confidence intervals.
+    """
+    # Chi^2; special closed form for 2 degrees of freedom
+    chi2 = -2 * np.log(1 - p)
+    c_eig_vals = np.asarray(c_eig_vals, dtype=float).reshape(2, -1)
+    cos_ang = np.cos(eig_vec_ang)
+    sin_ang = np.sin(eig_vec_ang)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Equation 16 (Szuberla & Olson, 2004)
+        sigS = sigma_tau / np.sqrt(c_eig_vals)
+        # Rotate uncertainty ellipse to align major/minor axes
+        # along coordinate system axes
+        eExtrm, eVec = ellipse_extrema(np.sqrt(chi2) * sigS[0], np.sqrt(chi2) * sigS[1],
+                                       cos_ang * sx + sin_ang * sy, -sin_ang * sx + cos_ang * sy)
+        # Rotate tangency points back to original orientation
+        cos_ang = np.broadcast_to(cos_ang, len(eVec))[:, None]
+        sin_ang = np.broadcast_to(sin_ang, len(eVec))[:, None]
+        ex = eVec[:, 2:, 0] * cos_ang - eVec[:, 2:, 1] * sin_ang
+        ey = eVec[:, 2:, 0] * sin_ang + eVec[:, 2:, 1] * cos_ang
+        # Fix up angle calculations
+        theta = (np.arctan2(ey, ex) * 180 / np.pi - 360) % 360
+        sig_theta = np.abs(theta[:, 1] - theta[:, 0])
+        sig_theta = np.where(sig_theta > 180, np.abs(sig_theta - 360), sig_theta)
+        # Halving here s.t. +/- value expresses uncertainty bounds.
+        conf_int_vel = 0.5 * np.abs(1 / eExtrm[:, 1] - 1 / eExtrm[:, 0])
+    return conf_int_vel, 0.5 * sig_theta
+
+
 def post_process(dimension_number, co_array_num, alpha, h, nits, tau, xij, coeffs, lts_vel, lts_baz, element_weights, sigma_tau, p, conf_int_vel, conf_int_baz):
 
     # Initial fit - correction factor to make LTS approximately unbiased
@@ -652,123 +709,23 @@ def post_process(dimension_number, co_array_num, alpha, h, nits, tau, xij, coeff
     raw_factor *= raw_consfactor_lts(h, co_array_num)
     # Final fit - correction factor to make LTS approximately unbiased
     rew_factor1 = rew_corfactor_lts(dimension_number, co_array_num, alpha)
+    # Final fit - correction factor to make LTS approximately normally
+    # distributed, tabulated by the number of points with weight = 1
+    rew_factor2 = np.full(co_array_num + 1, np.nan)
+    for kk in range(1, co_array_num):
+        rew_factor2[kk] = rew_consfactor_lts(np.ones(kk, dtype=bool), dimension_number, co_array_num)
     # Value of the normal inverse distribution function
     # at 0.9875 (98.75%)
     quantile = 2.2414027276049473
-    # Co-array
-    X_var = xij
-    # Chi^2; default is 90% confidence (p = 0.90)
-    # Special closed form for 2 degrees of freedom
-    chi2 = -2 * np.log(1 - p)
-
-    for jj in range(0, nits):
-
-        # Check for data spike:
-        if np.count_nonzero(tau[:, jj, :]) < (co_array_num - 2):
-            # We have a data spike, so do not process.
-            continue
-
-        # Now use original arrays
-        y_var = tau[:, jj, :]
-
-        residuals = y_var - (
-            X_var @ coeffs[:, jj].reshape(dimension_number, 1))
-        sor = np.sort(residuals.flatten()**2)
-        s0 = np.sqrt(np.sum(sor[0:h]) / h) * raw_factor
-
-        if np.abs(s0) < 1e-7:
-            weights = (np.abs(residuals) < 1e-7)
-            z_final = coeffs[:, jj].reshape(dimension_number, 1)
-        else:
-            weights = (np.abs(residuals / s0) <= quantile)
-            weights = weights.flatten()
-            # Cast logical to int
-            weights_int = weights * 1
-
-            # Perform the weighted least squares fit with
-            # only data points with weight = 1
-            # to increase statistical efficiency.
-            q, r = np.linalg.qr(X_var[weights, :])
-            qt = q.conj().T @ y_var[weights]
-            z_final = np.linalg.lstsq(r, qt)[0]
-
-            # Find dropped data points
-            # Final residuals
-            residuals = y_var - (X_var @ z_final)
-            weights_num = np.sum(weights_int)
-            scale = np.sqrt(np.sum(residuals[weights]**2) / (weights_num - 1))
-            scale *= rew_factor1
-            if weights_num != co_array_num:
-                # Final fit - correction factor to make LTS approximately normally distributed # noqa
-                rew_factor2 = rew_consfactor_lts(weights, dimension_number, co_array_num) # noqa
-                scale *= rew_factor2
-            weights = np.abs(residuals / scale) <= 2.5
-            weights = weights.flatten()
-
-        # Trace velocity & back-azimuth conversion
-        # x-component of slowness vector
-        sx = z_final[0][0]
-        # y-component of slowness vector
-        sy = z_final[1][0]
-        # Calculate trace velocity from slowness
-        lts_vel[jj] = 1/np.linalg.norm(z_final, 2)
-        # Convert baz from mathematical CCW from E
-        # to geographical CW from N. baz = arctan(sx/sy)
-        lts_baz[jj] = (np.arctan2(sx, sy) * 180 / np.pi - 360) % 360
-
-        # Uncertainty Quantification - Szuberla & Olson, 2004
-        # Compute co-array eigendecomp. for uncertainty calcs.
-        c_eig_vals, c_eig_vecs = np.linalg.eigh(xij[weights, :].T @ xij[weights, :])
-        eig_vec_ang = np.arctan2(c_eig_vecs[1, 0], c_eig_vecs[0, 0])
-        R = np.array([[np.cos(eig_vec_ang), np.sin(eig_vec_ang)],
-                      [-np.sin(eig_vec_ang), np.cos(eig_vec_ang)]])
-
-        # Calculate the sigma_tau value (Szuberla et al. 2006).
-        residuals = tau[weights, jj, :] - (xij[weights, :] @ z_final)
-        m_w, _ = np.shape(xij[weights, :])
-        with np.errstate(invalid='raise'):
-            try:
-                val = np.sqrt(tau[weights, jj, :].T @ residuals / (
-                    m_w - dimension_number))
-                # ensure a Python scalar (avoid 1-element array -> scalar conversion deprecation)
-                sigma_tau[jj] = float(np.asarray(val).item())
-            except FloatingPointError:
-                pass
-
-        # Equation 16 (Szuberla & Olson, 2004)
-        sigS = sigma_tau[jj] / np.sqrt(c_eig_vals)
-        # Form uncertainty ellipse major/minor axes
-        a = np.sqrt(chi2) * sigS[0]
-        b = np.sqrt(chi2) * sigS[1]
-        # Rotate uncertainty ellipse to align major/minor axes
-        # along coordinate system axes
-        So = R @ [sx, sy]
-        # Find angle & slowness extrema
-        try:
-            eExtrm, eVec = rthEllipse(a, b, So[0], So[1])
-        except ValueError:
-            eExtrm = np.array([np.nan, np.nan, np.nan, np.nan])
-            eVec = np.array([[np.nan, np.nan], [np.nan, np.nan], [np.nan, np.nan], [np.nan, np.nan]])
-        # Rotate eigenvectors back to original orientation
-        eVec = eVec @ R
-        # Fix up angle calculations
-        sig_theta = np.abs(np.diff(
-            (np.arctan2(eVec[2:, 1], eVec[2:, 0]) * 180 / np.pi - 360)
-            % 360))
-        # diff returns a 1-element array; convert to scalar
-        sig_theta = float(np.asarray(sig_theta).item())
-        if sig_theta > 180:
-            sig_theta = np.abs(sig_theta - 360)
 
-        # Halving here s.t. +/- value expresses uncertainty bounds.
-        # Remove the 1/2's to get full values to express
-        # coverage ellipse area.
-        conf_int_baz[jj] = 0.5 * sig_theta
-        # extract scalar from 1-element diff result
-        conf_int_vel[jj] = float((0.5 * np.abs(np.diff(1 / eExtrm[:2]))).item())
+    # Reweighted fits, trace velocity, back-azimuth and sigma_tau
+    processed, c_eig_vals, eig_vec_ang, slowness = post_process_windows(
+        nits, tau, xij, coeffs, h, raw_factor, rew_factor1, rew_factor2, quantile, dimension_number, co_array_num, lts_vel, lts_baz, element_weights, sigma_tau) # noqa
 
-        # Cast weights to int for output
-        element_weights[:, jj] = weights * 1
+    # Uncertainty Quantification - Szuberla & Olson, 2004
+    idx = np.flatnonzero(processed)
+    conf_int_vel[idx], conf_int_baz[idx] = ellipse_conf_int(
+        slowness[0, idx], slowness[1, idx], sigma_tau[idx], c_eig_vals[:, idx], eig_vec_ang[idx], p)
 
     return lts_vel, lts_baz, element_weights, sigma_tau, conf_int_vel, conf_int_baz
 
@@ -802,6 +759,111 @@ def array_from_weights(weightarray, idx):
     return fstations
 
 
+def parabolic_peak(cc):
+    """ Maximum of sampled curves refined by a parabola through the peak.
+
+    Args:
+        cc (array): Sampled curves along the last axis, e.g. cross-correlations.
+
+    Returns:
+        (tuple):
+            ``peak`` (array): Interpolated maximum value of each curve.
+            ``lag`` (array): Fractional sample index of each maximum.
+    """
+    n = cc.shape[-1]
+    idx = np.argmax(cc, axis=-1)[..., None]
+    y0 = np.take_along_axis(cc, idx, axis=-1)[..., 0]
+    ym = np.take_along_axis(cc, np.maximum(idx - 1, 0), axis=-1)[..., 0]
+    yp = np.take_along_axis(cc, np.minimum(idx + 1, n - 1), axis=-1)[..., 0]
+    idx = idx[..., 0]
+    curvature = ym - 2 * y0 + yp
+    # No refinement at the ends or on flat tops
+    ok = (idx > 0) & (idx < n - 1) & (curvature < 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        delta = np.where(ok, 0.5 * (ym - yp) / curvature, 0.0)
+    return y0 - 0.25 * (ym - yp) * delta, idx + delta
+
+
+@contextmanager
+def numba_threads(n_jobs):
+    """ Run numba parallel loops on ``n_jobs`` threads inside the context.
+
+    Args:
+        n_jobs (int): Number of threads; -1 uses all available cores. Values
+            are clipped to ``[1, numba.config.NUMBA_NUM_THREADS]``.
+    """
+    n_max = numba.config.NUMBA_NUM_THREADS
+    n_threads = n_max if n_jobs == -1 else min(max(int(n_jobs), 1), n_max)
+    previous = numba.get_num_threads()
+    numba.set_num_threads(n_threads)
+    try:
+        yield
+    finally:
+        numba.set_num_threads(previous)
+
+
+# Random subsets and QR factors per co-array, {(co-array bytes, n_sets): (subsets, q_t, r_sub)}
+_SUBSET_CACHE = {}
+
+
+def cached_lts_subsets(xij_standardized, n_sets):
+    """ Return ``lts_subsets`` for a co-array, computed once per process.
+
+    Args:
+        xij_standardized (array): Standardized co-array coordinates.
+        n_sets (int): Number of random subsets to draw.
+
+    Returns:
+        (tuple):
+            ``subsets`` (array): Co-array row indices of each subset.
+            ``q_t`` (array): Transposed Q factor of each subset.
+            ``r_sub`` (array): R factor of each subset.
+    """
+    xij_standardized = np.ascontiguousarray(xij_standardized, dtype=np.float64)
+    key = (xij_standardized.shape, xij_standardized.tobytes(), n_sets)
+    if key not in _SUBSET_CACHE:
+        co_array_num, dimension_number = xij_standardized.shape
+        _SUBSET_CACHE[key] = lts_subsets(xij_standardized, co_array_num, dimension_number, n_sets)
+    return _SUBSET_CACHE[key]
+
+
+@lru_cache(maxsize=32)
+def _co_array(rij_shape, rij_bytes):
+    rij = np.frombuffer(rij_bytes, dtype=np.float64).reshape(rij_shape)
+    nchans = rij_shape[1]
+    # Calculate element pair indices
+    idx_pair = tuple((ii, jj) for ii in range(nchans - 1) for jj in range(ii + 1, nchans)) # noqa
+    # Calculate the co-array
+    xij = rij[:, np.array([ii[0] for ii in idx_pair])] - rij[:, np.array([jj[1] for jj in idx_pair])] # noqa
+    xij = xij.T
+    # Calculate median absolute deviation and standardized
+    # co-array coordinates for least squares fit.
+    xij_standardized = np.zeros_like(xij)
+    xij_mad = np.zeros(2)
+    for jj in range(0, 2):
+        xij_mad[jj] = 1.4826 * np.median(np.abs(xij[:, jj]))
+        xij_standardized[:, jj] = xij[:, jj] / xij_mad[jj]
+    return idx_pair, xij, xij_standardized, xij_mad
+
+
+def cached_co_array(rij):
+    """ Return the co-array of an array, computed once per geometry (LRU).
+
+    Args:
+        rij (array): Cartesian element coordinates, shape (2, nchans) [km].
+
+    Returns:
+        (tuple):
+            ``idx_pair`` (tuple): Element index pair of each co-array row.
+            ``xij`` (array): Co-array coordinates.
+            ``xij_standardized`` (array): Co-array divided by its MAD.
+            ``xij_mad`` (array): Median absolute deviation of ``xij``.
+        The arrays are shared between callers and must not be modified.
+    """
+    rij = np.ascontiguousarray(rij, dtype=np.float64)
+    return _co_array(rij.shape, rij.tobytes())
+
+
 ##################
 # Class definitions
 ##################
@@ -811,96 +873,143 @@ class LsBeam:
     def __init__(self, data):
         # 2D Beamforming (trace_velocity and back-azimuth)
         self.dimension_number = 2
+        # Calculate co-array and indices
+        self.calculate_co_array(data)
+        # Co-array size is N choose 2, N = num. of array elements
+        self.co_array_num = int((data.nchans * (data.nchans - 1)) / 2)
+        # Confidence value for uncertainty calculation
+        self.p = 0.90
         # Pre-allocate Arrays
+        self.allocate(data.nits)
+        # Check co-array rank for least squares problem
+        if (np.linalg.matrix_rank(self.xij) < self.dimension_number):
+            raise RuntimeError('Co-array is ill posed for the least squares problem. Check array coordinates. xij rank < ' + str(self.dimension_number))
+
+    def allocate(self, nits):
+        """ Pre-allocate the per-window results for ``nits`` time windows.
+
+        The co-array (and anything derived from it) is kept, so the same
+        estimator can be reused for successive batches of windows.
+
+        Args:
+            nits (int): The number of time windows.
+        """
         # Median of the cross-correlation maxima
-        self.mdccm = np.full(data.nits, np.nan)
+        self.mdccm = np.full(nits, np.nan)
         # Time
-        self.t = np.full(data.nits, np.nan)
+        self.t = np.full(nits, np.nan)
         # Trace Velocity [m/s]
-        self.lts_vel = np.full(data.nits, np.nan)
+        self.lts_vel = np.full(nits, np.nan)
         # Back-azimuth [degrees]
-        self.lts_baz = np.full(data.nits, np.nan)
-        # Calculate co-array and indices
-        self.calculate_co_array(data)
-        # Co-array size is N choose 2, N = num. of array elements
-        self.co_array_num = int((data.nchans * (data.nchans - 1)) / 2)
+        self.lts_baz = np.full(nits, np.nan)
         # Pre-allocate time delays
-        self.tau = np.empty((self.co_array_num, data.nits))
+        self.tau = np.empty((self.co_array_num, nits))
         # Pre-allocate for median-absolute devation (MAD) of time delays
-        self.time_delay_mad = np.zeros(data.nits)
+        self.time_delay_mad = np.zeros(nits)
         # Confidence interval for trace velocity
-        self.conf_int_vel = np.full(data.nits, np.nan)
+        self.conf_int_vel = np.full(nits, np.nan)
         # Confidence interval for back-azimuth
-        self.conf_int_baz = np.full(data.nits, np.nan)
+        self.conf_int_baz = np.full(nits, np.nan)
         # Pre-allocate for sigma-tau
-        self.sigma_tau = np.full(data.nits, np.nan)
+        self.sigma_tau = np.full(nits, np.nan)
         # Specify station dictionary to maintain cross-compatibility
         self.stdict = {}
-        # Confidence value for uncertainty calculation
-        self.p = 0.90
-        # Check co-array rank for least squares problem
-        if (np.linalg.matrix_rank(self.xij) < self.dimension_number):
-            raise RuntimeError('Co-array is ill posed for the least squares problem. Check array coordinates. xij rank < ' + str(self.dimension_number))
 
     def calculate_co_array(self, data):
         """ Calculate the co-array coordinates (x, y) for the array.
         """
-        # Calculate element pair indices
-        self.idx_pair = [(ii, jj) for ii in range(data.nchans - 1) for jj in range(ii + 1, data.nchans)] # noqa
-        # Calculate the co-array
-        self.xij = data.rij[:, np.array([ii[0] for ii in self.idx_pair])] - data.rij[:, np.array([jj[1] for jj in self.idx_pair])] # noqa
-        self.xij = self.xij.T
-        # Calculate median absolute deviation and standardized
+        idx_pair, xij, xij_standardized, xij_mad = cached_co_array(data.rij)
+        # Element pair indices
+        self.idx_pair = list(idx_pair)
+        # The co-array, its median absolute deviation and standardized
         # co-array coordinates for least squares fit.
-        self.xij_standardized = np.zeros_like(self.xij)
-        self.xij_mad = np.zeros(2)
-        for jj in range(0, self.dimension_number):
-            self.xij_mad[jj] = 1.4826 * np.median(np.abs(self.xij[:, jj]))
-            self.xij_standardized[:, jj] = self.xij[:, jj] / self.xij_mad[jj]
+        self.xij = xij.copy()
+        self.xij_standardized = xij_standardized.copy()
+        self.xij_mad = xij_mad.copy()
 
-    def correlate(self, data):
+    def correlate(self, data, chunk_bytes=64 * 2**20):
         """ Cross correlate the time series data.
+
+        One rFFT is computed per channel per window and the cross-correlations
+        of all element pairs are formed as one batched multiply and inverse
+        transform. Windows are processed in batches to bound memory.
+
+        Args:
+            data (DataBin): The data container.
+            chunk_bytes (int): Approximate memory budget of one batch of windows.
         """
         for jj in range(0, data.nits):
             # Get time from middle of window, except for the end.
-            t0_ind = data.intervals[jj]
-            tf_ind = data.intervals[jj] + data.winlensamp
             try:
-                self.t[jj] = data.tvec[t0_ind + int(data.winlensamp/2)]
+                self.t[jj] = data.tvec[data.intervals[jj] + int(data.winlensamp/2)]
             except Exception:
                 # fallback to the current maximum t value when indexing fails
                 self.t[jj] = np.nanmax(self.t, axis=0)
 
-            # Numba doesn't accept mode='full' in np.correlate currently
-            # Cross correlate the wave forms. Get the differential times.
-            # Pre-allocate the cross-correlation matrix
-            self.cij = np.empty((data.winlensamp * 2 - 1, self.co_array_num))
-            for k in range(self.co_array_num):
-                # MATLAB's xcorr w/ 'coeff' normalization:
-                # unit auto-correlations.
-                self.cij[:, k] = (np.correlate(data.data[t0_ind:tf_ind, self.idx_pair[k][0]], data.data[t0_ind:tf_ind, self.idx_pair[k][1]], mode='full') / np.sqrt(np.sum(data.data[t0_ind:tf_ind, self.idx_pair[k][0]] * data.data[t0_ind:tf_ind, self.idx_pair[k][0]]) * np.sum(data.data[t0_ind:tf_ind, self.idx_pair[k][1]] * data.data[t0_ind:tf_ind, self.idx_pair[k][1]]))) # noqa
-            # Find the median of the cross-correlation maxima
-            self.mdccm[jj] = np.nanmedian(self.cij.max(axis=0))
-            # Form the time delay vector and save it
-            delay = np.argmax(self.cij, axis=0) + 1
-            self.tau[:, jj] = (data.winlensamp - delay) / data.sampling_rate
-            self.time_delay_mad[jj] = 1.4826 * np.median(
-                np.abs(self.tau[:, jj]))
+        cmax, imax = self._xcorr_peaks(data, chunk_bytes)
+
+        # Find the median of the cross-correlation maxima
+        self.mdccm = np.nanmedian(cmax, axis=0)
+        # Form the time delay vectors. Lag index (winlensamp - 1) is zero lag.
+        self.tau = ((data.winlensamp - 1) - imax) / data.sampling_rate
+        self.time_delay_mad = 1.4826 * np.median(np.abs(self.tau), axis=0)
 
         self.tau = np.reshape(self.tau, (self.co_array_num, data.nits, 1))
 
+    def _xcorr_peaks(self, data, chunk_bytes):
+        """ Normalized cross-correlation peaks of all pairs in all windows.
+
+        Equivalent to MATLAB's xcorr w/ 'coeff' normalization (unit
+        auto-correlations) in 'full' mode, computed via zero-padded rFFTs.
+        """
+        idx_i = np.array([ii[0] for ii in self.idx_pair])
+        idx_j = np.array([jj[1] for jj in self.idx_pair])
+        L = data.winlensamp
+        nfft = next_fast_len(2 * L - 1)
+        parabolic = data.peak_interpolation == 'parabolic'
+        cmax = np.empty((self.co_array_num, data.nits))
+        imax = np.zeros((self.co_array_num, data.nits), dtype=np.float64 if parabolic else np.int64)
+        # Windows are views into data.data: (nits, nchans, winlensamp)
+        windows = sliding_window_view(data.data, L, axis=0)[data.intervals] if data.nits else None
+        # A few (windows x pairs x nfft) float64 arrays live at once per batch
+        batch = max(1, int(chunk_bytes // (4 * 8 * nfft * max(self.co_array_num, data.nchans))))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for b0 in range(0, data.nits, batch):
+                win = windows[b0:b0 + batch]
+                spec = rfft(win, n=nfft, axis=-1)
+                energy = np.einsum('wcn,wcn->wc', win, win, dtype=np.float64)
+                # Cross-correlation x_i (*) x_j at circular lags, all pairs
+                cc = irfft(spec[:, idx_i, :] * spec[:, idx_j, :].conj(), n=nfft, axis=-1)
+                # Reorder to np.correlate 'full' layout: lags -(L-1) ... (L-1)
+                cc = np.concatenate((cc[..., nfft - (L - 1):], cc[..., :L]), axis=-1)
+                cc /= np.sqrt(energy[:, idx_i] * energy[:, idx_j])[..., None]
+                if parabolic:
+                    peak, lag = parabolic_peak(cc)
+                    cmax[:, b0:b0 + batch] = peak.T
+                    imax[:, b0:b0 + batch] = lag.T
+                else:
+                    cmax[:, b0:b0 + batch] = cc.max(axis=-1).T
+                    imax[:, b0:b0 + batch] = np.argmax(cc, axis=-1).T
+        if data.nits:
+            # Last window's correlation matrix, as the per-window loop left it
+            self.cij = cc[-1].T
+        return cmax, imax
+
 
 class OLSEstimator(LsBeam):
     """ Class for ordinary least squares beamforming."""
 
     def __init__(self, data):
         super().__init__(data)
-        # Pre-compute co-array QR factorization for least squares
-        self.q_xij, self.r_xij = np.linalg.qr(self.xij_standardized)
+        # Pre-compute co-array pseudo-inverse; every window is solved against
+        # the same design matrix
+        self.xij_pinv = np.linalg.pinv(self.xij_standardized)
 
     def solve(self, data):
         """ Calculate trace velocity, back-azimuth, MdCCM, and confidence intervals.
 
+        All windows are solved at once.
+
         Args:
             data (DataBin): The DataBin object.
         """
@@ -908,93 +1017,42 @@ class OLSEstimator(LsBeam):
         # Pre-compute co-array eigendecomp. for uncertainty calcs.
         c_eig_vals, c_eig_vecs = np.linalg.eigh(self.xij.T @ self.xij)
         eig_vec_ang = np.arctan2(c_eig_vecs[1, 0], c_eig_vecs[0, 0])
-        R = np.array([[np.cos(eig_vec_ang), np.sin(eig_vec_ang)],
-                      [-np.sin(eig_vec_ang), np.cos(eig_vec_ang)]])
-        # Chi^2; default is 90% confidence (p = 0.90)
-        # Special closed form for 2 degrees of freedom
-        chi2 = -2 * np.log(1 - self.p)
-
-        # Loop through time
-        for jj in range(data.nits):
-
-            # Check for data spike.
-            if (self.time_delay_mad[jj] == 0) or (np.count_nonzero(self.tau[:, jj, :]) < (self.co_array_num - 2)):
-                # We have a data spike, so do not process.
-                continue
-
-            y_var = self.tau[:, jj, :] / self.time_delay_mad[jj]
-            qt = self.q_xij.conj().T @ y_var
-            z_final = lstsq(self.r_xij, qt)[0]
-
-            # Correct coefficients from standardization
-            for ii in range(0, self.dimension_number):
-                z_final[ii] *= self.time_delay_mad[jj] / self.xij_mad[ii] # noqa
-
-            # x-component of slowness vector
-            sx = z_final[0][0]
-            # y-component of slowness vector
-            sy = z_final[1][0]
-            # Calculate trace velocity from slowness
-            self.lts_vel[jj] = 1/np.linalg.norm(z_final, 2)
-            # Convert baz from mathematical CCW from E
-            # to geographical CW from N. baz = arctan(sx/sy)
-            self.lts_baz[jj] = (np.arctan2(sx, sy) * 180 / np.pi - 360) % 360
-
-            # Calculate the sigma_tau value (Szuberla et al. 2006).
-            residuals = self.tau[:, jj, :] - (self.xij @ z_final)
-            numerator = self.tau[:, jj, :].T @ residuals
-            denom = self.co_array_num - self.dimension_number
-            if numerator / denom > 0:
-                val = np.sqrt(numerator / denom)
-            else:
-                val = np.nan
-            # ensure scalar
-            self.sigma_tau[jj] = float(np.asarray(val).item())
-
-            # Calculate uncertainties from Szuberla & Olson, 2004
-            # Equation 16
-            sigS = self.sigma_tau[jj] / np.sqrt(c_eig_vals)
-            # Form uncertainty ellipse major/minor axes
-            a = np.sqrt(chi2) * sigS[0]
-            b = np.sqrt(chi2) * sigS[1]
-            # Rotate uncertainty ellipse to align major/minor axes
-            # along coordinate system axes
-            So = R @ [sx, sy]
-            # Find angle & slowness extrema
-            try:
-                # rthEllipse routine can be unstable; catch instabilities
-                eExtrm, eVec = rthEllipse(a, b, So[0], So[1])
-                # Rotate eigenvectors back to original orientation
-                eVec = eVec @ R
-                # Fix up angle calculations
-                sig_theta = np.abs(np.diff(
-                    (np.arctan2(eVec[2:, 1], eVec[2:, 0]) * 180 / np.pi - 360)
-                    % 360))
-                sig_theta = float(np.asarray(sig_theta).item())
-                if sig_theta > 180:
-                    sig_theta = np.abs(sig_theta - 360)
-
-                # Halving here s.t. +/- value expresses uncertainty bounds.
-                # Remove the 1/2's to get full values to express
-                # coverage ellipse area.
-                self.conf_int_baz[jj] = 0.5 * sig_theta
-                self.conf_int_vel[jj] = float((0.5 * np.abs(np.diff(1 / eExtrm[:2]))).item())
-
-            except ValueError:
-                self.conf_int_baz[jj] = np.nan
-                self.conf_int_vel[jj] = np.nan
+
+        # Check for data spikes; those windows are not processed.
+        tau = self.tau[:, :, 0]
+        valid = (self.time_delay_mad != 0) & (np.count_nonzero(tau, axis=0) >= (self.co_array_num - 2))
+        tau = tau[:, valid]
+        time_delay_mad = self.time_delay_mad[valid]
+
+        # Least squares fit of the standardized time delays
+        z_final = self.xij_pinv @ (tau / time_delay_mad)
+        # Correct coefficients from standardization
+        z_final *= time_delay_mad / self.xij_mad[:, None]
+        # x- and y-components of slowness vectors
+        sx, sy = z_final
+        # Calculate trace velocity from slowness
+        self.lts_vel[valid] = 1 / np.sqrt(sx**2 + sy**2)
+        # Convert baz from mathematical CCW from E
+        # to geographical CW from N. baz = arctan(sx/sy)
+        self.lts_baz[valid] = (np.arctan2(sx, sy) * 180 / np.pi - 360) % 360
+
+        # Calculate the sigma_tau value (Szuberla et al. 2006).
+        residuals = tau - (self.xij @ z_final)
+        val = np.sum(tau * residuals, axis=0) / (self.co_array_num - self.dimension_number)
+        with np.errstate(invalid='ignore'):
+            self.sigma_tau[valid] = np.where(val > 0, np.sqrt(val), np.nan)
+
+        # Calculate uncertainties from Szuberla & Olson, 2004
+        self.conf_int_vel[valid], self.conf_int_baz[valid] = ellipse_conf_int(
+            sx, sy, self.sigma_tau[valid], c_eig_vals, eig_vec_ang, self.p)
 
 
 class LTSEstimator(LsBeam):
     """ Class for least trimmed squares (LTS) beamforming.
     """
 
-    def __init__(self, data, n_samples=500):
+    def __init__(self, data, n_samples=500, n_jobs=1):
         super().__init__(data)
-        # Pre-allocate array of slowness coefficients
-        self.slowness_coeffs = np.empty((self.dimension_number, data.nits))
-        # Pre-allocate weights
-        self.element_weights = np.zeros((self.co_array_num, data.nits))
         # Raise error if a LTS object is instantiated with ALPHA = 1.0.
         # The ordinary least squares code should be used instead
         if data.alpha == 1.0:
@@ -1006,12 +1064,28 @@ class LTSEstimator(LsBeam):
         self.h_calc(data)
         # The number of subsets we will test.
         self.n_samples = n_samples
+        # The number of threads the time windows are distributed over.
+        self.n_jobs = n_jobs
         # The number of best subsets to try in the final iteration.
         self.candidate_size = 10
         # The initial number of concentration steps.
         self.csteps = 4
         # The number of concentration steps for the second stage.
         self. csteps2 = 100
+        # Random subsets of the co-array and their QR factors
+        self.subsets, self.q_t, self.r_sub = cached_lts_subsets(self.xij_standardized, self.n_samples + self.candidate_size)
+
+    def allocate(self, nits):
+        """ Pre-allocate the per-window results for ``nits`` time windows.
+
+        Args:
+            nits (int): The number of time windows.
+        """
+        super().allocate(nits)
+        # Pre-allocate array of slowness coefficients
+        self.slowness_coeffs = np.empty((self.dimension_number, nits))
+        # Pre-allocate weights
+        self.element_weights = np.zeros((self.co_array_num, nits))
 
     def h_calc(self, data):
         r""" Generate the h-value, the number of points to fit.
@@ -1035,11 +1109,12 @@ class LTSEstimator(LsBeam):
         Args:
             data (DataBin): The DataBin object.
         """
-        # Determine the best slowness coefficients from FAST-LTS
-        self.slowness_coeffs = fast_LTS(data.nits, self.tau, self.time_delay_mad, self.xij_standardized, self.xij_mad, self.dimension_number, self.candidate_size, self.n_samples, self.co_array_num, self.slowness_coeffs, self.csteps, self.h, self.csteps2) # noqa
-        # Use the best slowness coefficients to determine dropped stations
-        # Calculate uncertainties at 90% confidence
-        self.lts_vel, self.lts_baz, self.element_weights, self.sigma_tau, self.conf_int_vel, self.conf_int_baz = post_process(self.dimension_number, self.co_array_num, data.alpha, self.h, data.nits, self.tau, self.xij, self.slowness_coeffs, self.lts_vel, self.lts_baz, self.element_weights, self.sigma_tau, self.p, self.conf_int_vel, self.conf_int_baz) # noqa
+        with numba_threads(self.n_jobs):
+            # Determine the best slowness coefficients from FAST-LTS
+            self.slowness_coeffs = fast_LTS(data.nits, self.tau, self.time_delay_mad, self.xij_standardized, self.xij_mad, self.dimension_number, self.candidate_size, self.n_samples, self.co_array_num, self.slowness_coeffs, self.csteps, self.h, self.csteps2, self.subsets, self.q_t, self.r_sub) # noqa
+            # Use the best slowness coefficients to determine dropped stations
+            # Calculate uncertainties at 90% confidence
+            self.lts_vel, self.lts_baz, self.element_weights, self.sigma_tau, self.conf_int_vel, self.conf_int_baz = post_process(self.dimension_number, self.co_array_num, data.alpha, self.h, data.nits, self.tau, self.xij, self.slowness_coeffs, self.lts_vel, self.lts_baz, self.element_weights, self.sigma_tau, self.p, self.conf_int_vel, self.conf_int_baz) # noqa
         # Find dropped stations from weights
         # Map dropped data points back to elements.
         for jj in range(0, data.nits):
@@ -1,6 +1,36 @@
+from functools import lru_cache
+
 import numpy as np
 import matplotlib.pyplot as plt
+from obspy import Stream
 from obspy.geodetics.base import calc_vincenty_inverse
+from scipy.signal import decimate
+
+
+@lru_cache(maxsize=32)
+def _rij_from_coordinates(latlist, lonlist):
+    """ ``DataBin.getrij`` for tuples of coordinates, cached per array. """
+    nchans = len(latlist)
+    # Pre-allocate "x" and "y" arrays.
+    xnew = np.zeros((nchans, ))
+    ynew = np.zeros((nchans, ))
+
+    for jj in range(1, nchans):
+        # Obspy defaults to the WGS84 ellipsoid.
+        delta, az, _ = calc_vincenty_inverse(
+            latlist[0], lonlist[0], latlist[jj], lonlist[jj])
+        # Convert azimuth to degrees from North
+        az = (450 - az) % 360
+        xnew[jj] = delta/1000 * np.cos(az*np.pi/180)
+        ynew[jj] = delta/1000 * np.sin(az*np.pi/180)
+
+    # Remove the mean.
+    xnew -= np.mean(xnew)
+    ynew -= np.mean(ynew)
+
+    rij = np.array([xnew.tolist(), ynew.tolist()])
+    rij.setflags(write=False)
+    return rij
 
 
 class DataBin:
@@ -10,19 +40,39 @@ class DataBin:
         window_length (float): The window processing length [sec.]
         window_overlap (float): The decimal overalp [0.0, 1.0) for consecutive time windows.
         alpha (float): The decimal [0.50, 1.0] amount of data to keep in the subsets.
+        dtype (data-type): Floating point type of the data matrix. ``np.float32``
+            halves the memory of long windows; cross-correlations are then
+            computed in single precision. Defaults to ``np.float64``.
+        target_rate (float or None): (Optional) Decimate the data by the
+            largest integer factor that keeps the sampling rate at or above
+            ``target_rate`` [Hz] before cross-correlating (zero-phase FIR
+            anti-alias filter). Choose at least 2.5 times the highest
+            frequency of interest.
+        peak_interpolation (str or None): Sub-sample refinement of the
+            cross-correlation peaks, 'parabolic' or 'none'. Defaults to
+            'parabolic' when decimating and 'none' otherwise.
     """
 
-    def __init__(self, window_length, window_overlap, alpha):
+    def __init__(self, window_length, window_overlap, alpha, dtype=np.float64, target_rate=None, peak_interpolation=None):
         self.window_length = window_length
         self.window_overlap = window_overlap
         self.alpha = alpha
-
-    def build_data_arrays(self, st, latlist, lonlist, remove_elements=None, rij=None):
+        self.dtype = np.dtype(dtype)
+        self.target_rate = target_rate
+        if peak_interpolation is None:
+            peak_interpolation = 'none' if target_rate is None else 'parabolic'
+        if peak_interpolation not in ('none', 'parabolic'):
+            raise ValueError("peak_interpolation must be 'none' or 'parabolic'.")
+        self.peak_interpolation = peak_interpolation
+
+    def build_data_arrays(self, st, latlist, lonlist, remove_elements=None, rij=None, data=None):
         """ Collect basic data from stream file. Project lat/lon into r_ij coordinates.
 
         Alternatively, if ``rij`` is provided, ``latlist`` and ``lonlist`` are not used
         and the provided Cartesion coordinates ``rij`` are used instead.
 
+        ``st``, ``latlist``, ``lonlist`` and ``rij`` are not modified.
+
         Args:
             st (stream): An obspy stream object.
             latlist (list): A list of latitude points.
@@ -32,31 +82,36 @@ class DataBin:
                 cartesian "X" - coordinates and the second row corresponding to
                 cartesian "Y" - coordinates, in units of km. If this is provided then
                 ``latlist`` and ``lonlist`` are ignored.
+            data (array or None): (Optional) Samples of ``st`` as a
+                ``(npts, len(st))`` matrix. Used without copying if it already
+                has the requested dtype and no elements are removed; the trace
+                data in ``st`` are then not read.
         """
         # Check that all traces have the same length
         if len(set([len(tr) for tr in st])) != 1:
             raise ValueError('Traces in stream must have same length!')
 
         # Remove predetermined elements before processing
-        if (remove_elements is not None) and (len(remove_elements) > 0):
-            remove_elements = np.sort(remove_elements)
-            for jj in range(0, len(remove_elements)):
-                st.remove(st[remove_elements[jj]])
-                if rij is None:
-                    latlist.remove(latlist[remove_elements[jj]])
-                    lonlist.remove(lonlist[remove_elements[jj]])
-                else:
-                    _x, _y = [list(_) for _ in rij]
-                    _x.remove(_x[remove_elements[jj]])
-                    _y.remove(_y[remove_elements[jj]])
-                    rij = np.array([_x, _y])
-                remove_elements -= 1
+        remove_elements = [] if remove_elements is None else list(remove_elements)
+        keep = [jj for jj in range(len(st)) if jj not in remove_elements]
+        traces = [st[jj] for jj in keep]
+        if len(remove_elements) > 0:
+            if rij is None:
+                latlist = [latlist[jj] for jj in keep]
+                lonlist = [lonlist[jj] for jj in keep]
+            else:
+                rij = np.asarray(rij)[:, keep]
+        st = Stream(traces=traces)
 
         # Save the station name
         self.station_name = st[0].stats.station
         # Pull processing parameters from the stream file.
         self.nchans = len(st)
-        self.npts = st[0].stats.npts
+        # Integer decimation factor (1 = full rate)
+        self.decimation = 1
+        if self.target_rate is not None:
+            self.decimation = max(1, int(st[0].stats.sampling_rate // self.target_rate))
+        self.npts = -(-st[0].stats.npts // self.decimation)
         # Save element names from location
         # If blank, pull from IMS-style station name
         self.element_names = []
@@ -67,7 +122,7 @@ class DataBin:
             else:
                 self.element_names.append(tr.stats.location)
         # Assumes all traces have the same sample rate and length
-        self.sampling_rate = st[0].stats.sampling_rate
+        self.sampling_rate = st[0].stats.sampling_rate / self.decimation
         self.winlensamp = int(self.window_length * self.sampling_rate)
         # Sample increment (delta_t)
         self.sampinc = int(np.round(
@@ -76,11 +131,21 @@ class DataBin:
         self.intervals = np.arange(0, self.npts - self.winlensamp, self.sampinc, dtype='int') # noqa
         self.nits = len(self.intervals)
         # Pull time vector from stream object
-        self.tvec = st[0].times('matplotlib')
+        self.tvec = st[0].times('matplotlib')[::self.decimation]
         # Store data traces in an array for processing.
-        self.data = np.empty((self.npts, self.nchans))
-        for ii, tr in enumerate(st):
-            self.data[:, ii] = tr.data
+        if data is not None:
+            if np.shape(data) != (st[0].stats.npts, len(keep) + len(remove_elements)):
+                raise ValueError('The data matrix must have shape (npts, number of traces in stream).')
+            self.data = np.asarray(data, dtype=self.dtype)
+            if len(remove_elements) > 0:
+                self.data = self.data[:, keep]
+        else:
+            self.data = np.empty((st[0].stats.npts, self.nchans), dtype=self.dtype)
+            for ii, tr in enumerate(st):
+                self.data[:, ii] = tr.data
+        if self.decimation > 1:
+            # Zero-phase, so inter-element time delays are not biased
+            self.data = decimate(self.data, self.decimation, ftype='fir', axis=0, zero_phase=True).astype(self.dtype, copy=False) # noqa
         # Set the array coordinates
         if rij is None:
             self.rij = self.getrij(latlist, lonlist)
@@ -118,26 +183,8 @@ class DataBin:
         if (len(latlist) != self.nchans) or (len(lonlist) != self.nchans):
             raise ValueError('Mismatch between the number of stream channels and the latitude or longitude list length.') # noqa
 
-        # Pre-allocate "x" and "y" arrays.
-        xnew = np.zeros((self.nchans, ))
-        ynew = np.zeros((self.nchans, ))
-
-        for jj in range(1, self.nchans):
-            # Obspy defaults to the WGS84 ellipsoid.
-            delta, az, _ = calc_vincenty_inverse(
-                latlist[0], lonlist[0], latlist[jj], lonlist[jj])
-            # Convert azimuth to degrees from North
-            az = (450 - az) % 360
-            xnew[jj] = delta/1000 * np.cos(az*np.pi/180)
-            ynew[jj] = delta/1000 * np.sin(az*np.pi/180)
-
-        # Remove the mean.
-        xnew -= np.mean(xnew)
-        ynew -= np.mean(ynew)
-
-        rij = np.array([xnew.tolist(), ynew.tolist()])
-
-        return rij
+        # Vincenty inverses are computed once per set of coordinates
+        return _rij_from_coordinates(tuple(latlist), tuple(lonlist)).copy()
 
     def plot_array_coordinates(self):
         """ Plot array element locations in Cartesian coordinates to the default device.
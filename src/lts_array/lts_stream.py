@@ -0,0 +1,145 @@
+import numpy as np
+
+from lts_array.classes.lts_data_class import DataBin
+from lts_array.classes.lts_classes import OLSEstimator, LTSEstimator
+
+
+class LTSStream:
+    r""" Process a continuous feed of array data with least trimmed squares (LTS).
+
+    Streaming counterpart to :func:`lts_array.ltsva`. Data are pushed in
+    contiguous chunks; each :meth:`push` processes only the time windows that
+    the chunk completed and keeps the samples of the trailing, incomplete
+    window for the next call. The array geometry, co-array and the estimator
+    (including its LTS subsets and QR factors) are set up once, from the first
+    chunk.
+
+    Windows start every ``(1 - window_overlap) * window_length`` seconds from
+    the first pushed sample and are processed as soon as their last sample
+    arrives. (``ltsva`` on the concatenated data skips a final window that
+    ends exactly on the last sample; otherwise the windows are the same.)
+
+    Args:
+        lat_list (list): List of latitude values for each element in a chunk.
+        lon_list (list): List of longitude values for each element in a chunk.
+        window_length (float): Window length in seconds.
+        window_overlap (float): Window overlap in the range (0.0 - 1.0).
+        alpha (float): Fraction of data for LTS subsetting [0.5 - 1.0].
+            Choose 1.0 for ordinary least squares (default).
+        n_samples (int): Number of random subsets for LTS. Defaults to 500.
+        remove_elements (list): (Optional) Remove element number(s) from every chunk, ``lat_list``, and ``lon_list`` before processing. Here numbering refers to the Python index (e.g. [0] = remove 1st element in stream).
+        rij (array or None): A NumPy array with the first row corresponding to cartesian
+            "X" - coordinates and the second row corresponding to cartesian "Y" -
+            coordinates, in units of km. If this is provided then ``lat_list`` and
+            ``lon_list`` are ignored.
+        n_jobs (int): Number of threads the LTS time windows are distributed
+            over; -1 uses all cores. Defaults to 1.
+        dtype (str or data-type): Floating point type the data are processed in.
+            Defaults to 'float64'.
+    """
+
+    def __init__(self, lat_list, lon_list, window_length, window_overlap, alpha=1.0, n_samples=500, remove_elements=None, rij=None, n_jobs=1, dtype='float64'):
+        self.lat_list = list(lat_list)
+        self.lon_list = list(lon_list)
+        self.remove_elements = [] if remove_elements is None else list(remove_elements)
+        self.rij = rij
+        self.n_samples = n_samples
+        self.n_jobs = n_jobs
+        self.data = DataBin(window_length, window_overlap, alpha, dtype=dtype)
+        self.estimator = None
+        self.flush()
+
+    def _setup(self, st):
+        """ Build the array geometry and estimator from the first chunk. """
+        rij = None if self.rij is None else np.array(self.rij)
+        self.data.build_data_arrays(st, self.lat_list, self.lon_list, self.remove_elements, rij)
+        self.n_elements = len(st)
+        self.keep = [ii for ii in range(len(st)) if ii not in self.remove_elements]
+        if self.data.alpha == 1.0:
+            # Ordinary Least Squares
+            self.estimator = OLSEstimator(self.data)
+        else:
+            # Least Trimmed Squares
+            self.estimator = LTSEstimator(self.data, n_samples=self.n_samples, n_jobs=self.n_jobs)
+
+    def _chunk_array(self, st):
+        """ Check a chunk against the stream so far and return its samples. """
+        if len(set([len(tr) for tr in st])) != 1:
+            raise ValueError('Traces in stream must have same length!')
+        if len(st) != self.n_elements:
+            raise ValueError('Chunk has ' + str(len(st)) + ' traces; expected ' + str(self.n_elements) + '.')
+        if any(tr.stats.sampling_rate != self.data.sampling_rate for tr in st):
+            raise ValueError('Sampling rate of the chunk differs from the first chunk.')
+        chunk = np.empty((st[0].stats.npts, len(self.keep)), dtype=self.data.dtype)
+        for ii, jj in enumerate(self.keep):
+            chunk[:, ii] = st[jj].data
+        return chunk
+
+    def push(self, st):
+        r""" Add a chunk of data and process the windows it completes.
+
+        Args:
+            st: Obspy stream object with the same elements, in the same order,
+                as the first chunk. All traces must start at the same time and
+                have the same length. Assumes response has been removed.
+
+        Returns:
+            (tuple):
+                The same array processing parameters as :func:`lts_array.ltsva`,
+                for the newly completed windows only (empty arrays if none):
+                ``lts_vel``, ``lts_baz``, ``t``, ``mdccm``, ``stdict``,
+                ``sigma_tau``, ``conf_int_vel``, ``conf_int_baz``.
+        """
+        if self.estimator is None:
+            self._setup(st)
+        chunk = self._chunk_array(st)
+        fs = self.data.sampling_rate
+
+        if self.buffer is None:
+            self.starttime = st[0].stats.starttime
+            self.buffer = chunk
+        else:
+            expected = self.starttime + len(self.buffer) / fs
+            if abs(st[0].stats.starttime - expected) > 0.5 / fs:
+                raise ValueError('Chunk starts at ' + str(st[0].stats.starttime) + ', not at the end of the buffered data (' + str(expected) + '). Call flush() before pushing non-contiguous data.')
+            self.buffer = np.concatenate((self.buffer, chunk))
+
+        # Windows whose last sample has arrived
+        data = self.data
+        intervals = np.arange(self.next_window, len(self.buffer) - data.winlensamp + 1, data.sampinc, dtype='int') # noqa
+        results = self._process(intervals)
+        if len(intervals) > 0:
+            self.next_window = intervals[-1] + data.sampinc
+
+        # Keep only the samples later windows still need
+        drop = min(self.next_window, len(self.buffer))
+        self.buffer = self.buffer[drop:]
+        self.starttime += drop / fs
+        self.next_window -= drop
+
+        return results
+
+    def _process(self, intervals):
+        """ Correlate and solve the buffered windows starting at ``intervals``. """
+        data = self.data
+        estimator = self.estimator
+        data.data = self.buffer
+        data.npts = len(self.buffer)
+        data.intervals = intervals
+        data.nits = len(intervals)
+        data.tvec = self.starttime.matplotlib_date + np.arange(data.npts) / data.sampling_rate / 86400.0
+        estimator.allocate(data.nits)
+        if data.nits > 0:
+            estimator.correlate(data)
+            estimator.solve(data)
+        return estimator.lts_vel, estimator.lts_baz, estimator.t, estimator.mdccm, estimator.stdict, estimator.sigma_tau, estimator.conf_int_vel, estimator.conf_int_baz
+
+    def flush(self):
+        r""" Discard the buffered samples of the incomplete trailing window.
+
+        The next :meth:`push` starts a new stretch of data with its own window
+        grid, e.g. after a data gap. The array geometry and estimator are kept.
+        """
+        self.buffer = None
+        self.starttime = None
+        self.next_window = 0
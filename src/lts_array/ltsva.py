@@ -6,7 +6,7 @@ import warnings
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
 
-def ltsva(st, lat_list, lon_list, window_length, window_overlap, alpha=1.0, n_samples=500, plot_array_coordinates=False, remove_elements=None, rij=None):
+def ltsva(st, lat_list, lon_list, window_length, window_overlap, alpha=1.0, n_samples=500, plot_array_coordinates=False, remove_elements=None, rij=None, n_jobs=1, dtype='float64', target_rate=None, peak_interpolation=None):
     r""" Process infrasound or seismic array data with least trimmed squares (LTS).
 
     Args:
@@ -23,6 +23,16 @@ def ltsva(st, lat_list, lon_list, window_length, window_overlap, alpha=1.0, n_sa
             "X" - coordinates and the second row corresponding to cartesian "Y" -
             coordinates, in units of km. If this is provided then ``lat_list`` and
             ``lon_list`` are ignored.
+        n_jobs (int): Number of threads the LTS time windows are distributed
+            over; -1 uses all cores. Defaults to 1.
+        dtype (str or data-type): Floating point type the data are processed in.
+            'float32' halves the memory of long windows. Defaults to 'float64'.
+        target_rate (float or None): (Optional) Anti-alias decimate the data to
+            at least ``target_rate`` Hz (integer factor) before cross-correlating.
+            Choose at least 2.5 times the highest frequency of interest.
+        peak_interpolation (str or None): Sub-sample refinement of the
+            cross-correlation peaks, 'parabolic' or 'none'. Defaults to
+            'parabolic' when decimating and 'none' otherwise.
 
     Returns:
         (tuple):
@@ -39,7 +49,7 @@ def ltsva(st, lat_list, lon_list, window_length, window_overlap, alpha=1.0, n_sa
     """
 
     # Build data object
-    data = DataBin(window_length, window_overlap, alpha)
+    data = DataBin(window_length, window_overlap, alpha, dtype=dtype, target_rate=target_rate, peak_interpolation=peak_interpolation)
     data.build_data_arrays(st, lat_list, lon_list, remove_elements, rij)
 
     # Plot array coordinates as a check
@@ -51,7 +61,7 @@ def ltsva(st, lat_list, lon_list, window_length, window_overlap, alpha=1.0, n_sa
         ltsva = OLSEstimator(data)
     else:
         # Least Trimmed Squares
-        ltsva = LTSEstimator(data, n_samples=n_samples)
+        ltsva = LTSEstimator(data, n_samples=n_samples, n_jobs=n_jobs)
     ltsva.correlate(data)
     ltsva.solve(data)
 
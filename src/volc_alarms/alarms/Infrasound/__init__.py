@@ -52,6 +52,12 @@ def run_alarm(config, T0, test_flag=False, mm_flag=True, icinga_flag=True, force
         st = processing.remove_gain(st)
 
 
+    #### update the LTS store ####
+    # With the LTS store, every run adds its windows, so the figure and later
+    # runs find the history of quiet minutes in the store too
+    lts_results = detection.do_LTS(st, config) if detection.use_lts_store() else None
+
+
     #### check amplitude threshold ####
     min_pa = np.array([v["min_pa"] for v in config.targets]).min()
     if force_flag:
@@ -70,7 +76,9 @@ def run_alarm(config, T0, test_flag=False, mm_flag=True, icinga_flag=True, force
     config = detection.get_target_backazimuth(st, config)
 
     #### invert for velocity and back-azimuth ####
-    results_df, lts_dict = detection.do_LTS(st, config)
+    if lts_results is None:
+        lts_results = detection.do_LTS(st, config)
+    results_df, lts_dict = lts_results
     
     if force_flag:
         config.targets = [config.targets[0]]
@@ -1,6 +1,11 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
 import numpy as np
 import pandas as pd
-from matplotlib import dates
+from numpy.lib.stride_tricks import sliding_window_view
 from obspy import UTCDateTime as utc
 from obspy.geodetics.base import gps2dist_azimuth
 
@@ -56,17 +61,25 @@ def get_target_backazimuth(st, config):
 
 def do_LTS(st, config, skip_chans=[]):
 
-    overlap_fraction = config.lts_overlap / config.lts_window_length
     ALPHA = config.lts_alpha if len(st) > 3 else 1.0
     if len(st) - len(skip_chans) < 4:
         logger.warning("3 or fewer stations remaining after QC. Setting LTS_ALPHA to 1.0")
         ALPHA = 1.0
     skip_inds = [i for i, tr in enumerate(st) if tr.id in skip_chans]
+
+    store = _lts_store(config)
+    if store is None:
+        return _run_LTS(st, config, ALPHA, skip_inds)
+    return _do_LTS_incremental(st, config, ALPHA, skip_inds, store)
+
+
+def _run_LTS(st, config, ALPHA, skip_inds):
+    overlap_fraction = config.lts_overlap / config.lts_window_length
     lat_list = [tr.stats.coordinates.latitude for tr in st]
     lon_list = [tr.stats.coordinates.longitude for tr in st]
     logger.info(f"Performing LTS analysis with N={config.lts_n_samples} samples...")
     velocity, azimuth, t, mccm, lts_dict, sigma_tau, Vel_err, Baz_err = ltsva(
-        st.copy(), lat_list, lon_list, config.lts_window_length, overlap_fraction, alpha=ALPHA, n_samples=config.lts_n_samples, remove_elements=skip_inds
+        st, lat_list, lon_list, config.lts_window_length, overlap_fraction, alpha=ALPHA, n_samples=config.lts_n_samples, remove_elements=skip_inds, n_jobs=config.lts_n_jobs, target_rate=config.lts_target_rate
     )
     logger.info("Done calculating LTS")
 
@@ -75,7 +88,7 @@ def do_LTS(st, config, skip_chans=[]):
         "Azimuth": azimuth,
         "Velocity": 1000 * velocity, # Convert velocity to m/s
         "MCCM": mccm,
-        "Pressure": get_pressures(st, t, config),
+        "Pressure": get_pressures(st, config),
         "Sigma_tau": sigma_tau,
         "Vel_err": 1000 * Vel_err, # Convert to m/s
         "Baz_err": Baz_err
@@ -84,27 +97,203 @@ def do_LTS(st, config, skip_chans=[]):
     return df, lts_dict
 
 
-def get_pressures(st, t, config):
+def use_lts_store():
+    """Whether ``do_LTS`` keeps its results in the per-config store (``USE_LTS_STORE``)."""
+    return bool(os.environ.get("USE_LTS_STORE"))
+
+
+def _lts_store(config):
+    """Return the per-config LTS results store, or None unless ``USE_LTS_STORE`` is set."""
+    if not use_lts_store():
+        return None
+    from volc_alarms.utils.window_store import WindowStore
+
+    name = config.alarm_name.replace(" ", "_")
+    return WindowStore(
+        Path(os.environ["LTS_STORE_DIR"]) / f"{name}.npz",
+        retention=float(os.environ["LTS_STORE_SECONDS"]),
+    )
+
+
+def _array_key(st, config, ALPHA, skip_inds):
+    """Hash of everything besides the data that the LTS results depend on."""
+    channels = [
+        (tr.id, tr.stats.coordinates.latitude, tr.stats.coordinates.longitude)
+        for i, tr in enumerate(st) if i not in skip_inds
+    ]
+    params = [
+        config.lts_window_length, config.lts_overlap, ALPHA, config.lts_n_samples, config.lts_target_rate,
+        config.f1, config.f2, st[0].stats.sampling_rate, bool(os.environ.get("USE_EARTHSCOPE")),
+    ]
+    return hashlib.sha1(json.dumps([channels, params]).encode()).hexdigest()[:16]
+
+
+def _decimation(st, config):
+    """Integer decimation factor ``lts_array.DataBin`` applies for ``lts_target_rate``."""
+    if not config.lts_target_rate:
+        return 1
+    return max(1, int(st[0].stats.sampling_rate // config.lts_target_rate))
+
+
+def _edge_samples(st, config):
+    """Samples at either end of the data whose decimated values depend on where the data start/end.
+
+    ``scipy.signal.decimate`` low-passes with a zero-phase FIR of ``20 * q + 1``
+    taps, so decimated samples within ``10 * q`` input samples of either end
+    of the data see the zero padding beyond it.
+    """
+    q = _decimation(st, config)
+    return 10 * q if q > 1 else 0
+
+
+def _window_times(st, config):
+    """Start/end sample and centre time (ms since epoch) of every LTS window.
+
+    Mirrors the windowing of ``lts_array.DataBin`` (including decimation to
+    ``lts_target_rate``) so stored results can be matched to the windows
+    ``ltsva`` would produce for ``st``. Samples are counted at the stream's
+    own sampling rate.
+    """
+    fs = st[0].stats.sampling_rate
+    q = _decimation(st, config)
+    winlensamp = int(config.lts_window_length * fs / q)
+    overlap_fraction = config.lts_overlap / config.lts_window_length
+    sampinc = int(np.round((1 - overlap_fraction) * winlensamp))
+    starts = np.arange(0, -(-st[0].stats.npts // q) - winlensamp, sampinc, dtype="int")
+    centres = st[0].stats.starttime.timestamp + (starts + int(winlensamp / 2)) * q / fs
+    return starts * q, (starts + winlensamp) * q, np.round(centres * 1000).astype("int64")
+
+
+def _do_LTS_incremental(st, config, ALPHA, skip_inds, store):
+    """Run LTS only on the windows of ``st`` that are not in ``store`` yet.
+
+    Results of windows ending within ``LTS_STORE_MARGIN`` seconds of the end of
+    the data are returned but not stored, so they are recomputed once late
+    packets have arrived. Windows within ``config.taper`` seconds (or the
+    decimation filter's reach) of either end of ``st`` depend on where
+    ``preprocess_stream`` started and ended the filtered span. They are
+    always recomputed and never stored, so the results match those of
+    ``_run_LTS`` on all of ``st``.
+    """
+    starts, ends, t_ms = _window_times(st, config)
+    if not len(t_ms):
+        return _run_LTS(st, config, ALPHA, skip_inds)
+    key = _array_key(st, config, ALPHA, skip_inds)
+    fs = st[0].stats.sampling_rate
+    edge = _edge_samples(st, config)
+    span_edge = max(edge, int(np.ceil(config.taper * fs)))
+    interior = (starts >= span_edge) & (ends <= st[0].stats.npts - span_edge)
+    stored = store.get(key, t_ms)
+
+    missing = np.flatnonzero(~np.isin(t_ms, stored.index) | ~interior)
+    logger.info(f"{len(t_ms) - len(missing)} of {len(t_ms)} LTS windows from store")
+    if len(missing):
+        # One LTS run per stretch of consecutive missing windows
+        runs = np.split(missing, np.flatnonzero(np.diff(missing) > 1) + 1)
+        df_new = pd.concat([_run_LTS_windows(st, config, ALPHA, skip_inds, run, edge) for run in runs])
+
+        margin = float(os.environ["LTS_STORE_MARGIN"])
+        final = interior & (ends / fs <= st[0].stats.endtime - margin - st[0].stats.starttime)
+        if np.any(final[missing]):
+            store.put(key, df_new[df_new.index.isin(t_ms[final])].reset_index())
+        stored = pd.concat([stored.drop(df_new.index, errors="ignore"), df_new])
+
+    df = stored.reindex(t_ms)
+    lts_dict = {
+        str(ti): np.array(flagged.split(","), dtype=int)
+        for ti, flagged in zip(df["Time"], df["Flagged"]) if isinstance(flagged, str) and flagged
+    }
+    if ALPHA != 1.0 and len(df):
+        lts_dict["size"] = len(st) - len(skip_inds)
+    df = df.drop(columns="Flagged").reset_index(drop=True)
+
+    return df, lts_dict
+
+
+def _run_LTS_windows(st, config, ALPHA, skip_inds, run, edge):
+    """LTS results, indexed by ``t_ms``, for the windows ``run`` of ``st``.
+
+    The data are sliced with at least ``edge`` samples of lead-in and lead-out
+    (or up to the ends of ``st``) and the slice starts on a window start, so
+    the windows line up with those of ``st`` and come out as they would from
+    ``_run_LTS`` on all of ``st``. Lead-in and lead-out windows are dropped.
+    """
+    starts, ends, t_ms = _window_times(st, config)
+    fs = st[0].stats.sampling_rate
+    t0 = st[0].stats.starttime
+    first = 0
+    if starts[run[0]] > edge:
+        first = np.searchsorted(starts, starts[run[0]] - edge, side="right") - 1
+    st_new = st.slice(t0 + starts[first] / fs, t0 + (ends[run[-1]] + edge) / fs)
+
+    df_new, lts_dict_new = _run_LTS(st_new, config, ALPHA, skip_inds)
+    df_new["t_ms"] = _window_times(st_new, config)[2]
+    df_new["Flagged"] = [
+        ",".join(str(i) for i in lts_dict_new.get(str(ti), [])) for ti in df_new["Time"]
+    ]
+    df_new = df_new.set_index("t_ms")
+    return df_new[df_new.index.isin(t_ms[run])]
+
+
+def get_pressures(st, config):
     """Extract pressure data from the seismic stream.
 
+    For every LTS window, the median over traces of ``max(abs(tr.data))``
+    within ``lts_window_length / 2`` of the window's centre time, end samples
+    included, as ``st.slice`` of the window would give. The windows are laid
+    out from the start of ``st`` with the window length and overlap, as
+    ``ltsva`` lays them out (see ``_window_times``), and each trace is reduced
+    with one strided max-abs.
+
     Args:
-        st (obspy.Stream): Stream containing seismic traces.
-        t (np.ndarray): Array of time values (matplotlib dates) from ltsva.
-        array_params (dict): Array parameters including window length.
+        st (obspy.Stream): Stream passed to ``ltsva``; its traces share one
+            start time and sampling rate.
+        config: Alarm config with the LTS window settings.
 
     Returns:
         np.ndarray: Array of pressure values.
     """
+    if len(st) == 0:
+        return np.array([])
+    starts = _window_times(st, config)[0]
+
+    # Window centre in samples, as ltsva times its windows
+    fs = st[0].stats.sampling_rate
+    q = _decimation(st, config)
+    centres = starts + int(int(config.lts_window_length * fs / q) / 2) * q
+    # Nearest samples to centre -/+ half a window, rounding half samples inwards
+    half = config.lts_window_length * fs / 2
+    i1 = np.floor(centres - half + 0.5).astype("int64")
+    i2 = np.ceil(centres + half - 0.5).astype("int64") + 1
+
+    mx_pressures = np.empty((len(st), len(starts)))
+    present = np.ones((len(st), len(starts)), dtype=bool)
+    for k, tr in enumerate(st):
+        i1_tr = np.clip(i1, 0, tr.stats.npts)
+        i2_tr = np.clip(i2, i1_tr, tr.stats.npts)
+        present[k] = i2_tr > i1_tr
+        mx_pressures[k] = _max_abs_windows(tr.data, i1_tr, i2_tr)
+
+    if present.all():
+        return np.median(mx_pressures, axis=0)
+    # Traces without samples in a window are left out of its median
+    return np.array([np.median(mx_pressures[present[:, j], j]) for j in range(len(starts))])
+
 
-    pressure = []
-    for ti in t:
-        t1 = utc(dates.num2date(ti)) - config.lts_window_length / 2
-        t2 = t1 + config.lts_window_length
-        st_win = st.slice(t1, t2)
-        mx_pressures = np.array([np.max(np.abs(tr_win.data)) for tr_win in st_win])
-        pressure.append(np.median(mx_pressures))
-    pressure = np.array(pressure)
-    return pressure
+def _max_abs_windows(data, i1, i2):
+    """max(abs(data[i1:i2])) for every window (NaN for empty windows)."""
+    out = np.full(len(i1), np.nan)
+    n = i2 - i1
+    if not len(n) or n.max() == 0:
+        return out
+    # Most windows share one length; reduce those in one strided pass
+    length = np.bincount(n[n > 0]).argmax()
+    same = n == length
+    abs_data = np.abs(data)
+    out[same] = sliding_window_view(abs_data, length)[i1[same]].max(axis=1)
+    for j in np.flatnonzero(~same & (n > 0)):
+        out[j] = abs_data[i1[j]:i2[j]].max()
+    return out
 
 
 def filter_lts_results(DF, target):
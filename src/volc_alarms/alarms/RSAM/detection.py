@@ -2,10 +2,10 @@ import os
 from pathlib import Path
 
 import numpy as np
-from obspy import read_inventory
 
 from volc_alarms.utils.processing import volcano_distance
 from volc_alarms.utils.setup_utils import get_logger, load_volcano_list
+from volc_alarms.utils.station_index import load_station_index
 
 logger = get_logger(__name__)
 
@@ -44,12 +44,10 @@ def RSAM_to_DR(tr, volcano_name, VELOCITY=1.5, FREQ=2, Q=200):
         logger.error("Station XML file missing")
         return
 
-    inventory = read_inventory(xml_file)
+    index = load_station_index(xml_file)
 
-    coords = inventory.get_coordinates(tr.id)
-    gain = inventory.get_response(
-        tr.id, tr.stats.starttime
-    ).instrument_sensitivity.value  # counts/m/s
+    coords = index.get_coordinates(tr.id, tr.stats.starttime)
+    gain = index.get_sensitivity(tr.id, tr.stats.starttime)  # counts/m/s
 
     volcs = volcano_distance(coords["longitude"], coords["latitude"], volcs)
     R = volcs.iloc[0].distance
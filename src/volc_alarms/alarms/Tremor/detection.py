@@ -1,8 +1,16 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
 import numpy as np
 import pandas as pd
-from obspy import UTCDateTime
-from obspy.signal.filter import envelope
+from obspy import Stream, Trace, UTCDateTime
+from obspy.core import Stats
+from obspy.core.util.misc import get_window_times
+from scipy.fft import irfft, rfft
 
+from volc_alarms.utils import preprocessing
 from volc_alarms.utils.setup_utils import TMP_DIR, get_logger
 
 logger = get_logger(__name__)
@@ -20,72 +28,155 @@ def build_grid(config):
     }
 
 
-def test_traveltime(st, config, grid):
-    if not config.grid_file.exists():
-        logger.warning(f"{config.grid_file} missing")
-        return False
-
-    npzfile = np.load(config.grid_file)
-    new_grd = grid
-    if not np.array_equal(new_grd["lats"], npzfile["lats"]):
-        logger.warning("Latitude grid nodes do not match. Calculate new travel times")
-        return False
-    elif not np.array_equal(new_grd["lons"], npzfile["lons"]):
-        logger.warning("Longitude grid nodes do not match. Calculate new travel times")
-        return False
-    elif not np.array_equal(new_grd["deps"], npzfile["deps"]):
-        logger.warning("Depth grid nodes do not match. Calculate new travel times")
-        return False
-    for tr in st:
-        if tr.id.replace(".", "_") not in npzfile.keys():
-            logger.warning(f"No travel times for {tr.id}! Calculate new travel times")
-            return False
-
-    return True
+def run_enveloc(st, band_env, high_env, config):
+    store = _tremor_store(config)
+    if store is not None:
+        return _run_enveloc_incremental(st, band_env, high_env, config, store)
+    return _locate(st, band_env, high_env, config)
 
 
-def run_enveloc(st, band_env, high_env, config):
+def _locate(st, band_env, high_env, config, window_list=None):
     from enveloc.core import XCOR
+    from volc_alarms.alarms.Tremor.traveltimes import TravelTimeStore
 
     grid = build_grid(config)
-    grid_file = TMP_DIR / config.grid_file
-    if test_traveltime(st, config, grid):
-        XC = XCOR(
-            band_env,
-            plot=False,
-            bootstrap=config.bstrap,
-            bootstrap_prct=config.bstrap_prct,
-            Cmin=config.Cmin,
-            Cmax=config.Cmax,
-            env_hp=high_env,
-            grid_size=grid,
-            tt_file=grid_file,
-            phase_types=config.phase_list,
+    store = TravelTimeStore(
+        os.environ.get("TRAVELTIME_STORE_DIR", TMP_DIR / "traveltimes"),
+        grid,
+        config.phase_list,
+        model_file=getattr(config, "velocity_model", None),
+    )
+    XC = XCOR(
+        band_env,
+        plot=False,
+        bootstrap=config.bstrap,
+        bootstrap_prct=config.bstrap_prct,
+        Cmin=config.Cmin,
+        Cmax=config.Cmax,
+        env_hp=high_env,
+        grid_size=grid,
+        tt_file=str(store.tt_file(band_env)),
+        phase_types=config.phase_list,
+    )
+    if window_list is None:
+        loc = XC.locate(
+            window_length=config.window_length,
+            step=config.window_length / 2.0,
+            include_partial_windows=False,
         )
     else:
-        logger.info("Making new traveltime grid")
-        XC = XCOR(
-            band_env,
-            plot=False,
-            bootstrap=config.bstrap,
-            bootstrap_prct=config.bstrap_prct,
-            Cmin=config.Cmin,
-            Cmax=config.Cmax,
-            env_hp=high_env,
-            grid_size=grid,
-        )
-        XC.save_traveltimes(grid_file)
-    loc = XC.locate(
-        window_length=config.window_length,
-        step=config.window_length / 2.0,
-        include_partial_windows=False,
-    )
+        loc = XC.locate(window_list=window_list)
     loc = loc.remove(max_scatter=config.max_scatter, inplace=False)
     loc = remove_hp_detects(loc)
 
     return loc
 
 
+def _tremor_store(config):
+    """Return the per-config location store, or None unless ``USE_TREMOR_STORE`` is set."""
+    if not os.environ.get("USE_TREMOR_STORE"):
+        return None
+    from volc_alarms.utils.window_store import WindowStore
+
+    name = config.alarm_name.replace(" ", "_")
+    return WindowStore(
+        Path(os.environ["TREMOR_STORE_DIR"]) / f"{name}.npz",
+        retention=float(os.environ["TREMOR_STORE_SECONDS"]),
+    )
+
+
+def _location_key(band_env, config):
+    """Hash of everything besides the data that the enveloc locations depend on."""
+    channels = [
+        (tr.id, tr.stats.coordinates.latitude, tr.stats.coordinates.longitude) if "coordinates" in tr.stats else (tr.id,)
+        for tr in band_env
+    ]
+    params = [
+        config.window_length, config.f1, config.f2, config.highpass, config.lowpass, config.taper,
+        config.Cmin, config.Cmax, config.bstrap, config.bstrap_prct, config.max_scatter,
+        config.grid, list(config.phase_list),
+    ]
+    return hashlib.sha1(json.dumps([channels, params], sort_keys=True).encode()).hexdigest()[:16]
+
+
+def _window_list(band_env, config):
+    """enveloc windows on a fixed grid of ``window_length / 2`` steps since the epoch.
+
+    Unlike windows counted from the start of the data, these are the same in
+    successive runs, so a located window can be reused.
+    """
+    start = band_env[0].stats.starttime
+    step = config.window_length / 2.0
+    offset = (-start.ns % int(round(step * 1e9))) / 1e9
+    return get_window_times(
+        starttime=start,
+        endtime=band_env[0].stats.endtime,
+        window_length=config.window_length,
+        step=step,
+        offset=offset,
+        include_partial_windows=False,
+    )
+
+
+def _run_enveloc_incremental(st, band_env, high_env, config, store):
+    """Locate only the enveloc windows that are not in ``store`` yet.
+
+    Windows ending within ``TREMOR_STORE_MARGIN`` seconds of the end of the
+    data are located but not stored, so they are located again once late
+    packets have arrived. Windows without a location are stored too, so they
+    are not searched again either.
+    """
+    from enveloc.core import event_list, location
+
+    windows = _window_list(band_env, config)
+    if not windows:
+        return event_list([])
+    t_ms = np.array([w[0].ns // 1_000_000 for w in windows], dtype="int64")
+    key = _location_key(band_env, config)
+    stored = store.get(key, t_ms)
+
+    missing = [w for w, t in zip(windows, t_ms) if t not in stored.index]
+    logger.info(f"{len(windows) - len(missing)} of {len(windows)} enveloc windows from store")
+    if missing:
+        loc = _locate(st, band_env, high_env, config, window_list=missing)
+        located = {ev.starttime.ns // 1_000_000: ev for ev in loc.events}
+        new = pd.DataFrame(
+            [
+                {
+                    "t_ms": w[0].ns // 1_000_000,
+                    "latitude": located[t].latitude if t in located else np.nan,
+                    "longitude": located[t].longitude if t in located else np.nan,
+                    "depth": located[t].depth if t in located else np.nan,
+                    "horizontal_scatter": located[t].horizontal_scatter if t in located else np.nan,
+                    "vertical_scatter": located[t].vertical_scatter if t in located else np.nan,
+                }
+                for w in missing
+                for t in [w[0].ns // 1_000_000]
+            ]
+        ).set_index("t_ms")
+
+        margin = float(os.environ["TREMOR_STORE_MARGIN"])
+        final = np.array([w[1] <= band_env[0].stats.endtime - margin for w in missing])
+        if np.any(final):
+            store.put(key, new[final].reset_index())
+        stored = pd.concat([stored.drop(new.index, errors="ignore"), new])
+
+    events = []
+    for (t1, t2), t in zip(windows, t_ms):
+        row = stored.loc[t]
+        if np.isfinite(row["latitude"]):
+            events.append(location(
+                latitude=row["latitude"],
+                longitude=row["longitude"],
+                depth=row["depth"],
+                dx=row["horizontal_scatter"],
+                dz=row["vertical_scatter"],
+                starttime=t1,
+                endtime=t2,
+            ))
+    return event_list(events)
+
+
 def remove_hp_detects(loc):
     A = loc.copy()
     for location in A.events:
@@ -95,24 +186,17 @@ def remove_hp_detects(loc):
 
 
 def preprocess(st, config, t1, t2):
-    st.detrend("demean")
-    st.taper(max_percentage=None, max_length=config.taper)
+    filters = [
+        {"type": "bandpass", "freqmin": config.f1, "freqmax": config.f2, "corners": 2, "zerophase": True},
+        {"type": "highpass", "freq": config.highpass, "corners": 2, "zerophase": True},
+    ]
+    # One demean/taper for both bands
+    band, high = preprocessing.preprocess(st, t1, t2, config.taper, filters)
 
-    band = st.copy().filter(
-        "bandpass", freqmin=config.f1, freqmax=config.f2, corners=2, zerophase=True
-    )
-    high = st.copy().filter("highpass", freq=config.highpass, corners=2, zerophase=True)
-    
-    band.merge(fill_value=0)
-    band.trim(t1, t2, pad=True, fill_value=0)
-    
-    high.merge(fill_value=0)
-    high.trim(t1, t2, pad=True, fill_value=0)
-
-    band_env = make_env(band.copy(), config, t1, t2)
+    band_env = make_env(band, config, t1, t2)
     high_env = make_env(high, config, t1, t2)
 
-    return band_env, high_env, band
+    return band_env, high_env, preprocessing.to_stream(band)
 
 
 def qc_checks(st):
@@ -127,23 +211,53 @@ def qc_checks(st):
     return len(np.unique(lats))
 
 
-def make_env(st, config, t1, t2):
-    new_st = st.copy()
-    for tr in new_st:
-        if tr.stats.sampling_rate > 21:
-            tr.resample(25.0)
-        if tr.stats.npts % 2 == 1:
-            tr.trim(
-                starttime=tr.stats.starttime,
-                endtime=tr.stats.endtime + 1 / tr.stats.sampling_rate,
-                pad=True,
-                fill_value=0,
-            )
-        tr.data = envelope(tr.data)
-        tr.resample(5.0)
+def make_env(matrices, config, t1, t2):
+    """Envelopes of preprocessed channels at 5 Hz, low-passed and trimmed.
+
+    Matrix version of, per trace: resample to 25 Hz (above 21 Hz), pad to
+    an even length, obspy ``envelope``, resample to 5 Hz, then low-pass and
+    trim the stream. The 25 Hz spectrum also gives the Hilbert transform,
+    so the envelope needs no FFT of its own.
 
-    new_st.filter("lowpass", freq=config.lowpass, corners=2, zerophase=True)
+    Args:
+        matrices (list): ``ChannelMatrix`` blocks from ``preprocessing.preprocess``.
+
+    Returns:
+        obspy.Stream: Envelope traces in channel order.
+    """
+    traces = []
+    for cm in matrices:
+        data, spec = cm.data, None
+        fs, npts = cm.sampling_rate, data.shape[1]
+        if fs > 21:
+            spec, npts = preprocessing.resample_spectrum(rfft(data, axis=1), npts, fs, 25.0)
+            fs = 25.0
+            data = irfft(spec, npts, axis=1)
+        if npts % 2 == 1:
+            data = np.pad(data, ((0, 0), (0, 1)))
+            npts += 1
+            spec = None
+        if spec is None:
+            spec = rfft(data, axis=1)
+
+        # scipy.fftpack.hilbert, as used by obspy's envelope: i*sign(f), no DC/Nyquist
+        hilb = 1j * spec
+        hilb[:, 0] = 0
+        hilb[:, -1] = 0
+        env = np.sqrt(data ** 2 + irfft(hilb, npts, axis=1) ** 2)
+
+        spec, npts = preprocessing.resample_spectrum(rfft(env, axis=1), npts, fs, 5.0)
+        env = preprocessing.sos_filter(
+            irfft(spec, npts, axis=1), 5.0, {"type": "lowpass", "freq": config.lowpass, "corners": 2, "zerophase": True}
+        )
+        for row, stats, i in zip(env, cm.stats, cm.index):
+            tr = Trace(data=row)
+            tr.stats = Stats(stats)
+            tr.stats.sampling_rate = 5.0
+            tr.stats.npts = npts
+            traces.append((i, tr))
 
+    new_st = Stream([tr for _, tr in sorted(traces, key=lambda x: x[0])])
     new_st.trim(t1 + config.taper, t2 - config.taper + 1, fill_value=0, pad=True)
 
     return new_st
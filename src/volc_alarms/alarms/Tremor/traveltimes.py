@@ -0,0 +1,232 @@
+"""
+Content-addressed store of enveloc travel-time grids.
+
+enveloc's ``tt_file`` is a single ``.npz`` with the travel times of every
+station, so a file that lacks one station (or was saved for another grid) is
+recomputed for all of them. :class:`TravelTimeStore` keeps travel times under
+``TRAVELTIME_STORE_DIR`` instead:
+
+* ``<key>/`` -- one directory per search grid and velocity model; ``key`` is
+  a hash of the grid node arrays, the velocity model file and the distance
+  table spacing
+* ``<key>/grid.npz`` -- the grid nodes and velocity model layers
+* ``<key>/<phases>.table.npz`` -- TauP travel times from every grid depth to
+  distances ``0, step, 2 * step, ...`` for one phase list
+* ``<key>/<id>_<lat>_<lon>_<phases>.npy`` -- travel times from every grid
+  node to one station (at those coordinates) for one phase list
+* ``<key>/<phases>_<stations>.npz`` -- an enveloc ``tt_file`` (as written by
+  ``XCOR.save_traveltimes``) for one set of stations, assembled from their
+  station files
+
+Only stations without a station file are computed, and ``XCOR`` reads the
+assembled ``tt_file`` through its public ``tt_file`` argument. The file is
+not compressed, so ``XCOR.load_traveltimes`` reads just the stations of its
+stream.
+
+Travel times are computed as ``XCOR.calculate_traveltimes`` does (first
+arrival among the phases, linearly interpolated in distance), except for the
+distances interpolated over. enveloc spaces 50 distances out to the farthest
+grid corner of all the stations it is given, which would make a station's
+travel times depend on the other stations. Here the step is the grid
+diagonal over 49, and the table is only extended to farther distances, so a
+station file depends on nothing but its coordinates, the grid, the model and
+the phases. The two differ by the error of interpolating between TauP
+distances: not at all for constant-velocity (``kmps``) phases, whose travel
+times are linear in distance, and by a few hundredths of a second for ``s``
+and ``S`` in enveloc's default model over the Pavlof grid.
+"""
+
+import hashlib
+import json
+import os
+from importlib.resources import files
+from pathlib import Path
+
+import numpy as np
+from obspy.geodetics import locations2degrees
+from obspy.taup import TauPyModel
+
+from volc_alarms.utils.setup_utils import get_logger
+
+logger = get_logger(__name__)
+
+# Distance points enveloc interpolates over; the table step is the grid
+# diagonal divided into as many intervals
+N_DISTANCES = 50
+
+
+def default_model():
+    """enveloc's velocity model, used when ``XCOR`` is given none."""
+    return Path(str(files("enveloc").joinpath("data", "models", "default_vel_model.tvel")))
+
+
+def grid_key(grid, model_file):
+    """Hash of the grid node arrays, the contents of the velocity model file and the distance table spacing."""
+    model = hashlib.sha1(Path(model_file).read_bytes()).hexdigest()
+    nodes = [np.asarray(grid[k], dtype=float).tolist() for k in ("lons", "lats", "deps")]
+    return hashlib.sha1(json.dumps([nodes, model, N_DISTANCES]).encode()).hexdigest()[:16]
+
+
+def load_model(model_file, build_dir):
+    """
+    TauP model of the ``.tvel`` file ``model_file``.
+
+    A pre-built ``.npz`` next to it (as enveloc ships its default model) is
+    used as is; otherwise the model is built into ``build_dir``, as enveloc
+    builds it into its model directory.
+    """
+    model_file = Path(model_file)
+    built = model_file.with_suffix(".npz")
+    if not built.exists():
+        from obspy.taup.taup_create import build_taup_model
+
+        built = Path(build_dir) / built.name
+        if not built.exists():
+            Path(build_dir).mkdir(parents=True, exist_ok=True)
+            build_taup_model(str(model_file), output_folder=str(build_dir), verbose=False)
+    return TauPyModel(model=str(built))
+
+
+def first_arrival(model, depth, distance, phase_types):
+    """Time of the first arrival among ``phase_types``, with enveloc's fallbacks."""
+    if distance == 0 and depth == 0:
+        return 0.0
+    try:
+        paths = model.get_ray_paths(
+            source_depth_in_km=depth, distance_in_degree=distance, receiver_depth_in_km=0, phase_list=phase_types
+        )
+    except Exception:
+        # Nodes on a velocity model boundary can fail; nudge the depth
+        paths = model.get_ray_paths(
+            source_depth_in_km=depth + 0.00001, distance_in_degree=distance, receiver_depth_in_km=0,
+            phase_list=phase_types,
+        )
+    if not paths and len(phase_types) == 1:
+        paths = model.get_ray_paths(
+            source_depth_in_km=depth, distance_in_degree=distance, receiver_depth_in_km=0,
+            phase_list=[phase_types[0].lower()],
+        )
+    return min(p.time for p in paths)
+
+
+class TravelTimeStore:
+    """
+    Per-station travel times of one search grid and velocity model.
+
+    Parameters
+    ----------
+    root : str or Path
+        Directory holding the stores of all grids.
+    grid : dict
+        ``lons``, ``lats`` and ``deps`` node arrays (see ``build_grid``).
+    phase_types : list of str
+        TauP phases; the travel time is that of the first arrival among them.
+    model_file : str, Path, or None
+        Velocity model (``.tvel``) file; None for enveloc's default model.
+    """
+
+    def __init__(self, root, grid, phase_types, model_file=None):
+        self.grid = {k: np.asarray(grid[k], dtype=float) for k in ("lons", "lats", "deps")}
+        self.phase_types = list(phase_types)
+        self.model_file = Path(model_file) if model_file else default_model()
+        self.path = Path(root) / grid_key(self.grid, self.model_file)
+        self.lon, self.lat = np.meshgrid(self.grid["lons"], self.grid["lats"])
+        diagonal = locations2degrees(self.lat[0, 0], self.lon[0, 0], self.lat[-1, -1], self.lon[-1, -1])
+        self.step = max(float(diagonal), 1e-6) / (N_DISTANCES - 1)
+
+    def _file(self, tr):
+        coords = tr.stats.coordinates
+        return self.path / f"{tr.id}_{coords.latitude:.6f}_{coords.longitude:.6f}_{'+'.join(self.phase_types)}.npy"
+
+    def _table_file(self):
+        return self.path / f"{'+'.join(self.phase_types)}.table.npz"
+
+    def update(self, st):
+        """Compute and store the travel times of the stations of ``st`` that have none yet."""
+        missing = [tr for tr in st if not self._file(tr).exists()]
+        if not missing:
+            return
+        logger.info(f"Calculating travel times for {len(missing)} of {len(st)} stations")
+        distances = [
+            locations2degrees(tr.stats.coordinates.latitude, tr.stats.coordinates.longitude, self.lat, self.lon)
+            for tr in missing
+        ]
+        model = load_model(self.model_file, self.path)
+        degs, times = self.table(model, max(float(d.max()) for d in distances))
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        if not (self.path / "grid.npz").exists():
+            self._save(self.path / "grid.npz", np.savez, model=model.model.s_mod.v_mod.layers, **self.grid)
+        for tr, deg in zip(missing, distances):
+            TT = np.stack([np.interp(deg, degs, times[i]) for i in range(len(self.grid["deps"]))], axis=-1)
+            self._save(self._file(tr), np.save, TT)
+
+    def table(self, model, max_distance):
+        """
+        TauP travel times at distances ``k * step`` out to at least ``max_distance``.
+
+        Parameters
+        ----------
+        model : obspy.taup.TauPyModel
+            Velocity model.
+        max_distance : float
+            Farthest distance needed [deg].
+
+        Returns
+        -------
+        degs : numpy.ndarray
+            Distances [deg].
+        times : numpy.ndarray
+            Travel times [s], one row per grid depth.
+        """
+        n = int(np.ceil(max_distance / self.step - 1e-9)) + 1
+        degs = np.arange(n) * self.step
+        times = np.empty((len(self.grid["deps"]), 0))
+        try:
+            with np.load(self._table_file()) as npzfile:
+                times = npzfile["times"]
+        except FileNotFoundError:
+            pass
+        if times.shape[1] >= n:
+            return np.arange(times.shape[1]) * self.step, times
+
+        # Only the distances beyond the stored ones
+        new = np.array([
+            [first_arrival(model, z, x, self.phase_types) for x in degs[times.shape[1]:]]
+            for z in self.grid["deps"]
+        ])
+        times = np.concatenate([times, new], axis=1)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._save(self._table_file(), np.savez, times=times)
+        return degs, times
+
+    def tt_file(self, st):
+        """
+        enveloc ``tt_file`` with the travel times of the stations of ``st``.
+
+        Stations without travel times are computed first. The file is kept
+        for the next run with the same stations.
+
+        Returns
+        -------
+        Path
+            File to pass to ``XCOR`` as ``tt_file``.
+        """
+        self.update(st)
+        station_files = {tr.id.replace(".", "_"): self._file(tr) for tr in st}
+        stations = hashlib.sha1(json.dumps(sorted(f.name for f in station_files.values())).encode()).hexdigest()[:16]
+        path = self.path / f"{'+'.join(self.phase_types)}_{stations}.npz"
+        if not path.exists():
+            with np.load(self.path / "grid.npz") as npzfile:
+                grid = {k: npzfile[k] for k in ("lons", "lats", "deps", "model")}
+            TT = {key: np.load(f) for key, f in station_files.items()}
+            self._save(path, np.savez, phase_types=self.phase_types, **grid, **TT)
+        return path
+
+    @staticmethod
+    def _save(path, save, *args, **kwargs):
+        """Write via a temporary file so concurrent runs never read a partial file."""
+        tmp = path.with_name(f".{path.name}.{os.getpid()}")
+        with open(tmp, "wb") as f:
+            save(f, *args, **kwargs)
+        os.replace(tmp, path)
@@ -0,0 +1,212 @@
+"""Resident alarm scheduler behind ``run-alarm --daemon``.
+
+Instead of cron spawning a fresh interpreter for every config every minute
+(re-importing obspy, pandas, matplotlib, cartopy and numba each time), the
+daemon imports everything once and hands each due config to a bounded pool of
+forked worker processes. Workers inherit the warm imports, run
+:func:`volc_alarms.scripts.run_alarm.run_config` exactly as a cron launch
+would (same per-config log file, same :class:`LockFile`), and stay alive
+between runs so process-level caches are reused.
+"""
+
+import multiprocessing
+import os
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from importlib import import_module
+from pathlib import Path
+
+from obspy import UTCDateTime as utc
+
+import volc_alarms
+from volc_alarms.scripts.run_alarm import run_config, setup_logging
+from volc_alarms.utils.alarm_flow import launch_delay
+from volc_alarms.utils.setup_utils import LockFile, get_logger, load_config
+
+logger = get_logger(__name__)
+
+
+def _init_worker():
+    """Restore default signal handling in forked workers.
+
+    The parent owns shutdown: Ctrl-C is ignored by workers and SIGTERM
+    terminates them normally instead of running the parent's handler.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+def _run_in_worker(config_name, T0, flags):
+    """Worker entry point: log to the config's own file and run it once."""
+    lock_dir = setup_logging(config_name)
+    run_config(config_name, T0, lock_dir, **flags)
+
+
+def warm_imports():
+    """Import every alarm package once so forked workers start warm.
+
+    Alarms whose optional (``[avo]``) dependencies are missing are logged and
+    skipped; they will raise, and be reported, when they are actually run.
+    """
+    for alarm_type in volc_alarms.__all__:
+        try:
+            import_module(f"volc_alarms.alarms.{alarm_type}")
+        except ImportError as e:
+            logger.warning(f"Could not pre-import {alarm_type} alarm: {e}")
+
+
+def refresh_configs(configs_dir, cache):
+    """Return ``{config_name: config}`` for every alarm config in ``configs_dir``.
+
+    Configs are re-parsed only when their file modification time changes.
+    ``.yml`` files that are not alarm configs (e.g. ``distribution.yml``) are
+    remembered as ``None`` and skipped. Deleted files drop out of ``cache``.
+
+    Parameters
+    ----------
+    configs_dir : str or Path
+        Directory containing the alarm ``.yml`` files (``CONFIGS_DIR``).
+    cache : dict
+        ``{config_name: (mtime, config or None)}``, updated in place.
+
+    Returns
+    -------
+    dict
+        Alarm configs keyed by config name.
+    """
+    seen = set()
+    for path in sorted(Path(configs_dir).glob("*.yml")):
+        name = path.stem
+        seen.add(name)
+        mtime = path.stat().st_mtime
+        if name in cache and cache[name][0] == mtime:
+            continue
+        try:
+            config = load_config(name)
+        except Exception as e:
+            logger.info(f"Skipping {path.name}: not a runnable alarm config ({e})")
+            config = None
+        else:
+            logger.info(f"Loaded {name} ({config.alarm_type})")
+        cache[name] = (mtime, config)
+
+    for name in set(cache) - seen:
+        logger.info(f"{name} removed from {configs_dir}")
+        del cache[name]
+
+    return {name: config for name, (_, config) in cache.items() if config is not None}
+
+
+def is_due(config, T0):
+    """Return True if ``config`` should run at minute ``T0``.
+
+    Configs run every minute unless they set ``cadence`` (minutes), in which
+    case they run on minutes divisible by it (e.g. ``cadence: 5`` runs at
+    :00, :05, :10, ...).
+    """
+    cadence = int(getattr(config, "cadence", 1) or 1)
+    return int(T0.timestamp // 60) % cadence == 0
+
+
+def _log_failure(config_name):
+    def _callback(future):
+        if future.cancelled():
+            return
+        e = future.exception()
+        if e is not None:
+            logger.error(f"{config_name} failed in worker: {e!r}")
+    return _callback
+
+
+def _make_pool(n_workers):
+    return ProcessPoolExecutor(
+        max_workers=n_workers,
+        mp_context=multiprocessing.get_context("fork"),
+        initializer=_init_worker,
+    )
+
+
+def run_daemon(args):
+    """Schedule every config in ``CONFIGS_DIR`` on its minute cadence.
+
+    At each minute mark the config directory is re-scanned, and each due
+    config is launched ``launch_delay(config)`` seconds later (its data
+    latency), so workers never sleep waiting for data. A config whose
+    previous run has not finished is skipped for that minute, and the
+    per-config lock file still guards against a concurrent cron launch.
+    Runs until SIGINT/SIGTERM, then waits for in-flight alarms to finish.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        Parsed ``run-alarm`` arguments; ``test``, ``force``, ``mm`` and
+        ``icinga`` are forwarded to every alarm.
+    """
+    # Tell apply_cron_latency_backup that the launch was already delayed
+    os.environ["ALARM_DAEMON"] = "1"
+
+    lock_dir = setup_logging("Daemon")
+    try:
+        lock = LockFile(lock_dir, "Daemon")
+        lock.acquire()
+    except RuntimeError as e:
+        logger.warning(str(e))
+        return
+
+    configs_dir = os.environ["CONFIGS_DIR"]
+    n_workers = int(os.environ.get("DAEMON_WORKERS", 8))
+    flags = {"test": args.test, "force": args.force, "mm": args.mm, "icinga": args.icinga}
+
+    stop = threading.Event()
+
+    def _stop(signum, frame):
+        logger.info(f"Received signal {signum}; shutting down after running alarms finish")
+        stop.set()
+
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+
+    warm_imports()
+    logger.info(f"Alarm daemon started with {n_workers} workers watching {configs_dir}")
+
+    cache = {}
+    running = {}
+    pool = _make_pool(n_workers)
+    try:
+        while not stop.is_set():
+            now = utc.utcnow()
+            T0 = utc(now.strftime("%Y-%m-%d %H:%M")) + 60
+            if stop.wait(T0 - now):
+                break
+
+            configs = refresh_configs(configs_dir, cache)
+            launches = sorted(
+                (launch_delay(config), name)
+                for name, config in configs.items()
+                if is_due(config, T0)
+            )
+            logger.info(f"{T0.strftime('%Y-%m-%d %H:%M')}: {len(launches)} alarm(s) due")
+
+            for delay, name in launches:
+                if stop.wait(max(0.0, (T0 + delay) - utc.utcnow())):
+                    break
+                previous = running.get(name)
+                if previous is not None and not previous.done():
+                    logger.warning(f"{name} is still running from a previous minute. Skipping.")
+                    continue
+                try:
+                    future = pool.submit(_run_in_worker, name, T0, flags)
+                except BrokenProcessPool:
+                    logger.error("Worker pool broke (a worker died). Restarting pool.")
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = _make_pool(n_workers)
+                    running.clear()
+                    future = pool.submit(_run_in_worker, name, T0, flags)
+                future.add_done_callback(_log_failure(name))
+                running[name] = future
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        lock.release()
+        logger.info("Alarm daemon stopped")
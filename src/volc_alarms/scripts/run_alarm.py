@@ -21,7 +21,9 @@ def parse_args():
         prog="run-alarm",
         epilog="e.g.: `run-alarm avlof_RSAM` or `run-alarm --test -t 201701020205 Pavlof_RSAM`",
     )
-    parser.add_argument("config", type=str, help="Name of the config file")
+    parser.add_argument(
+        "config", type=str, nargs="?", help="Name of the config file (omit with --daemon)"
+    )
     parser.add_argument(
         "-t",
         "--time",
@@ -54,8 +56,19 @@ def parse_args():
         help="Path to a .env file (optional, otherwise searches up the directory tree)",
         required=False,
     )
+    parser.add_argument(
+        "--daemon",
+        help="Stay resident and run every config in CONFIGS_DIR on its minute cadence",
+        action="store_true",
+    )
 
-    return parser.parse_args()
+    args = parser.parse_args()
+    if args.daemon and (args.config or args.time):
+        parser.error("--daemon runs every config at the current minute; omit config and --time")
+    if not args.daemon and not args.config:
+        parser.error("a config name is required unless --daemon is given")
+
+    return args
 
 
 def update_arguments(args):
@@ -74,34 +87,21 @@ def update_arguments(args):
     return args
 
 
-def main():
-    """Main entry point for the alarm runner."""
-
-    from obspy import UTCDateTime as utc
-
-    from volc_alarms.utils import messaging
-    from volc_alarms.utils.setup_utils import (
-        LockFile,
-        get_logger,
-        load_config,
-        load_environment,
-        setup_root_logger,
-    )
+def setup_logging(config_name):
+    """
+    Set up the root logger for ``config_name`` and return the lock directory.
 
-    start = time.time()
+    Cron launches log to a per-config file in ``LOGS_DIR``; interactive runs
+    log to the console and lock in ``~/.tmp/alarms``.
 
-    args = parse_args()
+    Returns:
+        str or Path: Directory in which the config's lock file lives.
+    """
 
-    # Load environment: explicit --env-file if given, otherwise search upward.
-    load_environment(args.env_file)
+    from volc_alarms.utils.setup_utils import setup_root_logger
 
-    # If --earthscope flag is set, use Earthscope FDSN client for waveform downloads
-    if args.earthscope:
-        os.environ["USE_EARTHSCOPE"] = "1"
-    
-    # Set up root logger first (before locking, for error messages)
     if os.getenv("FROMCRON") == "yep":
-        setup_root_logger(log_dir=os.getenv("LOGS_DIR"), config_name=args.config)
+        setup_root_logger(log_dir=os.getenv("LOGS_DIR"), config_name=config_name)
         # keep .keep file from getting pruned by other cron deleting old log-files
         keep_file = Path(os.getenv("LOGS_DIR")) / ".keep"
         keep_file.touch(exist_ok=True)
@@ -113,47 +113,73 @@ def main():
         setup_root_logger()
         lock_dir = Path.home() / ".tmp" / "alarms"
 
+    return lock_dir
+
+
+def run_config(config_name, T0, lock_dir, test=False, force=False, mm=False, icinga=False):
+    """
+    Run a single alarm config once at time ``T0``.
+
+    Acquires the per-config :class:`LockFile`, honors the config kill switch,
+    imports ``volc_alarms.alarms.<alarm_type>`` and calls its ``run_alarm``.
+    Any exception is mailed to the "Error" distribution list. Shared by the
+    one-shot command line and the resident ``--daemon`` scheduler.
+
+    Args:
+        config_name (str): Name of the config file (without .yml extension).
+        T0 (obspy.UTCDateTime): Alarm time, rounded to the minute.
+        lock_dir (str or Path): Directory for the per-config lock file.
+        test, force, mm, icinga (bool): Flags forwarded to ``run_alarm``.
+    """
+
+    from volc_alarms.utils import messaging
+    from volc_alarms.utils.setup_utils import LockFile, get_logger, load_config
+
+    start = time.time()
     logger = get_logger(__name__)
 
     # Implement file locking to avoid multiple instances of the same alarm running
     try:
-        lock = LockFile(lock_dir, args.config)
+        lock = LockFile(lock_dir, config_name)
         lock.acquire()
     except RuntimeError as e:
         logger.warning(str(e))
         return
 
     # Kill switch: if `kill: true` is in the config, send icinga warning and exit
-    config = load_config(args.config)
+    try:
+        config = load_config(config_name)
+    except Exception:
+        lock.release()
+        raise
     if getattr(config, "kill", False):
-        logger.warning(f"Kill switch active for {args.config} — skipping alarm")
-        messaging.icinga(config, "WARNING", f"{args.config} alarm has been killed", send=args.icinga)
+        logger.warning(f"Kill switch active for {config_name} — skipping alarm")
+        messaging.icinga(config, "WARNING", f"{config_name} alarm has been killed", send=icinga)
         lock.release()
         return
 
-    args = update_arguments(args)
-    if args.test:
+    if test:
         # e.g., it would set Nsta=0 for RSAM or relax all infrasound parameters
         logger.info("Running alarm in test mode")
 
-    logger.info(f"---- Running {args.config} at {args.time.strftime('%Y-%m-%d %H:%M:%S')} ----")
+    logger.info(f"---- Running {config_name} at {T0.strftime('%Y-%m-%d %H:%M:%S')} ----")
 
     try:
         # Import and run the alarm
         ALARM = import_module(f"volc_alarms.alarms.{config.alarm_type}")
         ALARM.run_alarm(
-            config, args.time,
-            test_flag=args.test,
-            mm_flag=args.mm,
-            icinga_flag=args.icinga,
-            force_flag=args.force
+            config, T0,
+            test_flag=test,
+            mm_flag=mm,
+            icinga_flag=icinga,
+            force_flag=force
         )
     except Exception:
         # if error, send message to designated recipients
         logger.error("Error...")
         b = traceback.format_exc()
         message = "".join(f"{a}\n" for a in b.splitlines())
-        message = f"{str(args.time)}\n\n{message}"
+        message = f"{str(T0)}\n\n{message}"
         subject = config.alarm_name + " error"
         filename = files("volc_alarms.data").joinpath("oops.jpg")
         messaging.send_alert("Error", subject, message, attachment=filename)
@@ -165,8 +191,45 @@ def main():
     sep_string = "\n-----------------------------------------\n"
     sep_string+= "\n-----------------------------------------"
     logger.info(f"[{end - start:.2f} seconds to complete alarm]{sep_string}")
-    
-    # logger.info(sep_string)
+
+
+def main():
+    """Main entry point for the alarm runner."""
+
+    from volc_alarms.utils.setup_utils import load_environment
+
+    args = parse_args()
+
+    # Load environment: explicit --env-file if given, otherwise search upward.
+    load_environment(args.env_file)
+
+    # If --earthscope flag is set, use Earthscope FDSN client for waveform downloads
+    if args.earthscope:
+        os.environ["USE_EARTHSCOPE"] = "1"
+
+    if args.force:
+        args.test = True
+
+    if args.daemon:
+        from volc_alarms.scripts.alarm_daemon import run_daemon
+
+        run_daemon(args)
+        return
+
+    # Set up root logger first (before locking, for error messages)
+    lock_dir = setup_logging(args.config)
+
+    args = update_arguments(args)
+    run_config(
+        args.config,
+        args.time,
+        lock_dir,
+        test=args.test,
+        force=args.force,
+        mm=args.mm,
+        icinga=args.icinga,
+    )
+
 
 if __name__ == "__main__":
     main()
@@ -23,10 +23,15 @@ def apply_cron_latency_backup(config, T0, extra_sleep=0.0):
 
     `extra_sleep` exists solely to preserve Tremor's existing behavior, which
     sleeps `config.latency + config.taper`. Infrasound and RSAM pass 0.0.
+
+    When running under the resident scheduler (``ALARM_DAEMON`` set), the
+    daemon has already delayed the launch by :func:`launch_delay`, so the
+    sleep is skipped while the >= 30 s back-up still applies.
     """
-    if os.getenv("FROMCRON") == "yep":
+    if os.getenv("FROMCRON") == "yep" or os.getenv("ALARM_DAEMON"):
         if config.latency < 30:
-            time.sleep(config.latency + extra_sleep)
+            if not os.getenv("ALARM_DAEMON"):
+                time.sleep(config.latency + extra_sleep)
         else:
             dt = math.ceil(config.latency / 60) * 60
             T0 = T0 - dt
@@ -34,6 +39,26 @@ def apply_cron_latency_backup(config, T0, extra_sleep=0.0):
     return T0
 
 
+def launch_delay(config):
+    """Seconds after the minute mark at which the daemon should launch an alarm.
+
+    Mirrors the sleep in :func:`apply_cron_latency_backup` so the resident
+    scheduler can wait *before* handing the alarm to a worker instead of
+    tying up a worker while it sleeps. Only the waveform alarms (RSAM,
+    Infrasound, Tremor) wait for data latency; alarms with ``latency >= 30``
+    back up T0 instead and launch immediately.
+    """
+    if config.alarm_type not in ("RSAM", "Infrasound", "Tremor"):
+        return 0.0
+    if config.latency >= 30:
+        return 0.0
+    latency = config.latency
+    # Tremor sleeps an extra taper length (see apply_cron_latency_backup)
+    if config.alarm_type == "Tremor":
+        return float(latency + config.taper)
+    return float(latency)
+
+
 def run_send_sequence(
     config,
     T0,
@@ -1,9 +1,12 @@
 import os
 import sqlite3
+from contextlib import contextmanager
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
+from dateutil.tz import tzlocal
 from tabulate import tabulate
 
 
@@ -18,6 +21,20 @@ def iso_utc(dt: datetime):
     )
 
 
+def iso_utc_series(times):
+    """Column-wise :func:`iso_utc` for a Series of datetimes.
+
+    Naive times are taken as local time, as ``datetime.astimezone`` does.
+    Returns a list of strings.
+    """
+    times = pd.to_datetime(pd.Series(times))
+    if times.dt.tz is None:
+        times = times.dt.tz_localize(
+            tzlocal(), ambiguous=np.ones(len(times), dtype=bool), nonexistent="shift_forward"
+        )
+    return times.dt.tz_convert("UTC").dt.strftime("%Y-%m-%dT%H:%M:%SZ").tolist()
+
+
 def resolve_table_name(test, table=None):
     """Decide which table to use based on boolean test flag."""
     if table == "swarm":
@@ -43,7 +60,9 @@ def init_db(conn, test=False):
     """
 
     conn.execute(table_query)
-    conn.execute("PRAGMA journal_mode=WAL;")  # optional, improves concurrency
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_alarm_time ON {table_name} (alarm_id, process_time)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_event ON {table_name} (event_id)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_volcano_time ON {table_name} (volcano, process_time)")
 
 
 def init_swarm_db(conn, test=False):
@@ -61,32 +80,30 @@ def init_swarm_db(conn, test=False):
         );
     """
     conn.execute(table_query)
-    conn.execute("PRAGMA journal_mode=WAL;")  # optional, improves concurrency
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_time ON {table_name} (time)")
 
 
 def record_swarm_event_ids(swarm_df, test=False):
 
+    rows = zip(
+        swarm_df["event_id"].tolist(),
+        iso_utc_series(swarm_df["time"]),
+        swarm_df["latitude"].tolist(),
+        swarm_df["longitude"].tolist(),
+        swarm_df["depth"].tolist(),
+        swarm_df["mag"].tolist(),
+        swarm_df["v_name"].tolist(),
+    )
+
     table_name = resolve_table_name(test, table="swarm")
-    conn = get_conn(test=test, table="swarm")
-    try:
-        for i, row in swarm_df.iterrows():
-            conn.execute(
-                f"""
-                INSERT OR IGNORE INTO {table_name} (event_id, time, latitude, longitude, depth, mag, volcano)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    row.event_id,
-                    (iso_utc(row.time.to_pydatetime())),
-                    row.latitude,
-                    row.longitude,
-                    row.depth,
-                    row.mag,
-                    row.v_name,
-                ),
-            )
-    finally:
-        conn.close()
+    with db_connection(test=test, table="swarm", transaction=True) as conn:
+        conn.executemany(
+            f"""
+            INSERT OR IGNORE INTO {table_name} (event_id, time, latitude, longitude, depth, mag, volcano)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            rows,
+        )
 
 
 def init_tremor_db(conn, test=False):
@@ -101,46 +118,101 @@ def init_tremor_db(conn, test=False):
             PRIMARY KEY (time, volcano)
         );
     """
+    # time-range queries are served by the (time, volcano) primary key
     conn.execute(table_query)
-    conn.execute("PRAGMA journal_mode=WAL;")  # optional, improves concurrency
 
 
 def record_tremor_event_ids(tremor_df, test=False):
 
+    rows = zip(
+        iso_utc_series(tremor_df["time"]),
+        tremor_df["latitude"].tolist(),
+        tremor_df["longitude"].tolist(),
+        tremor_df["depth"].tolist(),
+        tremor_df["volcano"].tolist(),
+    )
+
     table_name = resolve_table_name(test, table="tremor")
-    conn = get_conn(test=test, table="tremor")
-    try:
-        for i, row in tremor_df.iterrows():
-            conn.execute(
-                f"""
-                INSERT OR IGNORE INTO {table_name} (time, latitude, longitude, depth, volcano)
-                VALUES (?, ?, ?, ?, ?)
-                """,
-                (
-                    (iso_utc(row.time.to_pydatetime())),
-                    row.latitude,
-                    row.longitude,
-                    row.depth,
-                    row.volcano,
-                ),
-            )
-    finally:
-        conn.close()
+    with db_connection(test=test, table="tremor", transaction=True) as conn:
+        conn.executemany(
+            f"""
+            INSERT OR IGNORE INTO {table_name} (time, latitude, longitude, depth, volcano)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            rows,
+        )
 
 
-def get_conn(test=False, table=None):
+# ---- Connection management ----
+# One connection per process (re-opened after fork or if DB_FILE changes), with
+# each table's schema created once instead of on every call.
+_DB_STATE = {"pid": None, "path": None, "conn": None, "tables": set()}
+
+
+def _shared_conn():
+    state = _DB_STATE
     db_path = Path(os.environ["DB_FILE"])
+    conn = state["conn"]
+    if conn is not None and state["pid"] == os.getpid() and state["path"] == db_path:
+        try:
+            conn.total_changes  # raises if a caller closed it
+            return conn
+        except sqlite3.ProgrammingError:
+            pass
+
     os.makedirs(os.path.dirname(db_path), exist_ok=True)
     conn = sqlite3.connect(db_path, timeout=10, isolation_level=None)  # autocommit
-    if table == "swarm":
-        init_swarm_db(conn, test=test)
-    elif table == "tremor":
-        init_tremor_db(conn, test=test)
-    else:
-        init_db(conn, test=test)
+    conn.execute("PRAGMA journal_mode=WAL;")  # optional, improves concurrency
+    state.update(pid=os.getpid(), path=db_path, conn=conn, tables=set())
+    return conn
+
+
+def get_conn(test=False, table=None):
+    """Return this process's shared DB connection with ``table``'s schema in place.
+
+    The connection is reused by every helper in this module; callers should
+    not close it.
+    """
+    conn = _shared_conn()
+    table_name = resolve_table_name(test, table=table)
+    if table_name not in _DB_STATE["tables"]:
+        if table == "swarm":
+            init_swarm_db(conn, test=test)
+        elif table == "tremor":
+            init_tremor_db(conn, test=test)
+        else:
+            init_db(conn, test=test)
+        _DB_STATE["tables"].add(table_name)
     return conn
 
 
+@contextmanager
+def db_connection(test=False, table=None, transaction=False):
+    """
+    Context manager around :func:`get_conn`.
+
+    Yields the shared connection and rolls back any transaction left open
+    if the block raises. With ``transaction=True`` the block runs inside a
+    single ``BEGIN IMMEDIATE ... COMMIT``, so batched writes cost one commit.
+
+    Examples
+    --------
+    >>> with db_connection(test=True) as conn:
+    ...     conn.execute("SELECT COUNT(*) FROM test_sent_events").fetchone()
+    """
+    conn = get_conn(test=test, table=table)
+    try:
+        if transaction:
+            conn.execute("BEGIN IMMEDIATE")
+        yield conn
+        if transaction:
+            conn.execute("COMMIT")
+    except BaseException:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+
+
 def record_send(config, T0, volcano=None, event_id=None, test=False):
 
     process_time = iso_utc(T0.datetime.replace(tzinfo=timezone.utc))
@@ -153,18 +225,14 @@ def record_send(config, T0, volcano=None, event_id=None, test=False):
         event_id = [event_id]
 
     table_name = resolve_table_name(test)
-    conn = get_conn(test=test)
-    try:
-        for ev_id in event_id:
-            conn.execute(
-                f"""
-                INSERT INTO {table_name} (alarm_id, process_time, send_time, volcano, event_id)
-                VALUES (?, ?, ?, ?, ?)
-                """,
-                (config.alarm_name, process_time, send_time, volcano, ev_id)
-            )
-    finally:
-        conn.close()
+    with db_connection(test=test, transaction=True) as conn:
+        conn.executemany(
+            f"""
+            INSERT INTO {table_name} (alarm_id, process_time, send_time, volcano, event_id)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            ((config.alarm_name, process_time, send_time, volcano, ev_id) for ev_id in event_id),
+        )
 
 
 def can_send(config, volcano="*", T0=None, test=False):
@@ -184,25 +252,23 @@ def can_send(config, volcano="*", T0=None, test=False):
     base_sql = f"""
                 SELECT COUNT(*)
                 FROM {table_name}
-                WHERE alarm_id = '{config.alarm_name}'
-                AND process_time >= '{cutoff_iso}'
-                AND process_time <= '{now_iso}'
+                WHERE alarm_id = ?
+                AND process_time >= ?
+                AND process_time <= ?
                 """
+    params = [config.alarm_name, cutoff_iso, now_iso]
     if volcano != "*":
-        base_sql += f" AND volcano = '{volcano}'"
+        base_sql += " AND volcano = ?"
+        params.append(volcano)
 
-    conn = get_conn(test=test)
-    try:
-        (cnt,) = conn.execute(base_sql).fetchone()
+    with db_connection(test=test) as conn:
+        (cnt,) = conn.execute(base_sql, params).fetchone()
 
         if cnt < config.max_alerts:
             return True
         else:
             return False
 
-    finally:
-        conn.close()
-
 
 def next_send_after(config, volcano="*", T0=None, test=False):
     """Return the earliest UTC datetime at which a new alert will be allowed again,
@@ -219,25 +285,65 @@ def next_send_after(config, volcano="*", T0=None, test=False):
     table_name = resolve_table_name(test)
     base_sql = f"""
                 SELECT process_time FROM {table_name}
-                WHERE alarm_id = '{config.alarm_name}'
-                AND process_time >= '{cutoff_iso}'
-                AND process_time <= '{now_iso}'
+                WHERE alarm_id = ?
+                AND process_time >= ?
+                AND process_time <= ?
                 """
+    params = [config.alarm_name, cutoff_iso, now_iso]
     if volcano != "*":
-        base_sql += f" AND volcano = '{volcano}'"
+        base_sql += " AND volcano = ?"
+        params.append(volcano)
     base_sql += " ORDER BY process_time ASC"
 
-    conn = get_conn(test=test)
-    try:
-        rows = conn.execute(base_sql).fetchall()
+    with db_connection(test=test) as conn:
+        rows = conn.execute(base_sql, params).fetchall()
         # After the current send, count will be len(rows) + 1.
         # Suppression kicks in when count >= max_alerts.
         if len(rows) + 1 >= config.max_alerts:
             oldest = datetime.fromisoformat(rows[0][0].replace("Z", "+00:00"))
             return oldest + timedelta(seconds=config.alert_memory)
         return None
-    finally:
-        conn.close()
+
+
+# Bound variables per IN (...) query; below SQLite's historic limit of 999
+ID_CHUNK_SIZE = 500
+
+
+def existing_event_ids(conn, table_name, event_ids, since=None, time_column="process_time"):
+    """
+    Return the subset of ``event_ids`` already recorded in ``table_name``.
+
+    Only the candidate IDs are looked up (chunked ``IN (...)`` queries served
+    by the event_id index), so the cost does not grow with the table.
+
+    Parameters
+    ----------
+    conn : sqlite3.Connection
+        Connection from :func:`get_conn`.
+    table_name : str
+        Table to search (see :func:`resolve_table_name`).
+    event_ids : iterable of str
+        Candidate IDs.
+    since : str, optional
+        ISO-8601 UTC time; only rows with ``time_column >= since`` count.
+    time_column : str, optional
+        Time column used with ``since``.
+
+    Returns
+    -------
+    set of str
+    """
+    candidate_ids = list(dict.fromkeys(str(eid) for eid in event_ids))
+    existing = set()
+    for i in range(0, len(candidate_ids), ID_CHUNK_SIZE):
+        chunk = candidate_ids[i:i + ID_CHUNK_SIZE]
+        sql = f"SELECT event_id FROM {table_name} WHERE event_id IN ({', '.join('?' * len(chunk))})"
+        params = list(chunk)
+        if since is not None:
+            sql += f" AND {time_column} >= ?"
+            params.append(since)
+        existing.update(row[0] for row in conn.execute(sql, params))
+    return existing
 
 
 def check_new_event_ids(event_ids, test=False, table=None):
@@ -250,24 +356,11 @@ def check_new_event_ids(event_ids, test=False, table=None):
     if not candidate_ids:
         return 0, 0  # nothing to check => nothing new
 
-    placeholders = ", ".join("?" for _ in candidate_ids)
     table_name = resolve_table_name(test, table=table)
-    conn = get_conn(test=test)  # your existing connection helper
-    try:
-        rows = conn.execute(
-            f"""
-            SELECT event_id
-            FROM {table_name}
-            WHERE event_id IN ({placeholders})
-            """,
-            tuple(candidate_ids),
-        ).fetchall()
-
-        existing = {row[0] for row in rows}
+    with db_connection(test=test, table=table) as conn:
+        existing = existing_event_ids(conn, table_name, candidate_ids)
         # If the set difference is non-empty, at least one is new
         return len(candidate_ids - existing), len(existing)
-    finally:
-        conn.close()
 
 
 def already_processed(config, evid, test=False):
@@ -276,26 +369,22 @@ def already_processed(config, evid, test=False):
     base_sql = f"""
                 SELECT COUNT(*)
                 FROM {table_name}
-                WHERE alarm_id = '{config.alarm_name}'
-                AND event_id = '{evid}'
+                WHERE alarm_id = ?
+                AND event_id = ?
                 """
 
-    conn = get_conn(test=test)
-    try:
-        (cnt,) = conn.execute(base_sql).fetchone()
+    with db_connection(test=test) as conn:
+        (cnt,) = conn.execute(base_sql, (config.alarm_name, str(evid))).fetchone()
         if cnt > 0:
             return True
         else:
             return False
-    finally:
-        conn.close()
 
 
 def list_all_alarm_ids(test=False):
     table_name = resolve_table_name(test)
     print(f"Entries for {table_name} table")
-    conn = get_conn(test=test)
-    try:
+    with db_connection(test=test) as conn:
         rows = conn.execute(
             f"""
             SELECT DISTINCT alarm_id
@@ -315,8 +404,6 @@ def list_all_alarm_ids(test=False):
 
         return alarm_ids
 
-    finally:
-        conn.close()
 
 
 def filtered_list(query_dict, test=False):
@@ -324,57 +411,39 @@ def filtered_list(query_dict, test=False):
     table_name = resolve_table_name(test)
 
     headers = ["id", "alarm_id", "process_time", "send_time", "volcano", "event_id"]
-    query = f"SELECT {', '.join(headers)} FROM {table_name} WHERE "
+    query = f"SELECT {', '.join(headers)} FROM {table_name} "
 
-    need_and = False
+    conditions = []
+    params = []
     if "alarm_id" in query_dict.keys():
-        a_id = query_dict["alarm_id"]
-        query += f"alarm_id = '{a_id}' "
-        need_and = True
+        conditions.append("alarm_id = ?")
+        params.append(query_dict["alarm_id"])
     if "volcano" in query_dict.keys():
-        v_name = query_dict["volcano"]
-        if need_and:
-            query += f"AND volcano = '{v_name}' "
-        else:
-            query += f"volcano = '{v_name}' "
-        need_and = True
+        conditions.append("volcano = ?")
+        params.append(query_dict["volcano"])
     if "t1" in query_dict.keys():
         t1 = pd.to_datetime(query_dict["t1"]).to_pydatetime()
-        t1 = iso_utc(t1)
-        if need_and:
-            query += f"AND process_time >= '{t1}' "
-        else:
-            query += f"process_time >= '{t1}' "
-        need_and = True
+        conditions.append("process_time >= ?")
+        params.append(iso_utc(t1))
     if "t2" in query_dict.keys():
         t2 = pd.to_datetime(query_dict["t2"]).to_pydatetime()
-        t2 = iso_utc(t2)
-        if need_and:
-            query += f"AND process_time <= '{t2}' "
-        else:
-            query += f"process_time <= '{t2}' "
-        need_and = True
+        conditions.append("process_time <= ?")
+        params.append(iso_utc(t2))
     if "event_id" in query_dict.keys():
-        evid = query_dict["event_id"]
-        if need_and:
-            query += f"AND event_id = {evid} "
-        else:
-            query += f"event_id = {evid} "
-        need_and = True
-    
-        
+        conditions.append("event_id = ?")
+        params.append(str(query_dict["event_id"]))
+
+    if conditions:
+        query += f"WHERE {' AND '.join(conditions)} "
     query += "ORDER BY process_time DESC;"
 
     print(f"Entries for {resolve_table_name(test)} table")
-    conn = get_conn(test=test)
-    try:
-        rows = conn.execute(query).fetchall()
+    with db_connection(test=test) as conn:
+        rows = conn.execute(query, params).fetchall()
         if not rows:
             print("  (none)")
         else:
             print(tabulate(rows, headers=headers, tablefmt="fancy_grid"))
-    finally:
-        conn.close()
 
     return rows
 
@@ -390,16 +459,16 @@ def list_alarm_entries(alarm_id=None, test=False):
 
     table_name = resolve_table_name(test)
     print(f"Entries for {table_name} table")
-    conn = get_conn(test=test)
-    try:
+    with db_connection(test=test) as conn:
         for alarm_id in alarm_ids:
             rows = conn.execute(
                 f"""
                 SELECT {', '.join(headers)}
                 FROM {table_name}
-                WHERE alarm_id = '{alarm_id}'
+                WHERE alarm_id = ?
                 ORDER BY process_time DESC;
-                """
+                """,
+                (alarm_id,),
             ).fetchall()
 
             print(f"\nAlarm entries for: {alarm_id}")
@@ -409,8 +478,6 @@ def list_alarm_entries(alarm_id=None, test=False):
 
             print(tabulate(rows, headers=headers, tablefmt="fancy_grid"))
 
-    finally:
-        conn.close()
 
 
 def remove_alarm_ids(alarm_id, t_start, t_end, test=False):
@@ -424,18 +491,16 @@ def remove_alarm_ids(alarm_id, t_start, t_end, test=False):
         t_end = iso_utc(t_end)
 
     table_name = resolve_table_name(test)
-    try:
-        conn = get_conn(test=test)
+    with db_connection(test=test) as conn:
         conn.execute(
             f"""
             DELETE FROM {table_name}
-            WHERE alarm_id = '{alarm_id}'
-            AND process_time >= '{t_start}'
-            AND process_time <= '{t_end}';
-            """
+            WHERE alarm_id = ?
+            AND process_time >= ?
+            AND process_time <= ?;
+            """,
+            (alarm_id, t_start, t_end),
         )
-    finally:
-        conn.close()
 
     return
 
@@ -463,20 +528,39 @@ def remove_catalog_entries(t_start, t_end, table, test=False):
         t_end = iso_utc(pd.to_datetime(t_end).to_pydatetime())
 
     table_name = resolve_table_name(test, table=table)
-    conn = get_conn(test=test, table=table)
-    try:
+    with db_connection(test=test, table=table) as conn:
         conn.execute(
             f"""
             DELETE FROM {table_name}
-            WHERE time >= '{t_start}'
-            AND time <= '{t_end}';
-            """
+            WHERE time >= ?
+            AND time <= ?;
+            """,
+            (t_start, t_end),
         )
-    finally:
-        conn.close()
 
 
-def filter_dataframe(df, id_column="id", test=False, table=None):
+def filter_dataframe(df, id_column="id", test=False, table=None, since=None):
+    """
+    Split off the rows of ``df`` whose IDs are not yet in the DB.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        Candidate events.
+    id_column : str, optional
+        Column holding the event IDs.
+    test : bool, optional
+        Use the test tables.
+    table : str, optional
+        ``"swarm"`` for the swarm catalog, otherwise the sent-events table.
+    since : datetime or str, optional
+        Only treat IDs recorded at or after this time as already seen.
+
+    Returns
+    -------
+    tuple of pandas.DataFrame
+        ``(new_df, df)``: a copy of the unseen rows and the input frame.
+    """
 
     if id_column not in df.columns:
         raise ValueError(f"DataFrame must have an '{id_column}' column")
@@ -484,18 +568,17 @@ def filter_dataframe(df, id_column="id", test=False, table=None):
     # Ensure string comparison consistency (your DB stores TEXT for event_id)
     ids = df[id_column].astype(str)
 
-    table_name = resolve_table_name(test, table=table)
-    conn = get_conn(test=test, table=table)
+    if since is not None:
+        since = iso_utc(pd.to_datetime(since, utc=True).to_pydatetime())
+    time_column = "time" if table == "swarm" else "process_time"
 
-    sql_query = f"SELECT event_id FROM {table_name} WHERE event_id IS NOT NULL"
-    try:
-        cur = conn.execute(sql_query)
-        event_ids_in_db = {row[0] for row in cur.fetchall()}  # build a Python set for fast membership tests
+    table_name = resolve_table_name(test, table=table)
+    with db_connection(test=test, table=table) as conn:
+        event_ids_in_db = existing_event_ids(
+            conn, table_name, ids.unique(), since=since, time_column=time_column
+        )
 
         # Anti-join via boolean mask
         mask_not_in_db = ~ids.isin(event_ids_in_db)
         new_df = df.loc[mask_not_in_db].copy()
         return new_df, df
-
-    finally:
-        conn.close()
\ No newline at end of file
@@ -1,7 +1,10 @@
 import io
 import os
+import queue
 import socket
+import threading
 import time
+from concurrent.futures import Future, wait
 from pathlib import Path
 
 import numpy as np
@@ -17,6 +20,7 @@ from obspy.core.inventory.inventory import Inventory
 from obspy.io.quakeml.core import Unpickler
 
 from volc_alarms.utils.setup_utils import get_logger
+from volc_alarms.utils.station_index import write_station_index
 
 urllib3.disable_warnings()
 
@@ -125,12 +129,243 @@ def _qc_sub_trace(sub_trace):
     return sub_trace
 
 
+def _waveform_client():
+    """Return the waveform client selected by the environment.
+
+    Earthscope FDSN when ``USE_EARTHSCOPE`` is set (``--earthscope`` flag),
+    otherwise the Winston waveserver configured in the .env file.
+    """
+    if os.environ.get("USE_EARTHSCOPE"):
+        return FDSN_Client("earthscope", timeout=FDSN_TIMEOUT)
+    return EW_Client(
+        os.environ["WINSTON_HOST"],
+        int(os.environ["WINSTON_PORT"]),
+        timeout=int(os.environ["TIMEOUT"]),
+    )
+
+
+def _merge_channel(nslc, tr):
+    """QC and merge the traces returned for one channel."""
+    if len(tr) > 1: # pragma: no cover
+        # Handle cases with multiple traces (e.g., due to gaps)
+        for sub_trace in tr:
+            # Ensure consistent data types and sampling rates
+            sub_trace = _qc_sub_trace(sub_trace)
+        if not tr.get_gaps():
+            # handle case where multiple traces returned with no gaps between them
+            logger.info(f"{nslc}: Multiple traces returned with no gaps between. Simple merge")
+            tr.merge()
+    return tr
+
+
+def _get_channel(client, nslc, T1, T2):
+    """Download one NSLC channel, returning an empty Stream on failure."""
+    try:
+        tr = _merge_channel(nslc, client.get_waveforms(*nslc.split("."), T1, T2))
+    except Exception:
+        logger.warning(f"Error grabbing data for {nslc}, filling with zeros")
+        tr = Stream()
+    return tr
+
+
+def _get_bulk(client, requests):
+    """Download several channels with one FDSN ``get_waveforms_bulk`` request.
+
+    Parameters
+    ----------
+    client : obspy.clients.fdsn.Client
+        FDSN client.
+    requests : list of tuple
+        ``(nslc, t1, t2)`` for each channel.
+
+    Returns
+    -------
+    list of obspy.Stream
+        The demultiplexed, trimmed and merged traces for each request (empty
+        Stream for channels without data). If the bulk request fails, the
+        channels are requested one by one, so one bad channel does not blank
+        the others.
+    """
+    bulk = [(*nslc.split("."), t1, t2) for nslc, t1, t2 in requests]
+    try:
+        st = client.get_waveforms_bulk(bulk)
+    except FDSNNoDataException:
+        st = Stream()
+    except Exception as e:
+        logger.warning(f"Error grabbing bulk data for {len(bulk)} channels ({e}), requesting them one by one")
+        return [_get_channel(client, nslc, t1, t2) for nslc, t1, t2 in requests]
+
+    out = []
+    for (net, sta, loc, chan, t1, t2), (nslc, _, _) in zip(bulk, requests):
+        # get_waveforms_bulk does not trim to the requested window
+        tr = Stream([
+            sub_trace.slice(t1, t2)
+            for sub_trace in st.select(network=net, station=sta, location=loc, channel=chan)
+        ])
+        tr.traces = [sub_trace for sub_trace in tr if sub_trace.stats.npts]
+        out.append(_merge_channel(nslc, tr))
+    return out
+
+
+def _zero_trace(nslc, T1, T2):
+    """Blank trace standing in for a channel with no data."""
+    tr = Trace()
+    tr.id = nslc
+    tr.stats["sampling_rate"] = 100
+    tr.stats["starttime"] = T1
+    tr.data = np.zeros(
+        int((T2 - T1) * tr.stats["sampling_rate"]), dtype="int32"
+    )
+    return tr
+
+
+def _waveform_cache():
+    """Return the on-disk ring-buffer cache, or None unless ``USE_WAVEFORM_CACHE`` is set.
+
+    Each data source gets its own subdirectory so Winston and Earthscope
+    samples are never mixed.
+    """
+    if not os.environ.get("USE_WAVEFORM_CACHE"):
+        return None
+    from volc_alarms.utils.waveform_cache import WaveformCache
+
+    if os.environ.get("USE_EARTHSCOPE"):
+        source = "earthscope"
+    else:
+        source = f"winston_{os.environ['WINSTON_HOST']}_{os.environ['WINSTON_PORT']}"
+    return WaveformCache(
+        Path(os.environ["WAVEFORM_CACHE_DIR"]) / source,
+        capacity=float(os.environ["WAVEFORM_CACHE_SECONDS"]),
+        margin=float(os.environ["WAVEFORM_CACHE_MARGIN"]),
+    )
+
+
+def _run_concurrently(task, items, labels):
+    """Run ``task(client, item)`` for every item in a pool of threads.
+
+    ``DOWNLOAD_WORKERS`` threads each hold their own waveserver client. Every
+    request is bounded by the client's own timeout (``TIMEOUT`` or
+    ``FDSN_TIMEOUT``) and the whole batch by ``DOWNLOAD_BUDGET`` seconds
+    (0 = no budget). The threads are daemon threads, so stragglers left
+    behind when the budget runs out do not hold up the exit of the alarm.
+
+    Returns
+    -------
+    list
+        ``task`` results in the order of ``items``; None where the task raised
+        or had not finished when the budget ran out.
+    """
+    n_workers = max(1, min(int(os.environ.get("DOWNLOAD_WORKERS", 4)), len(items)))
+    budget = float(os.environ.get("DOWNLOAD_BUDGET", 0)) or None
+
+    futures = [Future() for _ in items]
+    pending = queue.SimpleQueue()
+    for future, item in zip(futures, items):
+        pending.put((future, item))
+
+    def worker():
+        client = None
+        while True:
+            try:
+                future, item = pending.get_nowait()
+            except queue.Empty:
+                return
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                if client is None:
+                    client = _waveform_client()
+                future.set_result(task(client, item))
+            except Exception as e:
+                future.set_exception(e)
+
+    for k in range(n_workers):
+        threading.Thread(target=worker, name=f"download_{k}", daemon=True).start()
+    _, not_done = wait(futures, timeout=budget)
+    # Requests not started yet are dropped; running ones time out on their own
+    for future in not_done:
+        future.cancel()
+
+    results = []
+    for label, future in zip(labels, futures):
+        if future in not_done:
+            logger.warning(f"{label}: not downloaded within {budget:.0f} s budget")
+            results.append(None)
+        elif future.exception() is not None:
+            logger.warning(f"Error grabbing data for {label}: {future.exception()}")
+            results.append(None)
+        else:
+            results.append(future.result())
+    return results
+
+
+def _download_channels(nslc_list, T1, T2, cache=None):
+    """Fetch every channel with its own request, concurrently.
+
+    Returns
+    -------
+    list of obspy.Stream
+        One Stream per entry of ``nslc_list`` (empty if the channel failed or
+        was still downloading when the budget ran out).
+    """
+    def task(client, nslc):
+        if cache is None:
+            return _get_channel(client, nslc, T1, T2)
+        return cache.get(nslc, T1, T2, lambda t1, t2: _get_channel(client, nslc, t1, t2))
+
+    results = _run_concurrently(task, nslc_list, nslc_list)
+    return [Stream() if tr is None else tr for tr in results]
+
+
+def _download_bulk(nslc_list, T1, T2, cache=None):
+    """Fetch channels from FDSN in ``get_waveforms_bulk`` requests of
+    ``FDSN_BULK_SIZE`` channels, sending the chunks concurrently.
+
+    With a cache, each channel only asks for its uncached tail and the
+    demultiplexed result is handed to the cache afterwards.
+
+    Returns
+    -------
+    list of obspy.Stream
+        One Stream per entry of ``nslc_list``.
+    """
+    if cache is None:
+        windows = [(T1, T2)] * len(nslc_list)
+    else:
+        windows = [cache.fetch_window(nslc, T1, T2) for nslc in nslc_list]
+    requests = [(i, nslc, *window) for i, (nslc, window) in enumerate(zip(nslc_list, windows)) if window]
+
+    size = max(1, int(os.environ.get("FDSN_BULK_SIZE", 50)))
+    chunks = [requests[i:i + size] for i in range(0, len(requests), size)]
+    labels = [f"{chunk[0][1]} (+{len(chunk) - 1} channels)" for chunk in chunks]
+    results = _run_concurrently(
+        lambda client, chunk: _get_bulk(client, [request[1:] for request in chunk]),
+        chunks,
+        labels,
+    )
+
+    fetched = [Stream() for _ in nslc_list]
+    for chunk, streams in zip(chunks, results):
+        for (i, *_), tr in zip(chunk, streams or []):
+            fetched[i] = tr
+    if cache is None:
+        return fetched
+    return [
+        cache.get(nslc, T1, T2, lambda t1, t2, tr=tr: tr.slice(t1, t2))
+        for nslc, tr in zip(nslc_list, fetched)
+    ]
+
+
 def download_waveforms(nslc_list, T1, T2):
     """Download waveform data for a list of NSLC channels.
 
     Uses the Earthscope FDSN client if the ``USE_EARTHSCOPE`` environment
     variable is set using the `--earthscope` flag, otherwise connects 
-    to datasource listed in the .env file
+    to datasource listed in the .env file. Channels are requested in
+    parallel by ``DOWNLOAD_WORKERS`` threads; Earthscope channels are
+    batched into bulk requests of ``FDSN_BULK_SIZE`` channels. When ``USE_WAVEFORM_CACHE`` is
+    set, samples already fetched by earlier runs are served from a local
+    ring buffer and only the newest data is requested.
 
     Parameters
     ----------
@@ -152,43 +387,20 @@ def download_waveforms(nslc_list, T1, T2):
     logger.info("Grabbing data...")
 
     st = Stream()
+    if not nslc_list:
+        return st
 
+    cache = _waveform_cache()
     if os.environ.get("USE_EARTHSCOPE"):
-        client = FDSN_Client("earthscope", timeout=FDSN_TIMEOUT)
+        results = _download_bulk(nslc_list, T1, T2, cache=cache)
     else:
-        client = EW_Client(
-            os.environ["WINSTON_HOST"],
-            int(os.environ["WINSTON_PORT"]),
-            timeout=int(os.environ["TIMEOUT"]),
-        )
-
+        results = _download_channels(nslc_list, T1, T2, cache=cache)
 
-    for nslc in nslc_list:
-        try:
-            tr = client.get_waveforms(*nslc.split("."), T1, T2)
-            if len(tr) > 1: # pragma: no cover
-                # Handle cases with multiple traces (e.g., due to gaps)
-                for sub_trace in tr:
-                    # Ensure consistent data types and sampling rates
-                    sub_trace = _qc_sub_trace(sub_trace)
-                if not tr.get_gaps():
-                    # handle case where multiple traces returned with no gaps between them
-                    logger.info(f"{nslc}: Multiple traces returned with no gaps between. Simple merge")
-                    tr.merge()
-
-        except Exception:
-            logger.warning(f"Error grabbing data for {nslc}, filling with zeros")
-            tr = Stream()
+    for nslc, tr in zip(nslc_list, results):
         # if no data, create a blank trace for that channel
         if not tr:
             logger.warning(f"No data for {nslc}. Filling with zeros")
-            tr = Trace()
-            tr.id = nslc
-            tr.stats["sampling_rate"] = 100
-            tr.stats["starttime"] = T1
-            tr.data = np.zeros(
-                int((T2 - T1) * tr.stats["sampling_rate"]), dtype="int32"
-            )
+            tr = _zero_trace(nslc, T1, T2)
         st += tr
 
     return st
@@ -320,6 +532,7 @@ def download_station_xml():
     tmp_outfile = out_file.with_suffix(".tmp")
     inventory.write(tmp_outfile, format="STATIONXML")
     os.replace(tmp_outfile, out_file)
+    write_station_index(inventory, out_file)
 
     logger.info("^^^^^^ Finished Updating Metadata ^^^^^^")
     return
@@ -3,32 +3,203 @@ from pathlib import Path
 
 import numpy as np
 import pandas as pd
-from obspy import Catalog, UTCDateTime, read_inventory
+from obspy import Catalog, UTCDateTime
 from obspy.clients.fdsn import Client as FDSN_Client
 from obspy.core.event import Event
 from obspy.geodetics import gps2dist_azimuth
 
+from volc_alarms.utils import preprocessing
 from volc_alarms.utils.downloading import Earthscope_client
-from volc_alarms.utils.setup_utils import get_logger, load_volcano_list
+from volc_alarms.utils.setup_utils import get_logger, load_volcano_list, volcano_list_file
+from volc_alarms.utils.station_index import load_station_index
 
 logger = get_logger(__name__)
 
 
-def find_nearest_volcano(df, lon_col="longitude", lat_col="latitude", filter_col=None, volc_df=None):
+# WGS84 ellipsoid, as used by obspy.geodetics.gps2dist_azimuth
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
 
-    if volc_df is None:
-        volc_df = load_volcano_list()
-    V_DIST = []
-    V_NAME = []
-    
+
+def geodetic_distance(lat1, lon1, lat2, lon2):
+    """Vectorized WGS84 distance (km) between points, broadcasting like NumPy.
+
+    Vincenty's inverse formula, matching :func:`obspy.geodetics.gps2dist_azimuth`
+    to well below a metre. Pairs that do not converge (nearly antipodal
+    points) fall back to ``gps2dist_azimuth``; NaN coordinates give NaN.
+
+    Parameters
+    ----------
+    lat1, lon1, lat2, lon2 : float or array_like
+        Coordinates in degrees.
+
+    Returns
+    -------
+    numpy.ndarray
+        Distances in km.
+    """
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(
+        *(np.asarray(x, dtype=float) for x in (lat1, lon1, lat2, lon2))
+    )
+    shape = lat1.shape
+    lat1, lon1, lat2, lon2 = (x.ravel() for x in (lat1, lon1, lat2, lon2))
+    a = WGS84_A
+    f = WGS84_F
+    b = a * (1 - f)
+
+    u1 = np.arctan((1 - f) * np.tan(np.radians(lat1)))
+    u2 = np.arctan((1 - f) * np.tan(np.radians(lat2)))
+    sin_u1, cos_u1 = np.sin(u1), np.cos(u1)
+    sin_u2, cos_u2 = np.sin(u2), np.cos(u2)
+    omega = np.radians((lon2 - lon1 + 180) % 360 - 180)
+    finite = np.isfinite(omega) & np.isfinite(u1) & np.isfinite(u2)
+    same = np.isclose(lat1, lat2) & np.isclose(omega, 0)
+
+    n = len(omega)
+    sin_sigma = np.zeros(n)
+    cos_sigma = np.ones(n)
+    sigma = np.zeros(n)
+    sqr_cos_alpha = np.ones(n)
+    cos2sigma_m = np.zeros(n)
+    lam = omega.copy()
+
+    # Iterate only the pairs that have not converged yet
+    active = np.flatnonzero(finite & ~same)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for _ in range(100):
+            if not len(active):
+                break
+            su1, cu1, su2, cu2 = sin_u1[active], cos_u1[active], sin_u2[active], cos_u2[active]
+            sin_lam, cos_lam = np.sin(lam[active]), np.cos(lam[active])
+            s_sigma = np.hypot(cu2 * sin_lam, cu1 * su2 - su1 * cu2 * cos_lam)
+            c_sigma = su1 * su2 + cu1 * cu2 * cos_lam
+            sig = np.arctan2(s_sigma, c_sigma)
+            sin_alpha = cu1 * cu2 * sin_lam / s_sigma
+            sq_cos_alpha = 1 - sin_alpha**2
+            # Equatorial lines have cos(alpha) = 0
+            c2sm = np.where(np.isclose(sq_cos_alpha, 0), 0.0, c_sigma - 2 * su1 * su2 / sq_cos_alpha)
+            c = (f / 16) * sq_cos_alpha * (4 + f * (4 - 3 * sq_cos_alpha))
+            new_lam = omega[active] + (1 - c) * f * sin_alpha * (
+                sig + c * s_sigma * (c2sm + c * c_sigma * (-1 + 2 * c2sm**2))
+            )
+            done = np.abs(new_lam - lam[active]) <= 1e-9 * np.abs(new_lam)
+
+            sin_sigma[active] = s_sigma
+            cos_sigma[active] = c_sigma
+            sigma[active] = sig
+            sqr_cos_alpha[active] = sq_cos_alpha
+            cos2sigma_m[active] = c2sm
+            lam[active] = new_lam
+            active = active[~done]
+
+        u_sq = sqr_cos_alpha * (a * a - b * b) / (b * b)
+        A = 1 + (u_sq / 16384) * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+        B = (u_sq / 1024) * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+        delta_sigma = B * sin_sigma * (
+            cos2sigma_m + (B / 4) * (
+                cos_sigma * (-1 + 2 * cos2sigma_m**2)
+                - (B / 6) * cos2sigma_m * (-3 + 4 * sin_sigma**2) * (-3 + 4 * cos2sigma_m**2)
+            )
+        )
+        dist = b * A * (sigma - delta_sigma)
+    dist[same] = 0.0
+    dist[~finite] = np.nan
+
+    # Nearly antipodal pairs that did not converge
+    for i in np.union1d(active, np.flatnonzero(finite & ~np.isfinite(dist))):
+        dist[i] = gps2dist_azimuth(lat1[i], lon1[i], lat2[i], lon2[i])[0]
+
+    dist = dist.reshape(shape)
+    return dist / 1000.0
+
+
+def _haversine(lat1, lon1, lat2, lon2, radius=6371.0088):
+    """Great-circle distance (km) on a sphere of mean Earth radius."""
+    lat1, lon1, lat2, lon2 = (np.radians(x) for x in (lat1, lon1, lat2, lon2))
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * radius * np.arcsin(np.sqrt(np.clip(h, 0, 1)))
+
+
+# Process-level cache, {(volcano_file, filter_col): (stamp, points)}
+_VOLCANO_POINTS = {}
+
+
+def _cached_volcano_points(filter_col):
+    """Points of the current :func:`load_volcano_list` table, derived once per file version."""
+    volcano_file, stamp = volcano_list_file()
+    key = (str(volcano_file), filter_col)
+    cached = _VOLCANO_POINTS.get(key)
+    if cached is None or cached[0] != stamp:
+        cached = (stamp, _volcano_points(load_volcano_list(volcano_file), filter_col))
+        _VOLCANO_POINTS[key] = cached
+    return cached[1]
+
+
+def _volcano_points(volc_df, filter_col=None):
+    """Names and coordinates of the volcanoes not opted out in ``filter_col``."""
     if filter_col is not None and filter_col in volc_df.columns:
         volc_df = volc_df[volc_df[filter_col] != "N"]
+    return (
+        volc_df["Name"].to_numpy(),
+        volc_df["Latitude"].to_numpy(dtype=float),
+        volc_df["Longitude"].to_numpy(dtype=float),
+    )
 
-    for _, row in df.iterrows():
-        volc_df = volcano_distance(row[lon_col], row[lat_col], volc_df)
-        nearest = volc_df.loc[volc_df["distance"].idxmin()]
-        V_DIST.append(nearest.distance)
-        V_NAME.append(nearest.Name)
+
+def find_nearest_volcano(df, lon_col="longitude", lat_col="latitude", filter_col=None, volc_df=None):
+    """Add the nearest volcano and its distance to every row of ``df``.
+
+    The volcano coordinates are prepared once per volcano list and
+    ``filter_col`` and reused across calls; distances for all rows are
+    computed in one vectorized pass.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        Events with longitude/latitude columns.
+    lon_col, lat_col : str, optional
+        Names of the coordinate columns in ``df``.
+    filter_col : str, optional
+        Per-alarm opt-in column of the volcano list; volcanoes marked ``"N"``
+        are ignored.
+    volc_df : pandas.DataFrame, optional
+        Volcano table to use instead of :func:`load_volcano_list` (the
+        ``VOLCANO_LIST`` file, or the bundled list if that is unset).
+
+    Returns
+    -------
+    pandas.DataFrame
+        ``df`` with added ``v_distance`` (km) and ``v_name`` columns.
+    """
+    if volc_df is None:
+        names, v_lat, v_lon = _cached_volcano_points(filter_col)
+    else:
+        names, v_lat, v_lon = _volcano_points(volc_df, filter_col)
+
+    lat = df[lat_col].to_numpy(dtype=float)
+    lon = df[lon_col].to_numpy(dtype=float)
+    V_DIST = np.full(len(df), np.nan)
+    V_NAME = np.full(len(df), None, dtype=object)
+
+    # Chunk rows so the (rows x volcanoes) matrix stays small
+    chunk = 2048
+    for i0 in range(0, len(df), chunk):
+        c_lat = lat[i0:i0 + chunk]
+        c_lon = lon[i0:i0 + chunk]
+        # Spherical distances are within 0.6% of the ellipsoid, so only
+        # volcanoes close to the spherical minimum need the exact distance
+        approx = _haversine(c_lat[:, None], c_lon[:, None], v_lat[None, :], v_lon[None, :])
+        approx[np.isnan(approx)] = np.inf
+        cutoff = approx.min(axis=1, keepdims=True) * 1.02 + 1.0
+        r, c = np.nonzero(approx <= cutoff)
+        dist = np.full(approx.shape, np.inf)
+        dist[r, c] = geodetic_distance(c_lat[r], c_lon[r], v_lat[c], v_lon[c])
+
+        idx = np.argmin(dist, axis=1)
+        nearest = dist[np.arange(len(idx)), idx]
+        valid = np.isfinite(nearest)
+        V_DIST[i0:i0 + chunk][valid] = nearest[valid]
+        V_NAME[i0:i0 + chunk][valid] = names[idx[valid]]
 
     df["v_distance"] = V_DIST
     df["v_name"] = V_NAME
@@ -63,10 +234,7 @@ def volcano_distance(lon0, lat0, volcs, filter_col=None):
     if filter_col is not None and filter_col in volcs.columns:
         volcs = volcs[volcs[filter_col] != "N"]
 
-    DIST = np.array([])
-    for lat, lon in zip(volcs.Latitude.values, volcs.Longitude.values):
-        dist, azimuth, az2 = gps2dist_azimuth(lat, lon, lat0, lon0)
-        DIST = np.append(DIST, dist / 1000.0)
+    DIST = geodetic_distance(volcs.Latitude.values, volcs.Longitude.values, lat0, lon0)
     volcs.loc[:, "distance"] = DIST
 
     volcs = volcs.sort_values("distance")
@@ -249,54 +417,54 @@ def add_metadata(st):
         logger.error("Station XML file missing")
         return
 
-    inventory = read_inventory(xml_file)
+    index = load_station_index(xml_file)
 
     for tr in st:
         logger.info(f"Getting metadata for {tr.id}")
-
-        inv = inventory.select(
-            network=tr.stats.network,
-            station=tr.stats.station,
-            location=tr.stats.location,
-            channel=tr.stats.channel,
-            starttime=tr.stats.starttime,
-            endtime=tr.stats.endtime,
-        )
-        tr.stats.coordinates = inv.get_coordinates(tr.id, tr.stats.starttime)
-        tr.stats.inventory = inv
+        tr.stats.coordinates = index.get_coordinates(tr.id, tr.stats.starttime)
+        tr.stats.response = index.get_response(tr.id, tr.stats.starttime)
 
     return st
 
 
 def preprocess_stream(st, t1, t2, config):
-    st.detrend("demean")
-    st.taper(max_percentage=None, max_length=config.taper)
-    st.filter("bandpass", freqmin=config.f1, freqmax=config.f2, corners=2, zerophase=True)
-    st.merge(fill_value=0)
-    
-    gaps = st.get_gaps()
-    if gaps:
-        logger.warning(f"Gappy data: {len(gaps)} gap(s)/overlap(s)")
-        for net, sta, loc, chan, t_last, t_next, delta, samples in gaps:
-            logger.warning(
-                f"{net}.{sta}.{loc}.{chan}: {t_last} -> {t_next} "
-                f"(delta={delta:.3f}s, samples={samples})"
-            )
-        logger.warning("Attempting to merge (fill_value=0)")
-        st.merge(fill_value=0)
-    
-    st.trim(t1, t2, pad=True, fill_value=0)
-    return st
+    """
+    Demean, taper, bandpass filter, merge and trim a stream to ``[t1, t2]``.
+
+    Same result as obspy's ``detrend``/``taper``/``filter``/``merge``/``trim``
+    chain, computed on channel matrices (see
+    :func:`volc_alarms.utils.preprocessing.preprocess`). Gaps and missing
+    data are filled with zeros and logged.
+
+    Returns
+    -------
+    obspy.Stream
+        Processed stream; ``st`` itself is not modified.
+    """
+    bandpass = {"type": "bandpass", "freqmin": config.f1, "freqmax": config.f2, "corners": 2, "zerophase": True}
+    matrices = preprocessing.preprocess(st, t1, t2, config.taper, [bandpass])[0]
+    _log_gaps(matrices)
+    return preprocessing.to_stream(matrices)
+
+
+def _log_gaps(matrices):
+    """Warn about channels with gap-filled or padded samples."""
+    gappy = [(stats, n) for cm in matrices for stats, n in zip(cm.stats, cm.mask.sum(axis=1)) if n]
+    if gappy:
+        logger.warning(f"Gappy data: {len(gappy)} channel(s) zero-filled")
+        for stats, n in gappy:
+            logger.warning(f"{stats.network}.{stats.station}.{stats.location}.{stats.channel}: {n} of {stats.npts} samples filled (fill_value=0)")
 
 
 def remove_gain(st):
     """
     Remove instrument gain/sensitivity from traces in a stream.
 
-    Note: inventory is stashed on ``tr.stats.inventory`` (not a bare
-    ``tr.inventory`` attribute) since ``Trace.stats`` is deep-copied by
+    Note: the response is attached as ``tr.stats.response`` (not a bare
+    ``tr.response`` attribute) since ``Trace.stats`` is deep-copied by
     ``Stream.merge()`` and ``Trace.copy()``, while arbitrary attributes
-    set directly on a ``Trace`` object are not preserved by either.
+    set directly on a ``Trace`` object are not preserved by either. A full
+    inventory on ``tr.stats.inventory`` is still accepted.
 
     Args:
         st (Stream): ObsPy Stream object.
@@ -305,8 +473,10 @@ def remove_gain(st):
         Stream: Stream with gain removed.
     """
     for tr in st:
-        if "inventory" in tr.stats and tr.stats.inventory is not None:
+        if "response" in tr.stats and tr.stats.response is not None:
+            tr.remove_sensitivity()
+        elif "inventory" in tr.stats and tr.stats.inventory is not None: # pragma: no cover
             tr.remove_sensitivity(tr.stats.inventory)
         else: # pragma: no cover
-            logger.warning(f"{tr.id}: no inventory attached. Skipping gain removal.")
+            logger.warning(f"{tr.id}: no response attached. Skipping gain removal.")
     return st
\ No newline at end of file
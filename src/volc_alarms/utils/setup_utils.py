@@ -76,6 +76,9 @@ def load_environment(env_file=None):
     os.environ.setdefault("WINSTON_PORT", "16022")
     os.environ.setdefault("TIMEOUT", "20")
     os.environ.setdefault("FDSN_TIMEOUT", "60")
+    os.environ.setdefault("FDSN_BULK_SIZE", "50")
+    os.environ.setdefault("DOWNLOAD_WORKERS", "4")
+    os.environ.setdefault("DOWNLOAD_BUDGET", "0")
 
     # --- URL defaults (overridden by .env or shell exports) ---
     PIREP_URL = "https://mesonet.agron.iastate.edu/cgi-bin/request/gis/pireps.py"
@@ -94,6 +97,17 @@ def load_environment(env_file=None):
     os.environ.setdefault("TIMEZONE", _detect_system_tz())
     os.environ.setdefault("LOG_HOUR_INTERVAL", "12")
     os.environ.setdefault("LOG_DAYS_KEEP", "7")
+    os.environ.setdefault("DAEMON_WORKERS", "8")
+    os.environ.setdefault("WAVEFORM_CACHE_DIR", str(TMP_DIR / "waveform_cache"))
+    os.environ.setdefault("WAVEFORM_CACHE_SECONDS", "3720")
+    os.environ.setdefault("WAVEFORM_CACHE_MARGIN", "30")
+    os.environ.setdefault("LTS_STORE_DIR", str(TMP_DIR / "lts_store"))
+    os.environ.setdefault("LTS_STORE_SECONDS", "7200")
+    os.environ.setdefault("LTS_STORE_MARGIN", "30")
+    os.environ.setdefault("TREMOR_STORE_DIR", str(TMP_DIR / "tremor_store"))
+    os.environ.setdefault("TREMOR_STORE_SECONDS", "7200")
+    os.environ.setdefault("TREMOR_STORE_MARGIN", "30")
+    os.environ.setdefault("TRAVELTIME_STORE_DIR", str(TMP_DIR / "traveltimes"))
 
 
 def _detect_system_tz():
@@ -316,12 +330,15 @@ def load_config(config_name):
             config.duration = os.environ.get("RSAM_DURATION", 300)
 
     if config.alarm_type == "Tremor":
-        if not hasattr(config, "grid_file"):
-            config.grid_file = TMP_DIR / f"{config.alarm_name.replace(' ', '_')}_grid.npz"
         if not hasattr(config, "lookback_window") or config.lookback_window is None:
             config.lookback_window = int(os.environ.get("TREMOR_LOOKBACK_WINDOW", 60))
         if not hasattr(config, "window_length") or config.window_length is None:
             config.window_length = os.environ.get("TREMOR_WINDOW_LENGTH", 300)
+        if getattr(config, "grid_file", None):
+            get_logger(__name__).warning(
+                f"{config_name}: grid_file is no longer used; travel times are kept under TRAVELTIME_STORE_DIR "
+                "(see Upgrading in CHANGELOG.md)"
+            )
 
     return config
 
@@ -370,6 +387,10 @@ def update_infrasound_config(config):
         config.lts_alpha = os.environ.get("LTS_ALPHA", 0.5)
     if not hasattr(config, "lts_n_samples"):
         config.lts_n_samples = int(os.environ.get("LTS_N_SAMPLES", 100))
+    if not hasattr(config, "lts_n_jobs"):
+        config.lts_n_jobs = int(os.environ.get("LTS_N_JOBS", 1))
+    if not hasattr(config, "lts_target_rate"):
+        config.lts_target_rate = float(os.environ["LTS_TARGET_RATE"]) if os.environ.get("LTS_TARGET_RATE") else None
     if not hasattr(config, "max_gap_fraction"):
         config.max_gap_fraction = os.environ.get("MAX_GAP_FRACTION", 0.5)
 
@@ -406,6 +427,10 @@ def update_infrasound_config(config):
     return config
 
 
+# Process-level cache of parsed volcano lists, {path: ((mtime_ns, size), df)}
+_VOLCANO_LISTS = {}
+
+
 def load_volcano_list(volcano_file=None):
     """
     Load volcano list from file, supporting .xlsx, .csv, or .txt formats.
@@ -413,6 +438,11 @@ def load_volcano_list(volcano_file=None):
     Requires the following columns: "Name", "Latitude", "Longitude".
     Additional columns are preserved if present.
 
+    The parsed table is cached per process and re-read only when the file's
+    modification time or size changes; every call returns a fresh copy, so
+    callers may modify it. Parsed ``.xlsx`` files are also stored in a hidden
+    pickle next to the original so later processes skip openpyxl.
+
     Parameters
     ----------
     volcano_file : str, Path, or None
@@ -430,18 +460,57 @@ def load_volcano_list(volcano_file=None):
     ValueError
         If file format is not supported or required columns are missing
     """
+    volcano_file, stamp = volcano_list_file(volcano_file)
+
+    cached = _VOLCANO_LISTS.get(str(volcano_file))
+    if cached is None or cached[0] != stamp:
+        cached = (stamp, _read_volcano_list(volcano_file, stamp))
+        _VOLCANO_LISTS[str(volcano_file)] = cached
+
+    return cached[1].copy()
+
+
+def volcano_list_file(volcano_file=None):
+    """
+    Resolve the volcano list :func:`load_volcano_list` reads.
+
+    Parameters
+    ----------
+    volcano_file : str, Path, or None
+        As for :func:`load_volcano_list`.
+
+    Returns
+    -------
+    volcano_file : Path
+        The file itself.
+    stamp : tuple
+        ``(mtime_ns, size)`` of the file; the parsed table is re-read when
+        this changes.
+    """
     if volcano_file is None:
         volcano_file = os.environ.get("VOLCANO_LIST")
         if volcano_file is None:
             # Fallback if load_environment() hasn't been called yet
             from importlib.resources import files
             volcano_file = files("volc_alarms.data").joinpath("volcano_list.csv")
-    
+
     volcano_file = Path(volcano_file)
-    
+    stat = volcano_file.stat()
+    return volcano_file, (stat.st_mtime_ns, stat.st_size)
+
+
+def _read_volcano_list(volcano_file, stamp):
+    """Parse and validate a volcano list file (see :func:`load_volcano_list`)."""
     required_columns = {"Name", "Latitude", "Longitude"}
     
     if volcano_file.suffix.lower() == ".xlsx":
+        sidecar = volcano_file.with_name(f".{volcano_file.name}.pkl")
+        try:
+            sidecar_stamp, df = pd.read_pickle(sidecar)
+            if sidecar_stamp == stamp:
+                return df
+        except Exception:
+            pass
         df = pd.read_excel(volcano_file)
     elif volcano_file.suffix.lower() == ".csv":
         df = pd.read_csv(volcano_file)
@@ -476,6 +545,15 @@ def load_volcano_list(volcano_file=None):
     
     if rename_dict:
         df = df.rename(columns=rename_dict)
+
+    if volcano_file.suffix.lower() == ".xlsx":
+        tmp_file = sidecar.with_name(f"{sidecar.name}.{os.getpid()}.tmp")
+        try:
+            pd.to_pickle((stamp, df), tmp_file)
+            os.replace(tmp_file, sidecar)
+        except OSError:
+            # Read-only location; the process-level cache still applies
+            tmp_file.unlink(missing_ok=True)
     
     return df
 
@@ -511,8 +589,11 @@ def setup_root_logger(
     root_logger = logging.getLogger()
     root_logger.setLevel(log_level)
 
-    # Clear any existing handlers to avoid duplicates
+    # Clear any existing handlers to avoid duplicates. Close them too, since a
+    # resident daemon worker re-runs this for every alarm it executes.
     if root_logger.handlers:
+        for handler in root_logger.handlers:
+            handler.close()
         root_logger.handlers.clear()
 
     # Format string with millisecond precision
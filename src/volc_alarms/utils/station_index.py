@@ -0,0 +1,227 @@
+"""
+Pre-parsed station metadata index.
+
+Parsing the response-level StationXML with ``read_inventory`` is the slowest
+step of a quiet alarm run, yet an alarm only needs coordinates and a gain for
+a handful of channels. ``update-metadata`` therefore writes a compact index
+next to ``STATION_XML`` (e.g. ``stations.xml``):
+
+* ``stations.index.npy``    -- one row per channel epoch, sorted by NSLC and
+  start time: epoch, coordinates, overall sensitivity and the location of
+  the channel's pickled response
+* ``stations.responses.bin`` -- the concatenated pickled ``Response`` objects
+* ``stations.index.json``   -- modification time and size of the StationXML
+  the index was built from
+
+Both binary files are memory-mapped, so a lookup only touches the rows (and
+the one pickled response) it needs. The index is rebuilt automatically when
+the StationXML changes.
+"""
+
+import json
+import os
+import pickle
+from pathlib import Path
+
+import numpy as np
+from obspy import UTCDateTime, read_inventory
+
+from volc_alarms.utils.setup_utils import get_logger
+
+logger = get_logger(__name__)
+
+INDEX_DTYPE = np.dtype([
+    ("nslc", "U32"),
+    ("start", "f8"),
+    ("end", "f8"),
+    ("latitude", "f8"),
+    ("longitude", "f8"),
+    ("elevation", "f8"),
+    ("local_depth", "f8"),
+    ("sensitivity", "f8"),
+    ("response_offset", "i8"),
+    ("response_length", "i8"),
+])
+
+# Process-level cache, {xml_file: StationIndex}; reused by daemon workers
+_INDEX_CACHE = {}
+
+
+def _index_files(xml_file):
+    xml_file = Path(xml_file)
+    return (
+        xml_file.with_suffix(".index.npy"),
+        xml_file.with_suffix(".responses.bin"),
+        xml_file.with_suffix(".index.json"),
+    )
+
+
+def _xml_stamp(xml_file):
+    stat = Path(xml_file).stat()
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def _build_arrays(inventory):
+    """Flatten an inventory into index rows and a blob of pickled responses."""
+    rows = []
+    blobs = []
+    offset = 0
+    for net in inventory:
+        for sta in net:
+            for cha in sta:
+                response = cha.response
+                sensitivity = np.nan
+                if response is not None and response.instrument_sensitivity is not None:
+                    sensitivity = response.instrument_sensitivity.value
+                blob = pickle.dumps(response, protocol=pickle.HIGHEST_PROTOCOL)
+                rows.append((
+                    f"{net.code}.{sta.code}.{cha.location_code}.{cha.code}",
+                    cha.start_date.timestamp if cha.start_date else -np.inf,
+                    cha.end_date.timestamp if cha.end_date else np.inf,
+                    cha.latitude,
+                    cha.longitude,
+                    cha.elevation,
+                    cha.depth,
+                    sensitivity,
+                    offset,
+                    len(blob),
+                ))
+                blobs.append(blob)
+                offset += len(blob)
+
+    index = np.array(rows, dtype=INDEX_DTYPE)
+    index = index[np.lexsort((index["start"], index["nslc"]))]
+    return index, np.frombuffer(b"".join(blobs), dtype="uint8")
+
+
+def write_station_index(inventory, xml_file=None):
+    """
+    Write the binary index for ``inventory`` next to its StationXML file.
+
+    Parameters
+    ----------
+    inventory : obspy.Inventory
+        Inventory that was written to ``xml_file``.
+    xml_file : str or Path, optional
+        StationXML file the index belongs to, by default ``STATION_XML``.
+    """
+    xml_file = Path(xml_file or os.environ["STATION_XML"])
+    index_file, response_file, header_file = _index_files(xml_file)
+    index, responses = _build_arrays(inventory)
+
+    # Write to temporary files first; the header is replaced last so readers
+    # never see a header that vouches for a half-written index
+    for out_file, array in ((index_file, index), (response_file, responses)):
+        tmp_file = out_file.with_name(out_file.name + ".tmp")
+        with open(tmp_file, "wb") as f:
+            if out_file.suffix == ".npy":
+                np.save(f, array)
+            else:
+                array.tofile(f)
+        os.replace(tmp_file, out_file)
+
+    header = {"xml": _xml_stamp(xml_file), "rows": len(index)}
+    tmp_file = header_file.with_name(header_file.name + ".tmp")
+    tmp_file.write_text(json.dumps(header))
+    os.replace(tmp_file, header_file)
+    logger.info(f"Wrote station index for {len(index)} channel epochs")
+
+
+def _open_index(xml_file, stamp):
+    """Memory-map the index for ``xml_file`` or return None if missing/stale."""
+    index_file, response_file, header_file = _index_files(xml_file)
+    try:
+        header = json.loads(header_file.read_text())
+        if header["xml"] != stamp:
+            return None
+        index = np.load(index_file, mmap_mode="r")
+        if index.dtype != INDEX_DTYPE or len(index) != header["rows"]:
+            return None
+        if response_file.stat().st_size:
+            responses = np.memmap(response_file, dtype="uint8", mode="r")
+        else:
+            responses = np.zeros(0, dtype="uint8")
+    except (OSError, ValueError, KeyError):
+        return None
+    return StationIndex(index, responses, stamp)
+
+
+def load_station_index(xml_file=None):
+    """
+    Return the :class:`StationIndex` for ``STATION_XML``.
+
+    The index is cached per process and re-opened when the StationXML file
+    changes. A missing or stale index is rebuilt from the StationXML (and
+    kept in memory only if it cannot be written).
+
+    Parameters
+    ----------
+    xml_file : str or Path, optional
+        StationXML file, by default ``STATION_XML``.
+
+    Returns
+    -------
+    StationIndex
+    """
+    xml_file = Path(xml_file or os.environ["STATION_XML"])
+    stamp = _xml_stamp(xml_file)
+
+    index = _INDEX_CACHE.get(str(xml_file))
+    if index is not None and index.stamp == stamp:
+        return index
+
+    index = _open_index(xml_file, stamp)
+    if index is None:
+        logger.info(f"Station index missing or out of date. Rebuilding from {xml_file.name}")
+        inventory = read_inventory(xml_file)
+        try:
+            write_station_index(inventory, xml_file)
+            index = _open_index(xml_file, stamp)
+        except OSError as e:
+            logger.warning(f"Could not write station index: {e}")
+        if index is None:
+            index = StationIndex(*_build_arrays(inventory), stamp)
+
+    _INDEX_CACHE[str(xml_file)] = index
+    return index
+
+
+class StationIndex:
+    """Channel-epoch lookups against a loaded station index."""
+
+    def __init__(self, index, responses, stamp):
+        self.index = index
+        self.responses = responses
+        self.stamp = stamp
+
+    def _row(self, nslc, time=None):
+        """Index row of the epoch of ``nslc`` active at ``time`` (latest if None)."""
+        lo = np.searchsorted(self.index["nslc"], nslc, side="left")
+        hi = np.searchsorted(self.index["nslc"], nslc, side="right")
+        if lo == hi:
+            raise Exception(f"No matching channel metadata found for {nslc}")
+        if time is None:
+            return self.index[hi - 1]
+        t = UTCDateTime(time).timestamp
+        for row in self.index[lo:hi]:
+            if row["start"] <= t <= row["end"]:
+                return row
+        raise Exception(f"No matching channel metadata found for {nslc} at {time}")
+
+    def get_coordinates(self, nslc, time=None):
+        """Coordinates dict as returned by ``Inventory.get_coordinates``."""
+        row = self._row(nslc, time)
+        return {
+            key: float(row[key])
+            for key in ("latitude", "longitude", "elevation", "local_depth")
+        }
+
+    def get_sensitivity(self, nslc, time=None):
+        """Overall instrument sensitivity (counts per input unit)."""
+        return float(self._row(nslc, time)["sensitivity"])
+
+    def get_response(self, nslc, time=None):
+        """Full ``obspy`` Response of the channel epoch."""
+        row = self._row(nslc, time)
+        start = int(row["response_offset"])
+        return pickle.loads(self.responses[start:start + int(row["response_length"])].tobytes())
@@ -0,0 +1,296 @@
+"""
+Persistent per-channel waveform ring buffers.
+
+Most waveform alarms run every minute over a window that is several minutes
+long, so nearly all of the samples they need were already downloaded by the
+previous run. :class:`WaveformCache` keeps a memory-mapped ring buffer on
+local disk for every NSLC:
+
+* ``<nslc>.data.npy`` -- int32 samples, indexed by absolute sample number
+  ``k = round((t - offset) * sampling_rate)`` modulo the ring capacity
+* ``<nslc>.mask.npy`` -- bool gap mask (True where a sample was received)
+* ``<nslc>.json``     -- the time index: sampling rate, sub-sample offset,
+  capacity and the ``[start_k, end_k)`` range of samples the ring holds
+
+A request is served from the ring and only the part after the cached end
+(minus a trailing margin, so late-arriving packets are picked up) is fetched
+from the waveserver.
+"""
+
+import json
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+from obspy import Stream, Trace, UTCDateTime
+
+from volc_alarms.utils.setup_utils import get_logger
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+logger = get_logger(__name__)
+
+
+class _Ring:
+    """Open ring buffer for one channel (header + memory-mapped arrays)."""
+
+    def __init__(self, stem, header, mode):
+        self.stem = stem
+        self.sampling_rate = header["sampling_rate"]
+        self.offset = header["offset"]
+        self.capacity = header["capacity"]
+        self.start_k = header["start_k"]
+        self.end_k = header["end_k"]
+        if mode == "w+":
+            shape = (self.capacity,)
+            self.data = np.lib.format.open_memmap(f"{stem}.data.npy", mode=mode, dtype="int32", shape=shape)
+            self.mask = np.lib.format.open_memmap(f"{stem}.mask.npy", mode=mode, dtype="bool", shape=shape)
+        else:
+            self.data = np.load(f"{stem}.data.npy", mmap_mode=mode)
+            self.mask = np.load(f"{stem}.mask.npy", mmap_mode=mode)
+            if self.data.shape != (self.capacity,) or self.mask.shape != (self.capacity,):
+                raise ValueError("ring arrays do not match header capacity")
+
+    def sample_index(self, t):
+        """Fractional absolute sample number of time ``t``."""
+        return (t.timestamp - self.offset) * self.sampling_rate
+
+    def time_of(self, k):
+        return UTCDateTime(k / self.sampling_rate + self.offset)
+
+    def claim(self, a, b):
+        """Extend the held range to cover ``[a, b)``, clearing recycled slots."""
+        a = max(a, b - self.capacity)
+        if b > self.end_k:
+            lo = max(self.end_k, b - self.capacity)
+            self.mask[np.arange(lo, b) % self.capacity] = False
+            self.end_k = b
+            self.start_k = max(self.start_k, b - self.capacity)
+        if a < self.start_k:
+            self.mask[np.arange(a, self.start_k) % self.capacity] = False
+            self.start_k = a
+
+    def write(self, tr):
+        """Copy a trace's samples into the ring (clipped to the held range)."""
+        k0 = int(round(self.sample_index(tr.stats.starttime)))
+        a = max(k0, self.start_k)
+        b = min(k0 + tr.stats.npts, self.end_k)
+        if b <= a:
+            return
+        pos = np.arange(a, b) % self.capacity
+        self.data[pos] = tr.data[a - k0:b - k0]
+        self.mask[pos] = True
+
+    def read(self, nslc, T1, T2):
+        """Return the cached samples in ``[T1, T2]`` as one trace per gap-free run."""
+        k1 = max(int(np.ceil(self.sample_index(T1) - 1e-6)), self.start_k)
+        k2 = min(int(np.floor(self.sample_index(T2) + 1e-6)) + 1, self.end_k)
+        st = Stream()
+        if k2 <= k1:
+            return st
+        pos = np.arange(k1, k2) % self.capacity
+        data = np.array(self.data[pos])
+        mask = np.array(self.mask[pos])
+        # Split into runs of received samples
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.view(np.int8), [0]))))
+        net, sta, loc, chan = nslc.split(".")
+        for i0, i1 in zip(edges[::2], edges[1::2]):
+            tr = Trace(data=data[i0:i1].copy())
+            tr.stats.network = net
+            tr.stats.station = sta
+            tr.stats.location = loc
+            tr.stats.channel = chan
+            tr.stats.sampling_rate = self.sampling_rate
+            tr.stats.starttime = self.time_of(k1 + i0)
+            st += tr
+        return st
+
+    def save_header(self):
+        self.data.flush()
+        self.mask.flush()
+        header = {
+            "sampling_rate": self.sampling_rate,
+            "offset": self.offset,
+            "capacity": self.capacity,
+            "start_k": int(self.start_k),
+            "end_k": int(self.end_k),
+        }
+        tmp_file = Path(f"{self.stem}.json.tmp")
+        tmp_file.write_text(json.dumps(header))
+        os.replace(tmp_file, f"{self.stem}.json")
+
+
+class WaveformCache:
+    """
+    Disk-backed per-NSLC ring buffers in front of a waveform fetch function.
+
+    Parameters
+    ----------
+    cache_dir : str or Path
+        Directory holding the ring files (one set per NSLC).
+    capacity : float
+        Seconds of data kept per channel. Requests longer than this bypass
+        the cache.
+    margin : float
+        Seconds before the cached end that are always re-requested, so that
+        packets arriving late at the waveserver still make it into the ring.
+    """
+
+    def __init__(self, cache_dir, capacity=3720, margin=30):
+        self.cache_dir = Path(cache_dir)
+        self.capacity = float(capacity)
+        self.margin = float(margin)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @contextmanager
+    def _locked(self, nslc):
+        """Exclusive per-channel lock, shared by all alarm processes."""
+        if fcntl is None:  # pragma: no cover
+            yield
+            return
+        with open(self.cache_dir / f"{nslc}.lock", "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _open(self, stem):
+        try:
+            header = json.loads(Path(f"{stem}.json").read_text())
+            return _Ring(stem, header, "r+")
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError, OSError) as e:
+            logger.warning(f"Discarding unreadable waveform cache {stem}: {e}")
+            return None
+
+    def _create(self, stem, tr):
+        sampling_rate = float(tr.stats.sampling_rate)
+        k = tr.stats.starttime.timestamp * sampling_rate
+        header = {
+            "sampling_rate": sampling_rate,
+            "offset": (k - np.round(k)) / sampling_rate,
+            "capacity": int(np.ceil(self.capacity * sampling_rate)),
+            "start_k": 0,
+            "end_k": 0,
+        }
+        ring = _Ring(stem, header, "w+")
+        ring.mask[:] = False
+        k0 = int(round(ring.sample_index(tr.stats.starttime)))
+        ring.start_k = ring.end_k = k0
+        return ring
+
+    @staticmethod
+    def _compatible(ring, tr):
+        """True if ``tr`` lands on the ring's sample grid."""
+        if tr.stats.sampling_rate != ring.sampling_rate:
+            return False
+        k = ring.sample_index(tr.stats.starttime)
+        return abs(k - np.round(k)) < 0.25
+
+    def _fetch_start(self, ring, T1):
+        """Earliest time that still has to come from the waveserver."""
+        if ring is not None and ring.end_k > ring.start_k:
+            cached_start = ring.time_of(ring.start_k)
+            cached_end = ring.time_of(ring.end_k)
+            if cached_start <= T1 <= cached_end:
+                return max(T1, cached_end - self.margin)
+        return T1
+
+    def fetch_window(self, nslc, T1, T2):
+        """
+        Return the ``(t1, t2)`` span :meth:`get` would fetch, or None if the
+        request is fully cached. Lets callers batch downloads for many
+        channels before handing each result to :meth:`get`.
+        """
+        if T2 - T1 > self.capacity:
+            return T1, T2
+        with self._locked(nslc):
+            fetch_t1 = self._fetch_start(self._open(str(self.cache_dir / nslc)), T1)
+        return (fetch_t1, T2) if fetch_t1 < T2 else None
+
+    def get(self, nslc, T1, T2, fetch):
+        """
+        Return data for ``nslc`` between ``T1`` and ``T2``.
+
+        Parameters
+        ----------
+        nslc : str
+            Channel in N.S.L.C format.
+        T1, T2 : obspy.UTCDateTime
+            Requested time span.
+        fetch : callable
+            ``fetch(t1, t2) -> obspy.Stream`` downloading one channel from the
+            waveserver. Called at most once, for the uncached tail only.
+
+        Returns
+        -------
+        obspy.Stream
+            One trace per gap-free run of data (empty if nothing is available).
+        """
+        if T2 - T1 > self.capacity:
+            return fetch(T1, T2)
+
+        stem = str(self.cache_dir / nslc)
+        with self._locked(nslc):
+            ring = self._open(stem)
+
+            fetch_t1 = self._fetch_start(ring, T1)
+            if fetch_t1 < T2:
+                st_new = fetch(fetch_t1, T2)
+                if ring is not None:
+                    n_cached = int(ring.sample_index(fetch_t1) - ring.sample_index(T1))
+                    logger.info(f"{nslc}: {max(n_cached, 0) / ring.sampling_rate:.0f} s from cache")
+            else:
+                st_new = Stream()
+
+            # Cached samples before the fetched tail, for results that are not
+            # read back from the ring
+            head = Stream()
+            if ring is not None and fetch_t1 > T1:
+                head = ring.read(nslc, T1, fetch_t1 - 1 / ring.sampling_rate)
+
+            if not all(_fits_int32(tr.data) for tr in st_new):
+                # Float (or wider integer) data cannot be stored losslessly in
+                # the int32 ring
+                return head + st_new
+
+            bypass = False
+            for tr in st_new:
+                if tr.stats.npts == 0:
+                    continue
+                if ring is None or not self._compatible(ring, tr):
+                    if ring is not None:
+                        logger.info(f"{nslc}: sampling changed, resetting waveform cache")
+                    ring = self._create(stem, tr)
+                k0 = int(round(ring.sample_index(tr.stats.starttime)))
+                if k0 < ring.end_k - ring.capacity:
+                    # Older than the ring can hold alongside its newer data
+                    bypass = True
+                    continue
+                ring.claim(k0, k0 + tr.stats.npts)
+                ring.write(tr)
+
+            if ring is None:
+                return st_new
+
+            # Always persist the time index once the arrays have been touched
+            ring.save_header()
+            if bypass:
+                return head + st_new
+            return ring.read(nslc, T1, T2)
+
+
+def _fits_int32(data):
+    """True if ``data`` can be stored in the int32 ring without loss."""
+    if data.dtype.kind not in "iu":
+        return False
+    if np.can_cast(data.dtype, np.int32) or not data.size:
+        return True
+    info = np.iinfo(np.int32)
+    return bool(info.min <= data.min() and data.max() <= info.max)
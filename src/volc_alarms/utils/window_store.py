@@ -0,0 +1,129 @@
+"""
+Persistent per-config store of per-window processing results.
+
+Alarms that run every minute over a window several minutes long (e.g.
+Infrasound LTS) recompute mostly the same analysis windows on every run.
+:class:`WindowStore` keeps their results in one small columnar ``.npz`` file
+per config:
+
+* ``key``  -- hash of everything the results depend on besides the data
+  window itself (channels, coordinates, processing parameters)
+* ``t_ms`` -- window centre time in integer milliseconds since the epoch
+* one array per result column
+
+Rows are keyed by ``(key, t_ms)``, so a change of array configuration never
+reuses results computed for another one. Rows older than ``retention``
+seconds before the newest row are dropped on every write.
+"""
+
+import os
+import zipfile
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from volc_alarms.utils.setup_utils import get_logger
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+logger = get_logger(__name__)
+
+
+class WindowStore:
+    """
+    Columnar on-disk store of per-window results.
+
+    Parameters
+    ----------
+    path : str or Path
+        ``.npz`` file holding the store.
+    retention : float
+        Seconds of history kept, counted back from the newest window.
+    """
+
+    def __init__(self, path, retention=7200):
+        self.path = Path(path)
+        self.retention = float(retention)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    @contextmanager
+    def _locked(self):
+        """Exclusive lock so concurrent runs never lose each other's rows."""
+        if fcntl is None:  # pragma: no cover
+            yield
+            return
+        with open(self.path.with_name(self.path.name + ".lock"), "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _load(self):
+        try:
+            with np.load(self.path, allow_pickle=False) as f:
+                return pd.DataFrame({name: f[name] for name in f.files})
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, zipfile.BadZipFile) as e:
+            logger.warning(f"Discarding unreadable window store {self.path.name}: {e}")
+            return None
+
+    def get(self, key, t_ms):
+        """
+        Return the stored rows for ``key`` at the window centres ``t_ms``.
+
+        Parameters
+        ----------
+        key : str
+            Array configuration hash.
+        t_ms : array-like of int
+            Window centre times in milliseconds since the epoch.
+
+        Returns
+        -------
+        pandas.DataFrame
+            Result columns indexed by ``t_ms`` (empty if nothing is stored).
+        """
+        df = self._load()
+        if df is None:
+            return pd.DataFrame(index=pd.Index([], name="t_ms", dtype="int64"))
+        df = df[(df["key"] == key) & df["t_ms"].isin(np.asarray(t_ms))]
+        return df.drop(columns="key").set_index("t_ms")
+
+    def put(self, key, rows):
+        """
+        Add (or replace) results for ``key``.
+
+        Parameters
+        ----------
+        key : str
+            Array configuration hash.
+        rows : pandas.DataFrame
+            Result columns plus an integer ``t_ms`` column.
+        """
+        rows = rows.assign(key=key)
+        with self._locked():
+            df = self._load()
+            if df is not None and set(df.columns) != set(rows.columns):
+                logger.info(f"{self.path.name}: result columns changed, starting a new store")
+                df = None
+            if df is not None:
+                replaced = (df["key"] == key) & df["t_ms"].isin(rows["t_ms"])
+                rows = pd.concat([df[~replaced], rows[df.columns]], ignore_index=True)
+            rows = rows[rows["t_ms"] >= rows["t_ms"].max() - int(self.retention * 1000)]
+            rows = rows.sort_values(["key", "t_ms"])
+
+            tmp_file = self.path.with_name(self.path.name + ".tmp")
+            with open(tmp_file, "wb") as f:
+                # Strings as fixed-width unicode so the file loads without pickle
+                np.savez(f, **{
+                    name: rows[name].to_numpy().astype(str) if pd.api.types.is_string_dtype(rows[name]) else rows[name].to_numpy()
+                    for name in rows.columns
+                })
+            os.replace(tmp_file, self.path)
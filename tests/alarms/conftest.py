@@ -12,7 +12,10 @@ This conftest is shared by all tests under tests/alarms/.
 
 from __future__ import annotations
 
+import atexit
 import os
+import shutil
+import tempfile
 from pathlib import Path
 
 import pytest
@@ -40,8 +43,13 @@ os.environ.setdefault("TIMEZONE", "UTC")
 os.environ.setdefault("FDSN_URL", "https://service.example.com/fdsnws/event/1/query?")
 # Never touch a real alarm-history DB; the fakes are in-memory regardless.
 os.environ.setdefault("DB_FILE", str(REPO_ROOT / "tmp_files" / "__test_alarms__.db"))
-# Point at the test station XML so add_metadata and RSAM_to_DR work offline.
-os.environ.setdefault("STATION_XML", str(REPO_ROOT / "tests" / "data" / "station.xml"))
+# Point at a temporary copy of the test station XML so add_metadata and
+# RSAM_to_DR work offline; its station index is written next to the copy.
+if "STATION_XML" not in os.environ:
+    _station_dir = Path(tempfile.mkdtemp(prefix="avo-alarms-stations-"))
+    atexit.register(shutil.rmtree, _station_dir, ignore_errors=True)
+    shutil.copy(REPO_ROOT / "tests" / "data" / "station.xml", _station_dir)
+    os.environ["STATION_XML"] = str(_station_dir / "station.xml")
 # Make sure no test accidentally runs as if launched from cron unless it asks.
 os.environ.pop("FROMCRON", None)
 
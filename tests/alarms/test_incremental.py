@@ -0,0 +1,322 @@
+"""Unit tests for the incremental (stored-window) detection paths.
+
+With the per-config window stores enabled, an alarm run only processes the
+windows that earlier runs have not stored yet. Runs over successive minutes
+must give the same results as recomputing every window.
+"""
+
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+from obspy import Stream, Trace, UTCDateTime
+from obspy.core.util import AttribDict
+from obspy.core.util.misc import get_window_times
+
+from volc_alarms.alarms.Infrasound import detection as infrasound
+from volc_alarms.utils import processing
+from volc_alarms.alarms.Tremor import detection as tremor
+
+T_START = UTCDateTime("2024-01-01T00:00:00")
+
+# Five-element array, about 100 m across
+ARRAY = [(55.4000, -161.9000), (55.4010, -161.9000), (55.4000, -161.9020), (55.3990, -161.8990), (55.4005, -161.9015)]
+
+
+def _infrasound_stream(fs=50.0, seconds=1200, back_azimuth=57.0, velocity=340.0, seed=1):
+    """A plane wave crossing ``ARRAY``, plus incoherent noise on each element."""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * fs)
+    source = rng.standard_normal(n + 200)
+    baz = np.radians(back_azimuth)
+    st = Stream()
+    for k, (lat, lon) in enumerate(ARRAY):
+        x = (lon - ARRAY[0][1]) * 111e3 * np.cos(np.radians(lat))
+        y = (lat - ARRAY[0][0]) * 111e3
+        delay = int(round((x * np.sin(baz) + y * np.cos(baz)) / velocity * fs))
+        tr = Trace(source[100 + delay:100 + delay + n] + 0.3 * rng.standard_normal(n))
+        tr.id = f"AV.TST.0{k}.HDF"
+        tr.stats.sampling_rate = fs
+        tr.stats.starttime = T_START
+        tr.stats.coordinates = AttribDict(latitude=lat, longitude=lon)
+        st += tr
+    return st
+
+
+def _lts_config(**kwargs):
+    params = dict(
+        alarm_name="Test Infrasound", lts_window_length=30, lts_overlap=15, lts_alpha=0.5, lts_n_samples=100,
+        lts_n_jobs=1, lts_target_rate=20, f1=1.0, f2=10.0, taper=5.0,
+    )
+    params.update(kwargs)
+    return SimpleNamespace(**params)
+
+
+@pytest.fixture
+def lts_store(tmp_path, monkeypatch):
+    """Enable the LTS store in ``tmp_path``; returns the calls made to ``_run_LTS``."""
+    monkeypatch.setenv("LTS_STORE_DIR", str(tmp_path))
+    monkeypatch.setenv("LTS_STORE_SECONDS", "7200")
+    monkeypatch.setenv("LTS_STORE_MARGIN", "30")
+    calls = []
+    run_LTS = infrasound._run_LTS
+
+    def counting_run_LTS(st, *args):
+        calls.append((st[0].stats.starttime, st[0].stats.endtime))
+        return run_LTS(st, *args)
+
+    monkeypatch.setattr(infrasound, "_run_LTS", counting_run_LTS)
+    return calls
+
+
+def _do_LTS(st, config, monkeypatch, store):
+    if store:
+        monkeypatch.setenv("USE_LTS_STORE", "1")
+    else:
+        monkeypatch.delenv("USE_LTS_STORE", raising=False)
+    return infrasound.do_LTS(st, config)
+
+
+def assert_same_lts(result, expected):
+    (df, lts_dict), (df_full, lts_dict_full) = result, expected
+    pd.testing.assert_frame_equal(df, df_full, check_exact=False, rtol=1e-9, atol=1e-12)
+    # Stored times may differ from recomputed ones in the last bits, so match
+    # the flagged elements up through the rows of the DataFrames
+    assert len(lts_dict) == len(lts_dict_full)
+    assert lts_dict.get("size") == lts_dict_full.get("size")
+    for ti, ti_full in zip(df["Time"], df_full["Time"]):
+        assert (str(ti) in lts_dict) == (str(ti_full) in lts_dict_full)
+        if str(ti) in lts_dict:
+            np.testing.assert_array_equal(lts_dict[str(ti)], lts_dict_full[str(ti_full)])
+
+
+@pytest.mark.parametrize("target_rate", [None, 20, 10])
+def test_lts_store_matches_full_recompute(lts_store, monkeypatch, target_rate):
+    st = _infrasound_stream()
+    config = _lts_config(lts_target_rate=target_rate)
+
+    for minute in range(10, 16):
+        T0 = T_START + 60 * minute
+        window = st.slice(T0 - 600, T0)
+        full = _do_LTS(window, config, monkeypatch, store=False)
+        lts_store.clear()
+        incremental = _do_LTS(window, config, monkeypatch, store=True)
+
+        assert_same_lts(incremental, full)
+        assert 55 < np.nanmedian(full[0]["Azimuth"]) < 59
+        if minute > 10:
+            # Only the new windows, plus the first one (which sees the start of the data)
+            assert max(t2 - t1 for t1, t2 in lts_store) < 180
+
+
+def _preprocessed(st, T0, duration, config):
+    """``st`` as the alarm (or its figure) sees it at ``T0``: downloaded up to ``T0``, then preprocessed."""
+    t1 = T0 - duration
+    return processing.preprocess_stream(st.slice(t1 - config.taper, T0), t1, T0, config)
+
+
+@pytest.mark.parametrize("target_rate", [None, 10])
+def test_lts_store_matches_full_recompute_after_preprocessing(lts_store, monkeypatch, target_rate):
+    st = _infrasound_stream()
+    config = _lts_config(lts_target_rate=target_rate)
+
+    # Alarm runs over successive minutes, each filtering its own span
+    for minute in range(10, 16):
+        T0 = T_START + 60 * minute
+        window = _preprocessed(st, T0, 300, config)
+        full = _do_LTS(window, config, monkeypatch, store=False)
+        incremental = _do_LTS(window, config, monkeypatch, store=True)
+        assert_same_lts(incremental, full)
+
+    # The figure's longer span finds all but its first and last windows in the store
+    lts_store.clear()
+    window = _preprocessed(st, T0, 600, config)
+    full = _do_LTS(window, config, monkeypatch, store=False)
+    incremental = _do_LTS(window, config, monkeypatch, store=True)
+    assert_same_lts(incremental, full)
+    assert len(lts_store) == 3  # the full recompute, the start and the end
+    assert sum(t2 - t1 for t1, t2 in lts_store[1:]) < 150
+
+
+def test_lts_store_recomputes_windows_near_the_end(lts_store, monkeypatch):
+    st = _infrasound_stream()
+    config = _lts_config()
+    T0 = T_START + 600
+    _do_LTS(st.slice(T0 - 600, T0), config, monkeypatch, store=True)
+
+    # Late packets change the last seconds of data after the first run
+    late = st.copy()
+    for tr in late:
+        tr.data[int((T0 - 10 - T_START) * tr.stats.sampling_rate):] *= 2
+    full = _do_LTS(late.slice(T0 - 540, T0 + 60), config, monkeypatch, store=False)
+    incremental = _do_LTS(late.slice(T0 - 540, T0 + 60), config, monkeypatch, store=True)
+    assert_same_lts(incremental, full)
+
+
+def test_lts_store_keyed_by_array_configuration(lts_store, monkeypatch):
+    st = _infrasound_stream()
+    window = st.slice(T_START, T_START + 600)
+    config = _lts_config()
+    _do_LTS(window, config, monkeypatch, store=True)
+
+    # Dropping an element must not reuse results computed with it
+    lts_store.clear()
+    incremental = infrasound.do_LTS(window, config, skip_chans=["AV.TST.04.HDF"])
+    assert lts_store == [(window[0].stats.starttime, window[0].stats.endtime)]
+    monkeypatch.delenv("USE_LTS_STORE")
+    assert_same_lts(incremental, infrasound.do_LTS(window, config, skip_chans=["AV.TST.04.HDF"]))
+
+
+# ---------------------------------------------------------------------------
+# Tremor locations
+# ---------------------------------------------------------------------------
+def _tremor_config(**kwargs):
+    params = dict(
+        alarm_name="Test Tremor", window_length=60, f1=1.0, f2=5.0, highpass=10.0, lowpass=0.2, taper=60,
+        Cmin=0.5, Cmax=0.995, bstrap=20, bstrap_prct=0.04, max_scatter=5,
+        grid={"lat_min": 55.0, "lat_max": 56.0, "lat_step": 0.05}, phase_list=["s"],
+    )
+    params.update(kwargs)
+    return SimpleNamespace(**params)
+
+
+def _envelopes(t1, t2):
+    st = Stream()
+    for sta in ("PS1A", "PS4A", "PV6A"):
+        tr = Trace(np.ones(int((t2 - t1) * 5) + 1))
+        tr.id = f"AV.{sta}..BHZ"
+        tr.stats.sampling_rate = 5.0
+        tr.stats.starttime = t1
+        st += tr
+    return st
+
+
+class FakeLocator:
+    """Stand-in for ``_locate``: a made-up location for three windows in four.
+
+    Windows are located the way enveloc does: the given ``window_list``, or
+    windows counted from the start of the data. ``shift`` is added to every
+    latitude, as if late data had changed the envelopes.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.shift = 0.0
+
+    def __call__(self, st, band_env, high_env, config, window_list=None):
+        from enveloc.core import event_list, location
+
+        if window_list is None:
+            window_list = get_window_times(
+                starttime=band_env[0].stats.starttime,
+                endtime=band_env[0].stats.endtime,
+                window_length=config.window_length,
+                step=config.window_length / 2.0,
+                offset=0,
+                include_partial_windows=False,
+            )
+        self.calls.append(list(window_list))
+        events = []
+        for t1, t2 in window_list:
+            k = int(t1.timestamp // 30)
+            if k % 4:
+                events.append(location(
+                    latitude=55 + (k % 100) / 100 + self.shift, longitude=-161 - (k % 7) / 10, depth=k % 11,
+                    dx=0.5, dz=1.5, starttime=t1, endtime=t2,
+                ))
+        return event_list(events)
+
+
+@pytest.fixture
+def tremor_store(tmp_path, monkeypatch):
+    """Enable the Tremor store in ``tmp_path`` with a fake locator."""
+    pytest.importorskip("enveloc")
+    monkeypatch.setenv("TREMOR_STORE_DIR", str(tmp_path))
+    monkeypatch.setenv("TREMOR_STORE_SECONDS", "7200")
+    monkeypatch.setenv("TREMOR_STORE_MARGIN", "30")
+    locator = FakeLocator()
+    monkeypatch.setattr(tremor, "_locate", locator)
+    return locator
+
+
+def _run_enveloc(band_env, config, monkeypatch, store):
+    if store:
+        monkeypatch.setenv("USE_TREMOR_STORE", "1")
+    else:
+        monkeypatch.delenv("USE_TREMOR_STORE", raising=False)
+    return tremor.run_enveloc(None, band_env, None, config)
+
+
+def _events(loc):
+    return [
+        (ev.starttime, ev.endtime, ev.latitude, ev.longitude, ev.depth, ev.horizontal_scatter, ev.vertical_scatter)
+        for ev in loc.events
+    ]
+
+
+def _lookup(loc, starttime):
+    return [ev for ev in loc.events if ev.starttime == starttime][0]
+
+
+def test_window_list_is_epoch_aligned():
+    config = _tremor_config()
+    t1 = T_START + 7.4
+    windows = tremor._window_list(_envelopes(t1, t1 + 600), config)
+
+    assert windows[0] == (T_START + 30, T_START + 90)
+    assert all(w[0].timestamp % 30 == 0 and w[1] - w[0] == 60 for w in windows)
+    assert windows[-1][1] <= t1 + 600
+    # Successive runs share their windows
+    later = tremor._window_list(_envelopes(t1 + 60, t1 + 660), config)
+    assert later[:-2] == windows[2:]
+
+
+def test_tremor_store_locates_only_new_windows(tremor_store, monkeypatch):
+    config = _tremor_config()
+
+    for minute in range(10, 14):
+        T0 = T_START + 60 * minute
+        band_env = _envelopes(T0 - 600, T0)
+        full = _run_enveloc(band_env, config, monkeypatch, store=False)
+        tremor_store.calls.clear()
+        incremental = _run_enveloc(band_env, config, monkeypatch, store=True)
+
+        # The data start on the window grid, so every window is shared
+        assert _events(incremental) == _events(full)
+        assert len(incremental.events) > 0
+        located = [w[0] for w in tremor_store.calls[0]]
+        if minute == 10:
+            assert len(located) == len(tremor._window_list(band_env, config))
+        else:
+            # Two new windows, plus the one that ended within the margin last time
+            assert located == [T0 - 120, T0 - 90, T0 - 60]
+
+
+def test_tremor_store_relocates_windows_within_margin(tremor_store, tmp_path, monkeypatch):
+    config = _tremor_config()
+    T0 = T_START + 600
+    first = _run_enveloc(_envelopes(T0 - 600, T0), config, monkeypatch, store=True)
+
+    # Only windows ending at least TREMOR_STORE_MARGIN before the end are stored
+    with np.load(tmp_path / "Test_Tremor.npz") as f:
+        assert f["t_ms"].max() == (T0 - 90).ns // 1_000_000
+        assert np.isnan(f["latitude"]).any()
+
+    # Late data change the locations of the windows that were not stored
+    tremor_store.shift = 0.001
+    second = _run_enveloc(_envelopes(T0 - 600, T0), config, monkeypatch, store=True)
+    shifted = [ev.starttime for ev in second.events if ev.latitude != _lookup(first, ev.starttime).latitude]
+    assert shifted == [T0 - 60]
+
+
+def test_tremor_store_keyed_by_configuration(tremor_store, monkeypatch):
+    T0 = T_START + 600
+    band_env = _envelopes(T0 - 600, T0)
+    _run_enveloc(band_env, _tremor_config(), monkeypatch, store=True)
+
+    tremor_store.calls.clear()
+    _run_enveloc(band_env, _tremor_config(max_scatter=3), monkeypatch, store=True)
+    assert len(tremor_store.calls[0]) == len(tremor._window_list(band_env, _tremor_config()))
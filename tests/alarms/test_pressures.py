@@ -0,0 +1,53 @@
+"""Unit tests for the per-window peak pressures of the Infrasound LTS results."""
+
+from __future__ import annotations
+
+import numpy as np
+import pytest
+from obspy import Stream, Trace, UTCDateTime
+
+from volc_alarms.alarms.Infrasound import detection
+from tests.alarms.test_incremental import _infrasound_stream, _lts_config
+
+
+def _stream(fs, seconds, t0=UTCDateTime("2024-01-01T00:00:00.37"), seed=2):
+    rng = np.random.default_rng(seed)
+    return Stream([
+        Trace(rng.standard_normal(int(seconds * fs)), header={"station": f"TS{k}", "sampling_rate": fs, "starttime": t0})
+        for k in range(5)
+    ])
+
+
+def _sliced_pressures(st, config):
+    """The definition: median peak of ``st.slice`` over each window, by window centre time."""
+    t_ms = detection._window_times(st, config)[2]
+    half = config.lts_window_length / 2
+    pressures = []
+    for t in t_ms / 1000:
+        window = st.slice(UTCDateTime(t) - half, UTCDateTime(t) + half)
+        pressures.append(np.median([np.abs(tr.data).max() for tr in window]))
+    return np.array(pressures)
+
+
+@pytest.mark.parametrize("fs, window_length, overlap, target_rate", [
+    (50.0, 30, 15, None),
+    (50.0, 30, 15, 20),
+    (100.0, 30, 15, 10),
+    (40.0, 31, 10, None),
+    (50.0, 20, 0, 20),
+])
+def test_pressures_match_sliced_windows(fs, window_length, overlap, target_rate):
+    st = _stream(fs, 300)
+    config = _lts_config(lts_window_length=window_length, lts_overlap=overlap, lts_target_rate=target_rate)
+    pressures = detection.get_pressures(st, config)
+    assert len(pressures) == len(detection._window_times(st, config)[0])
+    np.testing.assert_array_equal(pressures, _sliced_pressures(st, config))
+
+
+def test_pressures_match_ltsva_windows():
+    st = _infrasound_stream(seconds=300)
+    config = _lts_config()
+    df, _ = detection._run_LTS(st, config, 0.5, [])
+    # One pressure per LTS window, including the last one
+    assert df["Pressure"].notna().all()
+    np.testing.assert_array_equal(df["Pressure"], _sliced_pressures(st, config))
@@ -0,0 +1,186 @@
+"""Unit tests for the per-station Tremor travel-time store.
+
+A fake TauP model (travel time proportional to distance, plus depth) stands
+in for the velocity model, so the tests run in seconds, without enveloc, and
+check exactly what is computed and stored. With enveloc installed, the stored
+travel times are also compared with those ``XCOR`` computes itself.
+"""
+
+from __future__ import annotations
+
+import logging
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from obspy import Stream, Trace
+from obspy.core.util import AttribDict
+from obspy.geodetics import locations2degrees
+
+from volc_alarms.alarms.Tremor import traveltimes
+from volc_alarms.utils import setup_utils
+
+GRID = {
+    "lons": np.arange(-162.2, -161.6 + 0.001, 0.05),
+    "lats": np.arange(55.2, 55.6 + 0.001, 0.05),
+    "deps": np.arange(0, 10.001, 2.0),
+}
+SECONDS_PER_DEGREE = 37.0
+
+
+class FakeModel:
+    """TauP model stand-in that counts its ray path calculations."""
+
+    def __init__(self):
+        self.calls = 0
+        self.model = SimpleNamespace(s_mod=SimpleNamespace(v_mod=SimpleNamespace(layers=np.arange(12.0))))
+
+    def get_ray_paths(self, source_depth_in_km, distance_in_degree, receiver_depth_in_km, phase_list):
+        self.calls += 1
+        time = SECONDS_PER_DEGREE * distance_in_degree + source_depth_in_km
+        return [SimpleNamespace(time=time + 1), SimpleNamespace(time=time)]
+
+
+@pytest.fixture
+def model(monkeypatch):
+    model = FakeModel()
+    monkeypatch.setattr(traveltimes, "load_model", lambda model_file, build_dir: model)
+    return model
+
+
+@pytest.fixture
+def model_file(tmp_path):
+    path = tmp_path / "model.tvel"
+    path.write_text("fake velocity model\n")
+    return path
+
+
+def _store(root, model_file, phase_types=("s",), grid=GRID):
+    return traveltimes.TravelTimeStore(root, grid, list(phase_types), model_file=model_file)
+
+
+def _station(sta, lat, lon):
+    return Trace(header={
+        "network": "AV", "station": sta, "channel": "BHZ",
+        "coordinates": AttribDict(latitude=lat, longitude=lon),
+    })
+
+
+A = _station("PS1A", 55.42, -161.89)
+B = _station("PS4A", 55.70, -162.40)
+C = _station("PV6A", 55.30, -161.50)
+
+
+def test_travel_times(model, model_file, tmp_path):
+    store = _store(tmp_path, model_file)
+    store.update(Stream([A, B]))
+
+    lon, lat = np.meshgrid(GRID["lons"], GRID["lats"])
+    for tr in (A, B):
+        TT = np.load(store._file(tr))
+        assert TT.shape == (len(GRID["lats"]), len(GRID["lons"]), len(GRID["deps"]))
+        deg = locations2degrees(tr.stats.coordinates.latitude, tr.stats.coordinates.longitude, lat, lon)
+        # Linear in distance, so interpolation is exact
+        np.testing.assert_allclose(TT, SECONDS_PER_DEGREE * deg[..., None] + GRID["deps"], atol=1e-9)
+
+
+def _table_length(store):
+    with np.load(store._table_file()) as f:
+        return f["times"].shape[1]
+
+
+def test_added_station_is_computed_alone(model, model_file, tmp_path):
+    store = _store(tmp_path, model_file)
+    store.update(Stream([A, C]))
+    before = {tr.stats.station: store._file(tr).read_bytes() for tr in (A, C)}
+    calls, n = model.calls, _table_length(store)
+
+    store.update(Stream([A, B, C]))
+    assert {tr.stats.station: store._file(tr).read_bytes() for tr in (A, C)} == before
+    # B is farther from the grid, so the table is only extended
+    assert _table_length(store) > n
+    assert model.calls - calls == len(GRID["deps"]) * (_table_length(store) - n)
+
+    # Nothing left to compute
+    calls = model.calls
+    store.update(Stream([A, B, C]))
+    assert model.calls == calls
+
+
+def test_station_files_do_not_depend_on_other_stations(model, model_file, tmp_path):
+    together = _store(tmp_path / "together", model_file)
+    together.update(Stream([A, B, C]))
+    for tr in (A, B, C):
+        alone = _store(tmp_path / tr.stats.station, model_file)
+        alone.update(Stream([tr]))
+        assert alone._file(tr).read_bytes() == together._file(tr).read_bytes()
+
+
+def test_store_keyed_by_grid_and_phases(model, model_file, tmp_path):
+    store = _store(tmp_path, model_file)
+    other_grid = _store(tmp_path, model_file, grid={**GRID, "deps": GRID["deps"][:3]})
+    other_phases = _store(tmp_path, model_file, ["s", "S"])
+    assert other_grid.path != store.path
+    assert other_phases.path == store.path
+    assert other_phases._file(A) != store._file(A)
+
+
+def test_store_keyed_by_model(model, model_file, tmp_path, monkeypatch):
+    other = tmp_path / "other.tvel"
+    other.write_text("another velocity model\n")
+    assert _store(tmp_path, other).path != _store(tmp_path, model_file).path
+
+    # The configured model is the one the travel times are computed with
+    loaded = []
+    monkeypatch.setattr(traveltimes, "load_model", lambda model_file, build_dir: loaded.append(model_file) or model)
+    _store(tmp_path, other).update(Stream([A]))
+    assert loaded == [other]
+
+
+def test_tt_file_holds_the_stream_stations(model, model_file, tmp_path):
+    store = _store(tmp_path, model_file, ["s", "S"])
+    store.update(Stream([A, B, C]))
+
+    # A station removed from the config is simply not in the file
+    tt_file = store.tt_file(Stream([A, C]))
+    with np.load(tt_file, allow_pickle=False) as f:
+        assert sorted(f.files) == sorted(["lons", "lats", "deps", "model", "phase_types", "AV_PS1A__BHZ", "AV_PV6A__BHZ"])
+        assert f["phase_types"].tolist() == ["s", "S"]
+        assert f["model"].tolist() == list(range(12))
+        for k in ("lons", "lats", "deps"):
+            np.testing.assert_array_equal(f[k], GRID[k])
+        for tr in (A, C):
+            np.testing.assert_array_equal(f[tr.id.replace(".", "_")], np.load(store._file(tr)))
+
+    # Reused for the same stations, in any order
+    mtime = tt_file.stat().st_mtime_ns
+    assert store.tt_file(Stream([C, A])) == tt_file
+    assert tt_file.stat().st_mtime_ns == mtime
+    assert store.tt_file(Stream([A, B, C])) != tt_file
+
+
+@pytest.mark.parametrize("phase_types, atol", [
+    (["3kmps"], 1e-9),  # linear in distance
+    (["s", "S"], 0.03),  # interpolated over other distances
+])
+def test_matches_enveloc(tmp_path, phase_types, atol):
+    enveloc = pytest.importorskip("enveloc.core")
+    grid = {**GRID, "deps": np.array([5.0])}
+    st = Stream([A, B, C])
+    for tr in st:
+        tr.data = np.ones(100)
+
+    computed = enveloc.XCOR(st.copy(), grid_size=grid, phase_types=phase_types, output=0)
+    store = traveltimes.TravelTimeStore(tmp_path, grid, phase_types)
+    loaded = enveloc.XCOR(st.copy(), grid_size=grid, tt_file=str(store.tt_file(st)), phase_types=phase_types, output=0)
+    for tr, tr_loaded in zip(computed.traces, loaded.traces):
+        np.testing.assert_allclose(tr_loaded.TT, tr.TT, rtol=0, atol=atol)
+    assert loaded._v0 == computed._v0
+
+
+def test_grid_file_is_ignored_with_a_warning(tmp_path, monkeypatch, caplog):
+    (tmp_path / "Tremor.yml").write_text("alarm_type: Tremor\ngrid_file: Pavlof_tremor_grid.npz\n")
+    monkeypatch.setenv("CONFIGS_DIR", str(tmp_path))
+    with caplog.at_level(logging.WARNING):
+        setup_utils.load_config("Tremor")
+    assert "grid_file is no longer used" in caplog.text
@@ -0,0 +1,280 @@
+"""Micro-benchmark and accuracy suite for the vendored ``lts_array``.
+
+Synthetic plane-wave arrivals (band-limited noise with exact fractional
+delays) are generated for a grid of array/processing parameters and run
+through :func:`lts_array.ltsva`. Every case records:
+
+- time_s:        best-of-N wall time of one ``ltsva`` call (after a warm-up
+                 run, so numba compilation is excluded)
+- peak_mb:       peak Python/NumPy memory of one call (tracemalloc; numba's
+                 own allocations are not included)
+- vel_err:       median absolute trace velocity error [m/s]
+- baz_err:       median absolute back-azimuth error [deg]
+- valid:         fraction of windows with a solution
+
+Each synthetic record has background noise, a few large spikes, one dead
+element that is removed with ``remove_elements`` and, for arrays of six or
+more elements, one element that records incoherent noise only (an outlier
+LTS should trim).
+
+The grid varies one parameter at a time around ``REFERENCE``, including
+decimation to ``target_rate`` before cross-correlating and sub-sample
+``peak_interpolation`` of the cross-correlation peaks. Results are
+compared against ``baselines/lts_array.json``; wall times are only compared
+when the baseline was recorded on the same host.
+
+Usage:
+    python -m tests.benchmarks.lts_benchmark                  # Run and compare
+    python -m tests.benchmarks.lts_benchmark --update         # Re-record baselines
+    python -m tests.benchmarks.lts_benchmark -k alpha         # Cases matching "alpha"
+    RUN_BENCHMARKS=1 pytest tests/benchmarks/                 # Same checks via pytest
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+from obspy import Stream, Trace, UTCDateTime
+
+from lts_array import ltsva
+
+BASELINE_FILE = Path(__file__).resolve().parent / "baselines" / "lts_array.json"
+
+# Centre case; every other case changes exactly one of these
+REFERENCE = {
+    "n_elements": 6,
+    "sampling_rate": 50.0,
+    "window_length": 30.0,
+    "overlap": 0.5,
+    "alpha": 0.5,
+    "n_samples": 200,
+    "target_rate": None,
+    "peak_interpolation": None,
+}
+
+GRID = {
+    "n_elements": [4, 8, 12, 20],
+    "sampling_rate": [20.0, 100.0],
+    "window_length": [10.0, 60.0],
+    "overlap": [0.0, 0.75],
+    "alpha": [0.75, 1.0],
+    "n_samples": [100, 500],
+    "target_rate": [20.0, 10.0],
+    "peak_interpolation": ["parabolic"],
+}
+
+# Synthetic signal
+DURATION = 600.0        # seconds of data per case
+APERTURE = 0.3          # array aperture [km]
+VELOCITY = 0.34         # true trace velocity [km/s]
+BACK_AZIMUTH = 55.0     # true back-azimuth [deg]
+BAND = (0.5, 5.0)       # signal band [Hz]
+SNR = 3.0               # signal/noise standard deviation ratio
+N_SPIKES = 3            # spikes per record, 50x the signal level
+
+# Regression tolerances
+TIME_TOL = 1.5          # slower than baseline by this factor
+MEM_TOL = 1.25          # more peak memory than baseline by this factor
+VEL_TOL = 0.5           # m/s above 1.25x the baseline velocity error
+BAZ_TOL = 0.25          # deg above 1.25x the baseline back-azimuth error
+VALID_TOL = 0.05        # drop in the fraction of solved windows
+
+
+def cases():
+    """Return ``{name: parameters}`` for the reference case and every variation."""
+    out = {"reference": dict(REFERENCE)}
+    for key, values in GRID.items():
+        for value in values:
+            label = f"{value:g}" if isinstance(value, (int, float)) else value
+            out[f"{key}={label}"] = {**REFERENCE, key: value}
+    return out
+
+
+def _band_limited_noise(rng, n, fs):
+    spec = np.fft.rfft(rng.standard_normal(n))
+    f = np.fft.rfftfreq(n, 1 / fs)
+    spec[(f < BAND[0]) | (f > BAND[1])] = 0
+    return spec, f
+
+
+def synthetic_array(n_elements, sampling_rate, seed=0):
+    """Plane-wave array record with noise, spikes, a dead and an incoherent element.
+
+    Returns
+    -------
+    st : obspy.Stream
+        ``n_elements + 1`` traces; the last one is dead (all zeros).
+    lat_list, lon_list : list
+        Element coordinates.
+    remove_elements : list
+        Index of the dead element.
+    """
+    rng = np.random.default_rng(seed)
+    fs = float(sampling_rate)
+    n = int(DURATION * fs)
+    n_traces = n_elements + 1
+
+    # Elements on a jittered ring, so every array size is well conditioned
+    angle = np.linspace(0, 2 * np.pi, n_traces, endpoint=False) + rng.uniform(-0.3, 0.3, n_traces)
+    radius = APERTURE / 2 * rng.uniform(0.5, 1.0, n_traces)
+    x, y = radius * np.sin(angle), radius * np.cos(angle)
+
+    # Arrival delays relative to the array centre; elements towards the
+    # source record the wave first
+    baz = np.radians(BACK_AZIMUTH)
+    delays = -(x * np.sin(baz) + y * np.cos(baz)) / VELOCITY
+
+    source, f = _band_limited_noise(rng, n, fs)
+    st = Stream()
+    for ii in range(n_traces):
+        signal = np.fft.irfft(source * np.exp(-2j * np.pi * f * delays[ii]), n)
+        signal /= signal.std()
+        if ii == 1 and n_elements >= 6:
+            # Incoherent element
+            spec, _ = _band_limited_noise(rng, n, fs)
+            signal = np.fft.irfft(spec, n)
+            signal /= signal.std()
+        noise, _ = _band_limited_noise(rng, n, fs)
+        noise = np.fft.irfft(noise, n)
+        data = signal + noise / noise.std() / SNR
+        data[rng.integers(0, n, N_SPIKES)] += 50 * rng.choice([-1, 1], N_SPIKES)
+        if ii == n_traces - 1:
+            data[:] = 0
+        tr = Trace(data)
+        tr.stats.network = "XX"
+        tr.stats.station = "SYN"
+        tr.stats.location = f"{ii:02d}"
+        tr.stats.channel = "HDF"
+        tr.stats.sampling_rate = fs
+        tr.stats.starttime = UTCDateTime(2025, 1, 1)
+        st += tr
+
+    lat0, lon0 = 60.0, -150.0
+    lat_list = list(lat0 + y / 111.2)
+    lon_list = list(lon0 + x / (111.2 * np.cos(np.radians(lat0))))
+    return st, lat_list, lon_list, [n_traces - 1]
+
+
+def run_case(params, repeats=3):
+    """Benchmark one parameter set; returns a dict of metrics."""
+    st, lat_list, lon_list, remove_elements = synthetic_array(params["n_elements"], params["sampling_rate"])
+
+    def call():
+        return ltsva(
+            st, lat_list, lon_list, params["window_length"], params["overlap"],
+            alpha=params["alpha"], n_samples=params["n_samples"], remove_elements=remove_elements,
+            target_rate=params["target_rate"], peak_interpolation=params["peak_interpolation"],
+        )
+
+    out = call()  # warm-up (numba compilation, caches)
+    times = []
+    for _ in range(repeats):
+        tic = time.perf_counter()
+        call()
+        times.append(time.perf_counter() - tic)
+
+    tracemalloc.start()
+    call()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    vel = out[0] * 1000
+    baz_err = (out[1] - BACK_AZIMUTH + 180) % 360 - 180
+    valid = np.isfinite(vel)
+    return {
+        "time_s": round(min(times), 4),
+        "peak_mb": round(peak / 2**20, 2),
+        "vel_err": round(float(np.median(np.abs(vel[valid] - VELOCITY * 1000))), 3) if valid.any() else None,
+        "baz_err": round(float(np.median(np.abs(baz_err[valid]))), 3) if valid.any() else None,
+        "valid": round(float(valid.mean()), 3) if len(valid) else 0.0,
+        "n_windows": int(len(vel)),
+    }
+
+
+def host():
+    """Identifier of the machine wall times were recorded on."""
+    return f"{platform.node()} {platform.machine()} {platform.processor()}".strip()
+
+
+def load_baselines(path=BASELINE_FILE):
+    if not Path(path).exists():
+        return None
+    return json.loads(Path(path).read_text())
+
+
+def save_baselines(results, path=BASELINE_FILE):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    data = {"host": host(), "cases": results}
+    Path(path).write_text(json.dumps(data, indent=2, sort_keys=True) + "\n")
+
+
+def compare(name, metrics, baseline, same_host=True):
+    """Return a list of regression messages for one case (empty if none)."""
+    problems = []
+    if baseline is None:
+        return problems
+    if same_host and metrics["time_s"] > TIME_TOL * baseline["time_s"]:
+        problems.append(f"{name}: time {metrics['time_s']:.3f}s > {TIME_TOL}x baseline {baseline['time_s']:.3f}s")
+    if metrics["peak_mb"] > MEM_TOL * baseline["peak_mb"] + 1:
+        problems.append(f"{name}: peak memory {metrics['peak_mb']:.1f} MB > {MEM_TOL}x baseline {baseline['peak_mb']:.1f} MB")
+    for key, tol, unit in (("vel_err", VEL_TOL, "m/s"), ("baz_err", BAZ_TOL, "deg")):
+        if baseline[key] is None:
+            continue
+        if metrics[key] is None or metrics[key] > 1.25 * baseline[key] + tol:
+            problems.append(f"{name}: {key} {metrics[key]} {unit} vs baseline {baseline[key]} {unit}")
+    if metrics["valid"] < baseline["valid"] - VALID_TOL:
+        problems.append(f"{name}: solved {metrics['valid']:.0%} of windows vs baseline {baseline['valid']:.0%}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-k", dest="pattern", default="", help="only run cases whose name contains this")
+    parser.add_argument("--repeats", type=int, default=3, help="timed runs per case (best is kept)")
+    parser.add_argument("--update", action="store_true", help="write the results as the new baselines")
+    args = parser.parse_args(argv)
+
+    baselines = load_baselines()
+    same_host = baselines is not None and baselines.get("host") == host()
+    results = dict(baselines["cases"]) if (baselines and args.update) else {}
+    problems = []
+    header = f"{'case':28s} {'time [s]':>9s} {'peak [MB]':>10s} {'vel err':>8s} {'baz err':>8s} {'valid':>6s}"
+    print(header)
+    print("-" * len(header))
+    for name, params in cases().items():
+        if args.pattern not in name:
+            continue
+        metrics = run_case(params, repeats=args.repeats)
+        results[name] = metrics
+        base = baselines["cases"].get(name) if baselines else None
+        case_problems = compare(name, metrics, base, same_host)
+        problems += case_problems
+        print(
+            f"{name:28s} {metrics['time_s']:9.3f} {metrics['peak_mb']:10.1f} "
+            f"{metrics['vel_err'] if metrics['vel_err'] is not None else float('nan'):8.2f} "
+            f"{metrics['baz_err'] if metrics['baz_err'] is not None else float('nan'):8.2f} "
+            f"{metrics['valid']:6.0%}{'  REGRESSION' if case_problems else ''}"
+        )
+
+    if args.update:
+        save_baselines(results)
+        print(f"\nBaselines written to {BASELINE_FILE}")
+        return 0
+    if baselines is None:
+        print("\nNo baselines yet; run with --update to record them.")
+    elif not same_host:
+        print(f"\nBaselines were recorded on '{baselines.get('host')}'; wall times not compared.")
+    for problem in problems:
+        print(problem)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
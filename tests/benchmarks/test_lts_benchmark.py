@@ -0,0 +1,50 @@
+"""lts_array benchmark/accuracy checks against the frozen baselines.
+
+The benchmarks take minutes (numba compilation, many parameter sets), so
+they only run when asked for.
+
+Usage:
+    RUN_BENCHMARKS=1 pytest tests/benchmarks/                      # Compare
+    RUN_BENCHMARKS=1 REGEN_BASELINES=1 pytest tests/benchmarks/    # Regenerate
+
+Review the JSON diff before committing regenerated baselines.
+"""
+
+from __future__ import annotations
+
+import os
+
+import pytest
+
+from tests.benchmarks import lts_benchmark
+
+RUN = os.environ.get("RUN_BENCHMARKS") == "1"
+REGEN = os.environ.get("REGEN_BASELINES") == "1"
+
+pytestmark = pytest.mark.skipif(not RUN, reason="set RUN_BENCHMARKS=1 to run the lts_array benchmarks")
+
+CASES = lts_benchmark.cases()
+
+
+@pytest.fixture(scope="module")
+def baselines():
+    data = lts_benchmark.load_baselines() or {"host": None, "cases": {}}
+    yield data
+    if REGEN:
+        lts_benchmark.save_baselines(data["cases"])
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_lts_benchmark(name, baselines):
+    """Run one parameter set and flag time, memory or accuracy regressions."""
+    metrics = lts_benchmark.run_case(CASES[name])
+    if REGEN or name not in baselines["cases"]:
+        baselines["cases"][name] = metrics
+        if REGEN:
+            baselines["host"] = lts_benchmark.host()
+            pytest.skip(f"Regenerated benchmark baseline: {name}")
+        return
+
+    same_host = baselines["host"] == lts_benchmark.host()
+    problems = lts_benchmark.compare(name, metrics, baselines["cases"][name], same_host)
+    assert not problems, "\n".join(problems)
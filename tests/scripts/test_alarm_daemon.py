@@ -0,0 +1,200 @@
+"""Unit tests for the resident ``run-alarm --daemon`` scheduler.
+
+The daemon loop runs against a fake clock: ``UTCDateTime.utcnow`` and the
+stop event's ``wait`` are replaced so that waiting advances the clock
+instantly, and alarms run in a thread pool with a fake ``run_config``.
+"""
+
+from __future__ import annotations
+
+import os
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+from obspy import UTCDateTime
+
+from volc_alarms.scripts import alarm_daemon, run_alarm
+from volc_alarms.utils import alarm_flow
+
+T_START = UTCDateTime("2024-01-01T00:00:30")
+
+
+def _config(alarm_type, latency=10, taper=5, cadence=None):
+    config = SimpleNamespace(alarm_type=alarm_type, latency=latency, taper=taper)
+    if cadence is not None:
+        config.cadence = cadence
+    return config
+
+
+class FakeClock:
+    """Wall clock that only moves when the daemon waits."""
+
+    def __init__(self, now, minutes):
+        self.now = now
+        self.end = UTCDateTime(now.strftime("%Y-%m-%d %H:%M")) + 60 * minutes + 59
+        self.stopped = threading.Event()
+
+    def utc(self):
+        clock = self
+
+        class FakeUTC(UTCDateTime):
+            @classmethod
+            def utcnow(cls):
+                return clock.now
+
+        return FakeUTC
+
+    def event(self):
+        clock = self
+
+        class FakeEvent:
+            def is_set(self):
+                return clock.stopped.is_set()
+
+            def set(self):
+                clock.stopped.set()
+
+            def wait(self, timeout):
+                clock.now = clock.now + max(float(timeout), 0.0)
+                if clock.now >= clock.end:
+                    clock.stopped.set()
+                return clock.stopped.is_set()
+
+        return FakeEvent
+
+
+class ThreadPool(ThreadPoolExecutor):
+    """Worker pool stand-in; alarms submitted just before stopping still run.
+
+    Alarms not in ``block`` finish before the fake clock moves on, as they
+    would within the minute on a real clock.
+    """
+
+    submitted = None
+    block = ()
+
+    def submit(self, fn, config_name, T0, flags):
+        # Launch time on the fake clock, before the thread gets to run
+        self.submitted.append((config_name, T0, alarm_daemon.utc.utcnow() - T0, flags))
+        future = super().submit(fn, config_name, T0, flags)
+        if config_name not in self.block:
+            future.result()
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        super().shutdown(wait=wait)
+
+
+@pytest.fixture
+def daemon(monkeypatch, tmp_path):
+    """Run ``run_daemon`` for a few fake minutes; returns the recorded launches."""
+    monkeypatch.delenv("ALARM_DAEMON", raising=False)
+    monkeypatch.setenv("CONFIGS_DIR", str(tmp_path))
+    monkeypatch.setenv("DAEMON_WORKERS", "4")
+    monkeypatch.setattr(signal, "signal", lambda *args: None)
+    monkeypatch.setattr(alarm_daemon, "setup_logging", lambda name: tmp_path)
+    monkeypatch.setattr(alarm_daemon, "warm_imports", lambda: None)
+
+    def _run(configs, minutes=3, block=()):
+        clock = FakeClock(T_START, minutes)
+        monkeypatch.setattr(alarm_daemon, "utc", clock.utc())
+        monkeypatch.setattr(alarm_daemon, "threading", SimpleNamespace(Event=clock.event()))
+        monkeypatch.setattr(alarm_daemon, "refresh_configs", lambda configs_dir, cache: dict(configs))
+
+        launches = []
+        monkeypatch.setattr(ThreadPool, "submitted", launches)
+        monkeypatch.setattr(ThreadPool, "block", block)
+        monkeypatch.setattr(alarm_daemon, "_make_pool", lambda n: ThreadPool(max_workers=n))
+
+        def fake_run_config(config_name, T0, lock_dir, **flags):
+            if config_name in block:
+                # Still running until the daemon is told to stop
+                clock.stopped.wait(5)
+
+        monkeypatch.setattr(alarm_daemon, "run_config", fake_run_config)
+        alarm_daemon.run_daemon(SimpleNamespace(test=True, force=False, mm=False, icinga=False))
+        return launches
+
+    return _run
+
+
+def test_is_due_follows_cadence():
+    T0 = UTCDateTime("2024-01-01T00:10:00")
+    assert alarm_daemon.is_due(_config("RSAM"), T0)
+    assert alarm_daemon.is_due(_config("RSAM", cadence=5), T0)
+    assert not alarm_daemon.is_due(_config("RSAM", cadence=5), T0 + 60)
+    assert not alarm_daemon.is_due(_config("RSAM", cadence=3), T0)
+
+
+def test_launch_delay():
+    assert alarm_flow.launch_delay(_config("RSAM", latency=10)) == 10.0
+    assert alarm_flow.launch_delay(_config("Tremor", latency=10, taper=5)) == 15.0
+    assert alarm_flow.launch_delay(_config("Infrasound", latency=45)) == 0.0
+    assert alarm_flow.launch_delay(_config("Lightning", latency=10)) == 0.0
+
+
+def test_apply_cron_latency_backup_under_daemon(monkeypatch):
+    monkeypatch.delenv("FROMCRON", raising=False)
+    monkeypatch.setenv("ALARM_DAEMON", "1")
+    slept = []
+    monkeypatch.setattr(alarm_flow.time, "sleep", slept.append)
+    T0 = UTCDateTime("2024-01-01T00:10:00")
+
+    # The daemon already waited launch_delay(): no sleep, same T0
+    assert alarm_flow.apply_cron_latency_backup(_config("Tremor"), T0, extra_sleep=5) == T0
+    # Latencies of 30 s or more still back up to a minute mark
+    assert alarm_flow.apply_cron_latency_backup(_config("Infrasound", latency=45), T0) == T0 - 60
+    assert slept == []
+
+    monkeypatch.delenv("ALARM_DAEMON")
+    monkeypatch.setenv("FROMCRON", "yep")
+    assert alarm_flow.apply_cron_latency_backup(_config("Tremor"), T0, extra_sleep=5) == T0
+    assert slept == [15]
+
+
+def test_daemon_launches_due_configs_after_their_delay(daemon):
+    configs = {
+        "Tremor": _config("Tremor", latency=10, taper=5),
+        "RSAM": _config("RSAM", latency=10, cadence=2),
+        "Lightning": _config("Lightning"),
+    }
+    launches = daemon(configs, minutes=3)
+
+    minutes = [UTCDateTime("2024-01-01T00:01:00") + 60 * k for k in range(3)]
+    expected = []
+    for T0 in minutes:
+        due = [name for name in ("Lightning", "RSAM", "Tremor") if alarm_daemon.is_due(configs[name], T0)]
+        expected += [(name, T0) for name in due]
+    assert [(name, T0) for name, T0, _, _ in launches] == expected
+    assert {name: delay for name, _, delay, _ in launches} == {"Lightning": 0.0, "RSAM": 10.0, "Tremor": 15.0}
+    assert all(flags == {"test": True, "force": False, "mm": False, "icinga": False} for *_, flags in launches)
+    assert os.environ["ALARM_DAEMON"] == "1"
+
+
+def test_daemon_skips_config_still_running(daemon):
+    configs = {"Slow": _config("Lightning"), "Fast": _config("Lightning")}
+    launches = daemon(configs, minutes=3, block=("Slow",))
+
+    names = [name for name, *_ in launches]
+    assert names.count("Fast") == 3
+    assert names.count("Slow") == 1
+
+
+def test_daemon_exits_if_another_daemon_holds_the_lock(daemon, tmp_path):
+    (tmp_path / "Daemon.lock").write_text(str(os.getpid()))
+    assert daemon({"Lightning": _config("Lightning")}, minutes=2) == []
+
+
+def test_run_config_skips_locked_config(monkeypatch, tmp_path):
+    """A config whose lock is held (e.g. by a cron launch) is not run."""
+    (tmp_path / "RSAM.lock").write_text(str(os.getpid()))
+    loaded = []
+    monkeypatch.setattr("volc_alarms.utils.setup_utils.load_config", loaded.append)
+
+    run_alarm.run_config("RSAM", UTCDateTime("2024-01-01T00:10:00"), tmp_path)
+
+    assert loaded == []
+    assert (tmp_path / "RSAM.lock").read_text() == str(os.getpid())
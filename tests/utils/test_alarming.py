@@ -0,0 +1,178 @@
+"""Unit tests for the alarm history database helpers, on a temporary SQLite file."""
+
+from __future__ import annotations
+
+import sqlite3
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+from obspy import UTCDateTime
+
+from volc_alarms.utils import alarming
+
+
+@pytest.fixture(autouse=True)
+def db_file(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_FILE", str(tmp_path / "alarms.db"))
+    monkeypatch.setattr(alarming, "_DB_STATE", {"pid": None, "path": None, "conn": None, "tables": set()})
+    yield tmp_path / "alarms.db"
+    conn = alarming._DB_STATE["conn"]
+    if conn is not None:
+        conn.close()
+
+
+@pytest.fixture
+def local_tz(monkeypatch):
+    """Run in a local time zone with daylight saving time."""
+    monkeypatch.setenv("TZ", "America/Anchorage")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def _record(event_ids, T0=UTCDateTime("2024-01-01T00:00:00"), alarm_name="Test alarm"):
+    alarming.record_send(SimpleNamespace(alarm_name=alarm_name), T0, volcano="Pavlof", event_id=event_ids, test=True)
+
+
+def _count(table="test_sent_events"):
+    with alarming.db_connection(test=True) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_shared_connection_is_reused():
+    conn = alarming.get_conn(test=True)
+    assert alarming.get_conn(test=True) is conn
+    assert alarming.get_conn(test=True, table="swarm") is conn
+    assert alarming._DB_STATE["tables"] == {"test_sent_events", "test_swarm_table"}
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_shared_connection_reopened_when_closed_forked_or_moved(db_file, monkeypatch, tmp_path):
+    conn = alarming.get_conn(test=True)
+    conn.close()
+    reopened = alarming.get_conn(test=True)
+    assert reopened is not conn
+    reopened.execute("SELECT COUNT(*) FROM test_sent_events")
+
+    # A forked child must not share its parent's connection
+    alarming._DB_STATE["pid"] = -1
+    child = alarming.get_conn(test=True)
+    assert child is not reopened
+
+    monkeypatch.setenv("DB_FILE", str(tmp_path / "other" / "alarms.db"))
+    moved = alarming.get_conn(test=True)
+    assert moved is not child
+    assert (tmp_path / "other" / "alarms.db").exists()
+    # The schema is created again in the new file
+    assert moved.execute("SELECT COUNT(*) FROM test_sent_events").fetchone()[0] == 0
+    child.close()
+
+
+def test_record_send_writes_all_ids_in_one_transaction():
+    statements = []
+    alarming.get_conn(test=True).set_trace_callback(statements.append)
+    _record([f"ev{i}" for i in range(10)])
+
+    assert _count() == 10
+    assert [s for s in statements if s.startswith(("BEGIN", "COMMIT"))] == ["BEGIN IMMEDIATE", "COMMIT"]
+
+
+def test_db_connection_rolls_back_on_error():
+    _record(["kept"])
+    with pytest.raises(RuntimeError):
+        with alarming.db_connection(test=True, transaction=True) as conn:
+            conn.execute(
+                "INSERT INTO test_sent_events (alarm_id, process_time, send_time, event_id) VALUES ('a', 't', 't', 'lost')"
+            )
+            raise RuntimeError("boom")
+
+    conn = alarming.get_conn(test=True)
+    assert not conn.in_transaction
+    assert [r[0] for r in conn.execute("SELECT event_id FROM test_sent_events")] == ["kept"]
+    # The connection is still usable for the next transaction
+    _record(["next"])
+    assert _count() == 2
+
+
+def test_db_connection_releases_write_lock_on_error(db_file):
+    with pytest.raises(RuntimeError):
+        with alarming.db_connection(test=True, transaction=True):
+            raise RuntimeError("boom")
+
+    # Another process can write straight away
+    other = sqlite3.connect(db_file, timeout=0)
+    other.execute("INSERT INTO test_sent_events (alarm_id, process_time, send_time) VALUES ('a', 't', 't')")
+    other.commit()
+    other.close()
+
+
+def test_existing_event_ids_chunks_large_candidate_lists():
+    recorded = [f"ev{i}" for i in range(0, 1200, 2)]
+    _record(recorded)
+    candidates = [f"ev{i}" for i in range(1200)] + ["ev0", "ev2"]
+
+    statements = []
+    conn = alarming.get_conn(test=True)
+    conn.set_trace_callback(statements.append)
+    existing = alarming.existing_event_ids(conn, "test_sent_events", candidates)
+
+    assert existing == set(recorded)
+    selects = [s for s in statements if s.startswith("SELECT")]
+    assert len(selects) == 3  # 1200 unique candidates in chunks of 500
+
+
+def test_existing_event_ids_since():
+    _record(["old"], T0=UTCDateTime("2024-01-01T00:00:00"))
+    _record(["new"], T0=UTCDateTime("2024-01-02T00:00:00"))
+    conn = alarming.get_conn(test=True)
+    assert alarming.existing_event_ids(conn, "test_sent_events", ["old", "new"]) == {"old", "new"}
+    assert alarming.existing_event_ids(conn, "test_sent_events", ["old", "new"], since="2024-01-01T12:00:00Z") == {"new"}
+
+
+def test_filter_dataframe_anti_join():
+    _record([str(i) for i in range(0, 1500, 3)])
+    df = pd.DataFrame({"id": list(range(1500)), "value": range(1500)})
+
+    new_df, all_df = alarming.filter_dataframe(df, id_column="id", test=True)
+
+    assert all_df is df
+    assert new_df["id"].tolist() == [i for i in range(1500) if i % 3]
+    new_df["value"] = 0  # a copy
+    assert df["value"].sum() == sum(range(1500))
+
+    with pytest.raises(ValueError):
+        alarming.filter_dataframe(df, id_column="missing", test=True)
+
+
+def test_iso_utc_series_matches_iso_utc(local_tz):
+    naive = [
+        datetime(2024, 1, 15, 12, 0, 0),
+        datetime(2024, 7, 15, 12, 0, 0),
+        datetime(2024, 11, 3, 1, 30, 0),  # ambiguous: taken as daylight time
+    ]
+    expected = [alarming.iso_utc(t) for t in naive]
+    assert expected[:2] == ["2024-01-15T21:00:00Z", "2024-07-15T20:00:00Z"]
+    assert alarming.iso_utc_series(naive) == expected
+    assert alarming.iso_utc_series(pd.Series(pd.to_datetime(naive))) == expected
+
+    aware = pd.Series(pd.to_datetime(naive)).dt.tz_localize("UTC")
+    assert alarming.iso_utc_series(aware) == ["2024-01-15T12:00:00Z", "2024-07-15T12:00:00Z", "2024-11-03T01:30:00Z"]
+
+
+def test_record_tremor_event_ids_in_utc(local_tz):
+    tremor_df = pd.DataFrame({
+        "time": pd.to_datetime(["2024-07-15T12:00:00", "2024-07-15T12:00:00"]).tz_localize("UTC").tz_localize(None),
+        "latitude": [55.4, 55.4],
+        "longitude": [-161.9, -161.9],
+        "depth": [2.0, 2.0],
+        "volcano": ["Pavlof", "Pavlof"],
+    })
+    alarming.record_tremor_event_ids(tremor_df, test=True)
+    with alarming.db_connection(test=True, table="tremor") as conn:
+        rows = conn.execute("SELECT time, volcano FROM test_tremor_table").fetchall()
+    # Naive times are local time, and duplicates are ignored
+    assert rows == [("2024-07-15T20:00:00Z", "Pavlof")]
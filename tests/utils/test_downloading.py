@@ -0,0 +1,113 @@
+"""Unit tests for the concurrent waveform downloads, with fake waveserver and FDSN clients."""
+
+from __future__ import annotations
+
+import threading
+
+import numpy as np
+import pytest
+from obspy import Stream, Trace, UTCDateTime
+
+from volc_alarms.utils import downloading
+
+
+@pytest.fixture
+def clients(monkeypatch):
+    """Fake clients handed to the download threads; returns the ones created."""
+    created = []
+
+    def waveform_client():
+        created.append(threading.current_thread())
+        return object()
+
+    monkeypatch.setattr(downloading, "_waveform_client", waveform_client)
+    return created
+
+
+def test_run_concurrently_without_environment(clients, monkeypatch):
+    monkeypatch.delenv("DOWNLOAD_WORKERS", raising=False)
+    monkeypatch.delenv("DOWNLOAD_BUDGET", raising=False)
+
+    def task(client, item):
+        if item == 3:
+            raise ValueError("no data")
+        return item * 2
+
+    assert downloading._run_concurrently(task, list(range(6)), [str(i) for i in range(6)]) == [0, 2, 4, None, 8, 10]
+    # One client per thread, at most DOWNLOAD_WORKERS (default 4) of them
+    assert 1 <= len(clients) <= 4
+
+
+def test_budget_leaves_stragglers_behind(clients, monkeypatch):
+    monkeypatch.setenv("DOWNLOAD_WORKERS", "2")
+    monkeypatch.setenv("DOWNLOAD_BUDGET", "0.2")
+    release = threading.Event()
+    started = []
+
+    def task(client, item):
+        started.append(item)
+        if item < 2:
+            release.wait(10)
+        return item
+
+    try:
+        results = downloading._run_concurrently(task, list(range(5)), [str(i) for i in range(5)])
+        assert results == [None] * 5
+        # Both threads are stuck, and the other requests are dropped
+        assert sorted(started) == [0, 1]
+        # Stuck threads do not keep the interpreter from exiting
+        assert all(thread.daemon for thread in clients)
+    finally:
+        release.set()
+    for thread in clients:
+        thread.join(5)
+    assert sorted(started) == [0, 1]
+
+
+T1 = UTCDateTime("2024-01-01T00:00:00")
+T2 = T1 + 60
+NSLC = [f"AV.ST{k}..BHZ" for k in range(5)]
+
+
+class FakeFDSN:
+    """FDSN client whose bulk requests fail when they include a ``bad`` channel."""
+
+    def __init__(self, bad=()):
+        self.bad = set(bad)
+        self.bulk_requests = []
+        self.requests = []
+
+    def _trace(self, net, sta, loc, cha, t1, t2):
+        tr = Trace(np.ones(int((t2 - t1) * 10)))
+        tr.id = f"{net}.{sta}.{loc}.{cha}"
+        tr.stats.sampling_rate = 10.0
+        tr.stats.starttime = t1
+        return tr
+
+    def get_waveforms_bulk(self, bulk):
+        self.bulk_requests.append([".".join(b[:4]) for b in bulk])
+        if any(".".join(b[:4]) in self.bad for b in bulk):
+            raise ValueError("HTTP 500")
+        return Stream([self._trace(*b) for b in bulk])
+
+    def get_waveforms(self, net, sta, loc, cha, t1, t2):
+        self.requests.append(f"{net}.{sta}.{loc}.{cha}")
+        if self.requests[-1] in self.bad:
+            raise ValueError("HTTP 500")
+        return Stream([self._trace(net, sta, loc, cha, t1, t2)])
+
+
+def test_failed_bulk_request_falls_back_to_single_channels(monkeypatch):
+    client = FakeFDSN(bad=["AV.ST3..BHZ"])
+    monkeypatch.setattr(downloading, "_waveform_client", lambda: client)
+    monkeypatch.setenv("FDSN_BULK_SIZE", "2")
+    monkeypatch.setenv("DOWNLOAD_WORKERS", "1")
+
+    streams = downloading._download_bulk(NSLC, T1, T2)
+
+    assert sorted(client.bulk_requests) == [NSLC[0:2], NSLC[2:4], NSLC[4:]]
+    # Only the chunk with the bad channel is requested channel by channel
+    assert client.requests == NSLC[2:4]
+    assert [len(st) for st in streams] == [1, 1, 1, 0, 1]
+    for nslc, st in zip(NSLC, streams):
+        assert all(tr.id == nslc and tr.stats.endtime <= T2 for tr in st)
@@ -0,0 +1,44 @@
+"""Unit tests for ``processing.find_nearest_volcano``."""
+
+from __future__ import annotations
+
+import os
+
+import pandas as pd
+import pytest
+
+from volc_alarms.utils import processing, setup_utils
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches(monkeypatch):
+    monkeypatch.setattr(processing, "_VOLCANO_POINTS", {})
+    monkeypatch.setattr(setup_utils, "_VOLCANO_LISTS", {})
+
+
+def _events():
+    return pd.DataFrame({"latitude": [55.42, 52.5, 0.0], "longitude": [-161.89, -171.25, 0.0]})
+
+
+def test_falls_back_to_bundled_list(monkeypatch):
+    monkeypatch.delenv("VOLCANO_LIST", raising=False)
+    df = processing.find_nearest_volcano(_events())
+    bundled = setup_utils.load_volcano_list()
+    assert set(df["v_name"]) <= set(bundled["Name"])
+    assert df["v_name"][1] == "Amukta"
+    assert df["v_distance"][1] < 2
+
+
+def test_points_follow_volcano_list_changes(monkeypatch, tmp_path):
+    volcano_file = tmp_path / "volcanoes.csv"
+    volcano_file.write_text("Name,Latitude,Longitude,PIREP\nA,55.4,-161.9,Y\nB,52.5,-171.2,N\n")
+    monkeypatch.setenv("VOLCANO_LIST", str(volcano_file))
+
+    assert list(processing.find_nearest_volcano(_events())["v_name"][:2]) == ["A", "B"]
+    assert list(processing.find_nearest_volcano(_events(), filter_col="PIREP")["v_name"][:2]) == ["A", "A"]
+
+    volcano_file.write_text("Name,Latitude,Longitude,PIREP\nC,55.4,-161.9,Y\nB,52.5,-171.2,Y\n")
+    stat = volcano_file.stat()
+    os.utime(volcano_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    assert list(processing.find_nearest_volcano(_events(), filter_col="PIREP")["v_name"][:2]) == ["C", "B"]
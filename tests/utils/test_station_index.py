@@ -0,0 +1,145 @@
+"""Unit tests for the memory-mapped station metadata index.
+
+Every test works on a copy of ``tests/data/station.xml`` in ``tmp_path``, so
+the index files are written there and never next to the checked-in XML.
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pytest
+from obspy import Stream, Trace, UTCDateTime, read_inventory
+
+from volc_alarms.utils import processing, station_index
+
+STATION_XML = Path(__file__).resolve().parents[1] / "data" / "station.xml"
+NSLC = "AV.PS4A..BHZ"
+
+
+@pytest.fixture
+def xml_file(tmp_path, monkeypatch):
+    xml_file = tmp_path / "stations.xml"
+    shutil.copy(STATION_XML, xml_file)
+    monkeypatch.setenv("STATION_XML", str(xml_file))
+    monkeypatch.setattr(station_index, "_INDEX_CACHE", {})
+    return xml_file
+
+
+def _two_epochs(xml_file, split):
+    """Rewrite ``xml_file`` with the NSLC channel split into two epochs at ``split``."""
+    inventory = read_inventory(xml_file)
+    net, sta, loc, cha = NSLC.split(".")
+    station = [s for n in inventory if n.code == net for s in n if s.code == sta][0]
+    old = [c for c in station.channels if c.location_code == loc and c.code == cha][0]
+    new = old.copy()
+    old.end_date = split - 1
+    new.start_date = split
+    new.latitude = float(old.latitude) + 0.5
+    new.response.instrument_sensitivity.value *= 2
+    station.channels.append(new)
+    inventory.write(str(xml_file), format="STATIONXML")
+    return inventory, old, new
+
+
+def test_index_files_written_next_to_xml(xml_file):
+    station_index.load_station_index()
+    names = sorted(p.name for p in xml_file.parent.iterdir())
+    assert names == ["stations.index.json", "stations.index.npy", "stations.responses.bin", "stations.xml"]
+
+
+def test_matches_inventory(xml_file):
+    inventory = read_inventory(xml_file)
+    index = station_index.load_station_index()
+    t = UTCDateTime("2026-01-01")
+    for nslc in inventory.get_contents()["channels"]:
+        assert index.get_coordinates(nslc, t) == pytest.approx(inventory.get_coordinates(nslc, t))
+        sensitivity = inventory.get_response(nslc, t).instrument_sensitivity.value
+        assert index.get_sensitivity(nslc, t) == sensitivity
+
+
+def test_epoch_lookup(xml_file):
+    split = UTCDateTime("2026-03-01")
+    _, old, new = _two_epochs(xml_file, split)
+    index = station_index.load_station_index()
+
+    assert index.get_coordinates(NSLC, split - 86400)["latitude"] == old.latitude
+    assert index.get_coordinates(NSLC, split + 86400)["latitude"] == new.latitude
+    # Without a time, the latest epoch
+    assert index.get_coordinates(NSLC)["latitude"] == new.latitude
+    assert index.get_sensitivity(NSLC, split) == new.response.instrument_sensitivity.value
+
+    with pytest.raises(Exception, match="No matching channel metadata"):
+        index.get_coordinates("AV.NONE..BHZ")
+    with pytest.raises(Exception, match="No matching channel metadata"):
+        index.get_coordinates(NSLC, old.start_date - 86400)
+
+
+def test_cached_until_xml_changes(xml_file):
+    index = station_index.load_station_index()
+    assert station_index.load_station_index() is index
+    latitude = index.get_coordinates(NSLC)["latitude"]
+
+    _two_epochs(xml_file, UTCDateTime("2026-03-01"))
+    stat = xml_file.stat()
+    os.utime(xml_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    rebuilt = station_index.load_station_index()
+    assert rebuilt is not index
+    assert rebuilt.get_coordinates(NSLC)["latitude"] == latitude + 0.5
+
+
+def test_index_reopened_from_disk(xml_file, monkeypatch):
+    station_index.load_station_index()
+    header = (xml_file.parent / "stations.index.json").read_text()
+
+    # A new process maps the existing files instead of parsing the XML
+    monkeypatch.setattr(station_index, "_INDEX_CACHE", {})
+    monkeypatch.setattr(station_index, "read_inventory", lambda *args: pytest.fail("StationXML parsed again"))
+    index = station_index.load_station_index()
+    assert isinstance(index.index, np.memmap)
+    assert (xml_file.parent / "stations.index.json").read_text() == header
+
+
+def test_stale_index_on_disk_is_rebuilt(xml_file, monkeypatch):
+    station_index.load_station_index()
+    _two_epochs(xml_file, UTCDateTime("2026-03-01"))
+    stat = xml_file.stat()
+    os.utime(xml_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    monkeypatch.setattr(station_index, "_INDEX_CACHE", {})
+    index = station_index.load_station_index()
+    assert len(index.index) == len(read_inventory(xml_file).get_contents()["channels"])
+
+
+def test_response_round_trip(xml_file):
+    inventory = read_inventory(xml_file)
+    index = station_index.load_station_index()
+    t = UTCDateTime("2026-01-01")
+    for nslc in inventory.get_contents()["channels"]:
+        expected = inventory.get_response(nslc, t)
+        response = index.get_response(nslc, t)
+        assert response.instrument_sensitivity.value == expected.instrument_sensitivity.value
+        assert len(response.response_stages) == len(expected.response_stages)
+        assert [s.stage_gain for s in response.response_stages] == [s.stage_gain for s in expected.response_stages]
+
+
+def test_remove_gain_uses_indexed_response(xml_file):
+    inventory = read_inventory(xml_file)
+    t = UTCDateTime("2026-01-01")
+    tr = Trace(np.ones(100))
+    tr.id = NSLC
+    tr.stats.starttime = t
+    st = processing.add_metadata(Stream([tr]))
+
+    # The response survives copies and merges (it lives on the stats)
+    st = st.copy()
+    st.merge()
+    processing.remove_gain(st)
+
+    sensitivity = inventory.get_response(NSLC, t).instrument_sensitivity.value
+    np.testing.assert_allclose(st[0].data, 1 / sensitivity)
+    assert st[0].stats.coordinates["latitude"] == inventory.get_coordinates(NSLC, t)["latitude"]
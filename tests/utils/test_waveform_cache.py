@@ -0,0 +1,207 @@
+"""Unit tests for the per-channel waveform ring buffers.
+
+A fake waveserver holds one channel of known samples (every sample's value
+is its index since the start of the record) and records the spans it is
+asked for, so tests can check both what :meth:`WaveformCache.get` returns
+and what it downloads.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pytest
+from obspy import Stream, Trace, UTCDateTime
+
+from volc_alarms.utils.waveform_cache import WaveformCache
+
+NSLC = "AV.TEST..BHZ"
+FS = 10.0
+T0 = UTCDateTime("2024-01-01T00:00:00")
+
+
+class FakeWaveserver:
+    """One channel of data, optionally with gaps and a latency."""
+
+    def __init__(self, seconds=7200, dtype="int32", gaps=()):
+        n = int(seconds * FS)
+        self.data = np.arange(n).astype(dtype)
+        self.received = np.ones(n, dtype=bool)
+        for t1, t2 in gaps:
+            self.received[self._k(T0 + t1):self._k(T0 + t2)] = False
+        self.now = T0 + seconds
+        self.calls = []
+
+    @staticmethod
+    def _k(t):
+        return int(round((t - T0) * FS))
+
+    def fetch(self, t1, t2):
+        self.calls.append((t1, t2))
+        k1 = max(int(np.ceil((t1 - T0) * FS - 1e-6)), 0)
+        k2 = min(int(np.floor((min(t2, self.now) - T0) * FS + 1e-6)) + 1, len(self.data))
+        st = Stream()
+        received = np.concatenate(([False], self.received[k1:k2], [False]))
+        edges = np.flatnonzero(np.diff(received.view(np.int8)))
+        for i0, i1 in zip(edges[::2], edges[1::2]):
+            tr = Trace(self.data[k1 + i0:k1 + i1].copy())
+            tr.id = NSLC
+            tr.stats.sampling_rate = FS
+            tr.stats.starttime = T0 + (k1 + i0) / FS
+            st += tr
+        return st
+
+    def expected(self, t1, t2):
+        """What the waveserver holds for ``[t1, t2]``, as one stream."""
+        saved, self.calls = self.calls, []
+        st = self.fetch(t1, t2)
+        self.calls = saved
+        return st
+
+
+def assert_same(st, expected):
+    assert len(st) == len(expected)
+    for tr, ref in zip(st, expected):
+        assert tr.id == NSLC
+        assert tr.stats.starttime == ref.stats.starttime
+        assert tr.stats.sampling_rate == ref.stats.sampling_rate
+        np.testing.assert_array_equal(tr.data, ref.data)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return WaveformCache(tmp_path, capacity=3720, margin=30)
+
+
+def test_first_request_fetches_everything(cache):
+    server = FakeWaveserver()
+    st = cache.get(NSLC, T0 + 60, T0 + 660, server.fetch)
+    assert server.calls == [(T0 + 60, T0 + 660)]
+    assert_same(st, server.expected(T0 + 60, T0 + 660))
+
+
+def test_next_request_fetches_only_the_tail(cache):
+    server = FakeWaveserver()
+    cache.get(NSLC, T0, T0 + 600, server.fetch)
+    server.calls.clear()
+
+    st = cache.get(NSLC, T0 + 60, T0 + 660, server.fetch)
+
+    # Re-requested from the cached end minus the margin
+    (t1, t2), = server.calls
+    assert t1 == T0 + 600 + 1 / FS - 30
+    assert t2 == T0 + 660
+    assert_same(st, server.expected(T0 + 60, T0 + 660))
+    assert cache.fetch_window(NSLC, T0 + 120, T0 + 720) == (t1 + 60, T0 + 720)
+
+
+def test_fully_cached_request_fetches_nothing(cache):
+    server = FakeWaveserver()
+    cache.get(NSLC, T0, T0 + 600, server.fetch)
+    server.calls.clear()
+
+    assert cache.fetch_window(NSLC, T0 + 100, T0 + 500) is None
+    st = cache.get(NSLC, T0 + 100, T0 + 500, server.fetch)
+    assert server.calls == []
+    assert_same(st, server.expected(T0 + 100, T0 + 500))
+
+
+def test_late_packets_within_margin_are_picked_up(cache):
+    server = FakeWaveserver(gaps=[(590, 595)])
+    cache.get(NSLC, T0, T0 + 600, server.fetch)
+
+    # The missing packet arrives at the waveserver after the first run
+    server.received[:] = True
+    st = cache.get(NSLC, T0 + 60, T0 + 660, server.fetch)
+    assert_same(st, server.expected(T0 + 60, T0 + 660))
+    assert len(st) == 1
+
+
+def test_latency_only_caches_what_arrived(cache):
+    server = FakeWaveserver()
+    server.now = T0 + 590
+    st = cache.get(NSLC, T0, T0 + 600, server.fetch)
+    assert st[0].stats.endtime == T0 + 590
+
+    server.now = T0 + 700
+    server.calls.clear()
+    st = cache.get(NSLC, T0 + 60, T0 + 660, server.fetch)
+    assert server.calls[0][0] == T0 + 590 + 1 / FS - 30
+    assert_same(st, server.expected(T0 + 60, T0 + 660))
+
+
+def test_gaps_outside_the_margin_stay_gaps(cache):
+    server = FakeWaveserver(gaps=[(200, 230)])
+    cache.get(NSLC, T0, T0 + 600, server.fetch)
+    st = cache.get(NSLC, T0 + 60, T0 + 660, server.fetch)
+
+    assert len(st) == 2
+    assert st[0].stats.endtime == T0 + 200 - 1 / FS
+    assert st[1].stats.starttime == T0 + 230
+    assert_same(st, server.expected(T0 + 60, T0 + 660))
+
+
+def test_ring_wraps_around(tmp_path):
+    cache = WaveformCache(tmp_path, capacity=100, margin=10)
+    server = FakeWaveserver()
+    capacity = int(np.ceil(100 * FS))
+
+    for k in range(12):
+        t1 = T0 + 30 * k
+        server.calls.clear()
+        st = cache.get(NSLC, t1, t1 + 60, server.fetch)
+        assert_same(st, server.expected(t1, t1 + 60))
+        if k:
+            assert server.calls[0][0] > t1
+
+    # Samples were written over earlier ones in the ring
+    ring = np.load(tmp_path / f"{NSLC}.data.npy")
+    assert len(ring) == capacity
+    assert ring.max() > capacity
+
+    # Requests older than the ring holds are fetched in full
+    server.calls.clear()
+    st = cache.get(NSLC, T0, T0 + 60, server.fetch)
+    assert server.calls == [(T0, T0 + 60)]
+    assert_same(st, server.expected(T0, T0 + 60))
+
+
+def test_requests_longer_than_capacity_bypass_the_cache(tmp_path):
+    cache = WaveformCache(tmp_path, capacity=100, margin=10)
+    server = FakeWaveserver()
+    st = cache.get(NSLC, T0, T0 + 200, server.fetch)
+    assert server.calls == [(T0, T0 + 200)]
+    assert_same(st, server.expected(T0, T0 + 200))
+    assert not list(tmp_path.glob("*.npy"))
+
+
+@pytest.mark.parametrize("dtype", ["float64", "int64"])
+def test_unstorable_tail_returns_the_whole_window(cache, dtype):
+    server = FakeWaveserver()
+    cache.get(NSLC, T0, T0 + 600, server.fetch)
+
+    # The tail can no longer be stored in the int32 ring
+    server.data = server.data.astype(dtype)
+    if dtype == "int64":
+        server.data[int(650 * FS)] = 2**40
+    st = cache.get(NSLC, T0 + 60, T0 + 660, server.fetch)
+
+    assert st[0].stats.starttime == T0 + 60
+    assert st[-1].stats.endtime == T0 + 660
+    np.testing.assert_array_equal(
+        np.concatenate([tr.data for tr in st]), server.data[int(60 * FS):int(660 * FS) + 1]
+    )
+
+    # The ring was left untouched by the unstorable data
+    server.data = np.arange(len(server.data)).astype("int32")
+    st = cache.get(NSLC, T0 + 60, T0 + 660, server.fetch)
+    assert_same(st, server.expected(T0 + 60, T0 + 660))
+
+
+def test_int64_within_int32_range_is_cached(cache):
+    server = FakeWaveserver(dtype="int64")
+    cache.get(NSLC, T0, T0 + 600, server.fetch)
+    server.calls.clear()
+    st = cache.get(NSLC, T0 + 60, T0 + 660, server.fetch)
+    assert server.calls[0][0] > T0 + 60
+    assert st[0].data.dtype == np.int32
+    np.testing.assert_array_equal(st[0].data, server.data[int(60 * FS):int(660 * FS) + 1])
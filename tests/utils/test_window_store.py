@@ -0,0 +1,88 @@
+"""Unit tests for the columnar per-window results store."""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from volc_alarms.utils.window_store import WindowStore
+
+
+def _rows(t_ms, value=0.0):
+    t_ms = np.asarray(t_ms, dtype="int64")
+    return pd.DataFrame({
+        "t_ms": t_ms,
+        "Azimuth": value + t_ms / 1000,
+        "Flagged": [",".join(str(i) for i in range(int(t) % 3)) for t in t_ms // 1000],
+    })
+
+
+def test_empty_store(tmp_path):
+    store = WindowStore(tmp_path / "store" / "Test.npz")
+    df = store.get("key", [1000, 2000])
+    assert df.empty
+    assert df.index.name == "t_ms"
+    assert (tmp_path / "store").is_dir()
+
+
+def test_round_trip(tmp_path):
+    store = WindowStore(tmp_path / "Test.npz")
+    store.put("key", _rows([3000, 1000, 2000]))
+
+    df = store.get("key", [1000, 2000, 4000])
+    assert df.index.tolist() == [1000, 2000]
+    assert df["Azimuth"].tolist() == [1.0, 2.0]
+    assert df["Flagged"].tolist() == ["0", "0,1"]
+
+    # Strings are stored without pickling
+    with np.load(tmp_path / "Test.npz", allow_pickle=False) as f:
+        assert f["Flagged"].dtype.kind == "U"
+
+
+def test_rows_are_separated_by_key(tmp_path):
+    store = WindowStore(tmp_path / "Test.npz")
+    store.put("a", _rows([1000, 2000]))
+    store.put("b", _rows([2000, 3000], value=100))
+
+    assert store.get("a", [1000, 2000, 3000])["Azimuth"].tolist() == [1.0, 2.0]
+    assert store.get("b", [1000, 2000, 3000])["Azimuth"].tolist() == [102.0, 103.0]
+    assert store.get("c", [1000, 2000, 3000]).empty
+
+
+def test_put_replaces_existing_rows(tmp_path):
+    store = WindowStore(tmp_path / "Test.npz")
+    store.put("key", _rows([1000, 2000]))
+    store.put("key", _rows([2000, 3000], value=100))
+
+    df = store.get("key", [1000, 2000, 3000])
+    assert df["Azimuth"].tolist() == [1.0, 102.0, 103.0]
+
+
+def test_retention(tmp_path):
+    store = WindowStore(tmp_path / "Test.npz", retention=60)
+    store.put("key", _rows([0, 30_000, 60_000]))
+    store.put("key", _rows([90_000]))
+
+    # Counted back from the newest row across all keys
+    store.put("other", _rows([120_000]))
+    assert store.get("key", [0, 30_000, 60_000, 90_000]).index.tolist() == [60_000, 90_000]
+
+
+def test_changed_columns_start_a_new_store(tmp_path):
+    store = WindowStore(tmp_path / "Test.npz")
+    store.put("key", _rows([1000, 2000]))
+    store.put("key", _rows([3000]).assign(MCCM=0.5))
+
+    df = store.get("key", [1000, 2000, 3000])
+    assert df.index.tolist() == [3000]
+    assert df["MCCM"].tolist() == [0.5]
+
+
+def test_unreadable_store_is_discarded(tmp_path):
+    (tmp_path / "Test.npz").write_bytes(b"not a zip file")
+    store = WindowStore(tmp_path / "Test.npz")
+    assert store.get("key", [1000]).empty
+
+    store.put("key", _rows([1000]))
+    assert store.get("key", [1000]).index.tolist() == [1000]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["Test.npz", "Test.npz.lock"]